@@ -0,0 +1,75 @@
+'''
+miscellaneous helper constructs used across my projects
+
+submodules and the names below are imported on first attribute access (PEP 562),
+so `import tool_shack` itself costs next to nothing:
+```
+import tool_shack as ts
+
+@ts.benchmark
+def f(): ...
+```
+'''
+# `typing` alone costs more than the rest of this module, type checkers read the name itself
+TYPE_CHECKING = False
+
+_SUBMODULES = ('cache', 'core', 'data', 'debug', 'fs', 'profiler', 'scripting', 'storage')
+
+# curated top-level name -> submodule defining it
+_LAZY_ATTRS = {
+    'now_str': 'core',
+    'testcase': 'debug',
+    'benchmark': 'debug',
+    'print_benchmark': 'debug',
+    'export_benchmark': 'debug',
+    'Dashboard': 'debug',
+    'Profiler': 'profiler',
+    'default_profiler': 'profiler',
+    'StageLogger': 'scripting',
+    'EmptyContext': 'scripting',
+    'move_stdout': 'scripting',
+    'hash_join': 'data',
+    'merge_join': 'data',
+    'columnar_group_by': 'data',
+    'window': 'data',
+    'parallel_map': 'data',
+    'read_uncommented': 'data',
+    'KeyedIndex': 'data',
+    'tree_map': 'data',
+    'ShardedStore': 'storage',
+    'PackStore': 'storage',
+    'LazyLoad': 'fs',
+    'LoadCache': 'fs',
+    'disk_cache': 'cache',
+    'memo': 'cache',
+}
+
+__all__ = [*_SUBMODULES, *_LAZY_ATTRS]
+
+if TYPE_CHECKING: 
+    from tool_shack import cache, core, data, debug, fs, profiler, scripting, storage
+    from tool_shack.core import now_str
+    from tool_shack.debug import testcase, benchmark, print_benchmark, export_benchmark, Dashboard
+    from tool_shack.profiler import Profiler, default_profiler
+    from tool_shack.scripting import StageLogger, EmptyContext, move_stdout
+    from tool_shack.data import (
+        hash_join, merge_join, columnar_group_by, window, parallel_map, read_uncommented, KeyedIndex, tree_map
+    )
+    from tool_shack.storage import ShardedStore, PackStore
+    from tool_shack.fs import LazyLoad, LoadCache
+    from tool_shack.cache import disk_cache, memo
+
+def __getattr__(name: str): 
+    import importlib
+    if name in _SUBMODULES: 
+        return importlib.import_module(f'{__name__}.{name}')
+    module = _LAZY_ATTRS.get(name)
+    if module is None: 
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(f'{__name__}.{module}'), name)
+    # later accesses skip this hook
+    globals()[name] = value
+    return value
+
+def __dir__(): 
+    return sorted(set(globals()) | set(__all__))
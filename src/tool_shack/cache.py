@@ -0,0 +1,516 @@
+# memoization of expensive functions.
+# `disk_cache` persists results across runs, `memo` keeps them in memory.
+# hit / miss counters of both show up in `debug.print_benchmark`.
+import os
+import io
+import sys
+import time
+import hashlib
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Union
+
+from tool_shack.profiler import CacheStats, default_profiler
+from tool_shack.storage import ShardedStore
+
+def _feed(h, obj: Any) -> None: 
+    '''feeds a canonical encoding of `obj` to the hash `h`, independent of dict / set ordering and of the process'''
+    if obj is None or isinstance(obj, (bool, int, float, complex, str)): 
+        h.update(f'{type(obj).__name__}:{obj!r};'.encode('utf-8'))
+    elif isinstance(obj, (bytes, bytearray)): 
+        h.update(b'bytes:%d:' % len(obj))
+        h.update(obj)
+    elif isinstance(obj, (list, tuple)): 
+        h.update(f'{type(obj).__name__}[{len(obj)}:'.encode('utf-8'))
+        for x in obj: 
+            _feed(h, x)
+        h.update(b']')
+    elif isinstance(obj, dict): 
+        items = sorted((stable_hash(k), stable_hash(v)) for k, v in obj.items())
+        h.update(f'dict{{{len(items)}:{items}}}'.encode('utf-8'))
+    elif isinstance(obj, (set, frozenset)): 
+        h.update(f'set{{{len(obj)}:{sorted(stable_hash(x) for x in obj)}}}'.encode('utf-8'))
+    elif hasattr(type(obj), '__dataclass_fields__'): 
+        h.update(f'{type(obj).__module__}.{type(obj).__qualname__}('.encode('utf-8'))
+        _feed(h, {name: getattr(obj, name) for name in type(obj).__dataclass_fields__})
+        h.update(b')')
+    elif hasattr(obj, 'dtype') and hasattr(obj, 'tobytes'): 
+        # numpy arrays and scalars
+        import numpy as np
+        obj = np.ascontiguousarray(obj)
+        h.update(f'ndarray:{obj.dtype.str}:{obj.shape}:'.encode('utf-8'))
+        h.update(obj.tobytes())
+    elif isinstance(obj, os.PathLike): 
+        _feed(h, os.fspath(obj))
+    else: 
+        raise TypeError(f'cannot hash {type(obj)!r} stably, pass a `key` function mapping the arguments to plain data')
+
+def stable_hash(obj: Any) -> str: 
+    '''
+    sha1 hex digest of plain data (None, numbers, strings, bytes, lists, tuples, dicts, sets,
+    dataclasses and numpy arrays, nested), equal across processes and runs for equal data.
+    '''
+    h = hashlib.sha1()
+    _feed(h, obj)
+    return h.hexdigest()
+
+class PickleSerializer(): 
+    suffix = '.pkl'
+
+    def dumps(self, value: Any) -> bytes: 
+        import pickle
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, path: str) -> Any: 
+        import pickle
+        with open(path, 'rb') as f: 
+            return pickle.load(f)
+
+class JsonSerializer(): 
+    suffix = '.json'
+
+    def dumps(self, value: Any) -> bytes: 
+        import json
+        return json.dumps(value).encode('utf-8')
+
+    def load(self, path: str) -> Any: 
+        import json
+        with open(path, 'rb') as f: 
+            return json.load(f)
+
+class NpySerializer(): 
+    '''numpy arrays as `.npy` files, loaded as read-only memory maps unless `mmap` is unset'''
+    suffix = '.npy'
+
+    def __init__(self, mmap: bool = True) -> None: 
+        self.mmap_mode = 'r' if mmap else None
+
+    def dumps(self, value: Any) -> bytes: 
+        import numpy as np
+        buffer = io.BytesIO()
+        np.save(buffer, np.asarray(value), allow_pickle=False)
+        return buffer.getvalue()
+
+    def load(self, path: str) -> Any: 
+        import numpy as np
+        return np.load(path, mmap_mode=self.mmap_mode, allow_pickle=False)
+
+DISK_SERIALIZERS = {
+    'pickle': PickleSerializer(),
+    'json': JsonSerializer(),
+    'npy': NpySerializer(),
+}
+
+def default_cache_dir() -> str: 
+    '''`$TOOL_SHACK_CACHE_DIR`, or `~/.cache/tool_shack`'''
+    return os.environ.get('TOOL_SHACK_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'tool_shack')
+
+class DiskCache(): 
+    '''
+    values stored under `directory` by key (a hex digest), spread over the hashed buckets of a `ShardedStore`.
+
+    * written through a temporary file renamed into place, so concurrent processes never read partial values.
+    * file mtimes are the write times, checked against `ttl` (seconds).
+        atimes are set on hits (at most every `ATIME_REFRESH` seconds per file), and the least recently used files 
+        are evicted once there are more than `max_entries` or they take more than `max_bytes`.
+    * the size limits are enforced on the files this process knows about,
+        the directory is rescanned (including the files of other processes) when they are exceeded,
+        then files are evicted down to `LOW_WATER` of the limits, so that rescans are amortized over many writes.
+    '''
+    LOW_WATER = 0.9
+    ATIME_REFRESH = 5.
+
+    def __init__(self, directory: str, serializer: Union[str, Any] = 'pickle', max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None, ttl: Optional[float] = None, stats: Optional[CacheStats] = None) -> None: 
+        self.store = ShardedStore(directory)
+        self.serializer = DISK_SERIALIZERS[serializer] if isinstance(serializer, str) else serializer
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = stats if stats is not None else CacheStats()
+        # file name -> (last access, size), only tracked with size limits
+        self._entries: Optional[Dict[str, Tuple[float, int]]] = None
+        self._n_bytes = 0
+        self._lock = threading.Lock()
+
+    def _limited(self) -> bool: 
+        return self.max_entries is not None or self.max_bytes is not None
+
+    def _filename(self, key: str) -> str: 
+        return key + self.serializer.suffix
+
+    def _track(self, filename: str, atime: float, size: int) -> None: 
+        if self._entries is None: 
+            self._scan()
+        old = self._entries.get(filename)
+        if old is not None: 
+            self._n_bytes -= old[1]
+        self._entries[filename] = (atime, size)
+        self._n_bytes += size
+
+    def get(self, key: str) -> Tuple[bool, Any]: 
+        '''(found, value) of `key`, expired entries are removed'''
+        filename = self._filename(key)
+        path = self.store.path(filename)
+        try: 
+            st = os.stat(path)
+            now = time.time()
+            if self.ttl is not None and now - st.st_mtime > self.ttl: 
+                self._remove(filename)
+                return False, None
+            value = self.serializer.load(path)
+            if now - st.st_atime > self.ATIME_REFRESH: 
+                os.utime(path, (now, st.st_mtime))
+        except FileNotFoundError: 
+            # never written, or evicted by another process meanwhile
+            return False, None
+        if self._limited(): 
+            with self._lock: 
+                self._track(filename, now, st.st_size)
+        return True, value
+
+    def put(self, key: str, value: Any) -> None: 
+        filename = self._filename(key)
+        data = self.serializer.dumps(value)
+        self.store.put(filename, data)
+        if self._limited(): 
+            with self._lock: 
+                self._track(filename, time.time(), len(data))
+                if self._over_limits(): 
+                    self._evict()
+
+    def _remove(self, filename: str) -> None: 
+        try: 
+            self.store.delete(filename)
+        except KeyError: 
+            pass
+        with self._lock: 
+            if self._entries is not None and filename in self._entries: 
+                self._n_bytes -= self._entries.pop(filename)[1]
+
+    def _scan(self) -> None: 
+        entries = {}
+        for filename in self.store.iter(): 
+            try: 
+                st = os.stat(self.store.path(filename))
+            except FileNotFoundError: 
+                continue
+            entries[filename] = (st.st_atime, st.st_size)
+        self._entries = entries
+        self._n_bytes = sum(size for _, size in entries.values())
+
+    def _over_limits(self, fraction: float = 1.) -> bool: 
+        return (
+            (self.max_entries is not None and len(self._entries) > self.max_entries * fraction) or
+            (self.max_bytes is not None and self._n_bytes > self.max_bytes * fraction)
+        )
+
+    def _evict(self) -> None: 
+        self._scan()
+        n_evicted = 0
+        for filename, (_, size) in sorted(self._entries.items(), key=lambda kv: kv[1][0]): 
+            if not self._over_limits(self.LOW_WATER): 
+                break
+            try: 
+                self.store.delete(filename)
+                n_evicted += 1
+            except KeyError: 
+                pass
+            del self._entries[filename]
+            self._n_bytes -= size
+        self.stats.record_evictions(n_evicted)
+
+    def __len__(self) -> int: 
+        return sum(1 for _ in self.store.iter())
+
+    def clear(self) -> None: 
+        '''removes every stored value'''
+        with self._lock: 
+            for filename in list(self.store.iter()): 
+                try: 
+                    self.store.delete(filename)
+                except KeyError: 
+                    pass
+            self._entries = {} if self._limited() else None
+            self._n_bytes = 0
+
+def disk_cache(
+    func: Optional[Callable] = None, *, directory: Optional[str] = None, serializer: Union[str, Any] = 'pickle',
+    max_entries: Optional[int] = None, max_bytes: Optional[int] = None, ttl: Optional[float] = None,
+    key: Optional[Callable[..., Any]] = None, version: Any = None, name: Optional[str] = None, profiler=None
+) -> Callable: 
+    '''
+    persists the results of `func` on disk, keyed by a `stable_hash` of its arguments
+    (bound to the signature, so `f(1)` and `f(x=1)` share a result), see `DiskCache`.
+
+    * `directory`: defaults to `<default_cache_dir()>/<module>.<qualname>`.
+    * `serializer`: `pickle`, `json`, `npy` (loaded as memory maps) or an object with `suffix`, `dumps` and `load`.
+    * `key`: maps the arguments to the plain data to hash, for arguments `stable_hash` does not support.
+    * `version`: part of every key, change it to invalidate the results of an older implementation.
+    * hits / misses are reported as `name` (default `__qualname__`, as `debug.benchmark`)
+        by `profiler` (default the one behind `debug.print_benchmark`).
+
+    usage: 
+    ```
+    @disk_cache(serializer='npy', max_bytes=10 * 2**30, ttl=7 * 24 * 3600)
+    def features(path: str, n_mels: int = 80) -> np.ndarray: ...
+    ```
+    the decorated function has `cache` (the `DiskCache`), `cache_stats` and `cache_clear()`.
+    '''
+    if func is None: 
+        return lambda f: disk_cache(
+            f, directory=directory, serializer=serializer, max_entries=max_entries, max_bytes=max_bytes,
+            ttl=ttl, key=key, version=version, name=name, profiler=profiler
+        )
+    import inspect
+    if inspect.iscoroutinefunction(func): 
+        raise TypeError(f'disk_cache does not support coroutine functions, got {func.__qualname__}')
+    directory = directory or os.path.join(default_cache_dir(), f'{func.__module__}.{func.__qualname__}')
+    stats = (profiler or default_profiler).cache_stats(name or func.__qualname__)
+    cache = DiskCache(directory, serializer, max_entries, max_bytes, ttl, stats)
+    signature = inspect.signature(func)
+
+    def make_key(args, kwargs) -> str: 
+        if key is not None: 
+            return stable_hash((version, key(*args, **kwargs)))
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return stable_hash((version, dict(bound.arguments)))
+
+    @functools.wraps(func)
+    def decorated(*args, **kwargs): 
+        k = make_key(args, kwargs)
+        start = time.perf_counter()
+        found, value = cache.get(k)
+        if found: 
+            stats.record_hit(time.perf_counter() - start)
+            return value
+        value = func(*args, **kwargs)
+        cache.put(k, value)
+        stats.record_miss(time.perf_counter() - start)
+        return value
+
+    decorated.cache = cache
+    decorated.cache_stats = stats
+    decorated.cache_clear = cache.clear
+    return decorated
+
+class _MemoEntry(): 
+    __slots__ = ('value', 'n_bytes', 'expires', 'compute_time')
+
+    def __init__(self, value: Any, n_bytes: int, expires: float, compute_time: float) -> None: 
+        self.value = value
+        self.n_bytes = n_bytes
+        self.expires = expires
+        self.compute_time = compute_time
+
+class _Flight(): 
+    '''a call computing a missing value, waited for by concurrent callers of the same arguments'''
+    __slots__ = ('done', 'error')
+
+    def __init__(self, done: Any) -> None: 
+        # `threading.Event` or `asyncio.Event`, set once the call finished
+        self.done = done
+        # raised by the call, handed to the callers waiting for it
+        self.error: Optional[BaseException] = None
+
+class MemoCache(): 
+    '''
+    in-memory LRU of the results of one function, bounded by `max_entries` and / or `max_bytes` 
+    as estimated by `sizeof` (the default `sys.getsizeof` is shallow, pass e.g. `lambda a: a.nbytes` for numpy arrays). 
+    entries older than `ttl` seconds are dropped on lookup.
+
+    shares the lock of `stats`, so that lookups update the counters without taking a second lock.
+    '''
+    def __init__(self, max_entries: Optional[int] = 128, max_bytes: Optional[int] = None, ttl: Optional[float] = None, 
+        sizeof: Callable[[Any], int] = sys.getsizeof, stats: Optional[CacheStats] = None) -> None: 
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.stats = stats if stats is not None else CacheStats()
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = self.stats.lock
+        self.n_bytes = 0
+        # key -> `_Flight` of the call computing it (single flight)
+        self._in_flight: Dict[Hashable, _Flight] = {}
+
+    def _lookup(self, key: Hashable) -> Optional[_MemoEntry]: 
+        '''the live entry of `key`, to be called holding the lock'''
+        entry = self._entries.get(key)
+        if entry is None: 
+            return None
+        if self.ttl is not None and entry.expires < time.monotonic(): 
+            del self._entries[key]
+            self.n_bytes -= entry.n_bytes
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Hashable, value: Any, compute_time: float = 0.) -> None: 
+        n_bytes = self.sizeof(value) if self.max_bytes is not None else 0
+        expires = time.monotonic() + self.ttl if self.ttl is not None else float('inf')
+        with self._lock: 
+            old = self._entries.pop(key, None)
+            if old is not None: 
+                self.n_bytes -= old.n_bytes
+            self._entries[key] = _MemoEntry(value, n_bytes, expires, compute_time)
+            self.n_bytes += n_bytes
+            while self._entries and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries) or 
+                (self.max_bytes is not None and self.n_bytes > self.max_bytes)
+            ): 
+                _, evicted = self._entries.popitem(last=False)
+                self.n_bytes -= evicted.n_bytes
+                self.stats.evictions += 1
+
+    def _join(self, key: Hashable, waited: float, new_event: Callable[[], Any]) -> Tuple[bool, Any, bool]: 
+        '''
+        (True, value, False) on a hit, counted as saving the computation time of the value (minus `waited`). 
+        on a miss (False, flight, leading): a new `_Flight` (with a `new_event()`) the caller has to compute and `_finish`, 
+        or the one of the caller already computing `key`, to wait for.
+        '''
+        stats = self.stats
+        with self._lock: 
+            entry = self._lookup(key)
+            if entry is not None: 
+                stats.hits += 1
+                stats.exact_hits += 1
+                if waited: 
+                    # waiting may take a little longer than computing would have
+                    stats.hit_time += waited
+                    stats.exact_saved += max(0., entry.compute_time - waited)
+                else: 
+                    stats.exact_saved += entry.compute_time
+                return True, entry.value, False
+            flight = self._in_flight.get(key)
+            if flight is not None: 
+                return False, flight, False
+            flight = self._in_flight[key] = _Flight(new_event())
+            return False, flight, True
+
+    def _finish(self, key: Hashable, flight: _Flight, waited: float, elapsed: float, 
+        value: Any = None, error: Optional[BaseException] = None) -> None: 
+        '''stores the value (unless `error`) computed by the leader of `flight`, and wakes up its waiters'''
+        try: 
+            if error is None: 
+                self.put(key, value, elapsed)
+                self.stats.record_miss(waited + elapsed)
+            elif isinstance(error, Exception): 
+                # not on cancellation / interrupts, the waiters try again instead
+                flight.error = error
+        finally: 
+            with self._lock: 
+                del self._in_flight[key]
+            flight.done.set()
+
+    def __len__(self) -> int: 
+        return len(self._entries)
+
+    def clear(self) -> None: 
+        with self._lock: 
+            self._entries.clear()
+            self.n_bytes = 0
+
+_KWARGS_MARK = object()
+
+def _memo_key(args: tuple, kwargs: dict) -> Hashable: 
+    if not kwargs: 
+        return args
+    return args + (_KWARGS_MARK,) + tuple(sorted(kwargs.items()))
+
+def memo(
+    func: Optional[Callable] = None, *, max_entries: Optional[int] = 128, max_bytes: Optional[int] = None, 
+    ttl: Optional[float] = None, sizeof: Callable[[Any], int] = sys.getsizeof, 
+    key: Optional[Callable[..., Hashable]] = None, name: Optional[str] = None, profiler=None
+) -> Callable: 
+    '''
+    memoizes a pure function (sync or async) in memory, see `MemoCache`. 
+    arguments must be hashable, or mapped to a hashable by `key`.
+
+    concurrent calls missing the same arguments compute it once (single flight): 
+    the first one computes, the others wait for its result 
+    (threads for sync functions, tasks of one event loop for async ones). 
+    if it raises, the callers waiting at that time get the same exception, later calls try again.
+    
+    hits, misses and the time saved by hits (the computation time of their values) 
+    are reported as `name` (default `__qualname__`, as `debug.benchmark`) by `profiler` 
+    (default the one behind `debug.print_benchmark`). 
+    hits read no clock, only the callers that waited for a computation are timed.
+
+    usage: 
+    ```
+    @memo(max_bytes=2**28, sizeof=lambda a: a.nbytes, ttl=60)
+    def embedding(word: str) -> np.ndarray: ...
+    ```
+    the decorated function has `cache` (the `MemoCache`), `cache_stats` and `cache_clear()`.
+    '''
+    if func is None: 
+        return lambda f: memo(
+            f, max_entries=max_entries, max_bytes=max_bytes, ttl=ttl, sizeof=sizeof, key=key, name=name, profiler=profiler
+        )
+    import inspect
+    stats = (profiler or default_profiler).cache_stats(name or func.__qualname__)
+    cache = MemoCache(max_entries, max_bytes, ttl, sizeof, stats)
+    join, finish, clock = cache._join, cache._finish, time.perf_counter
+
+    def make_key(args, kwargs) -> Hashable: 
+        if key is not None: 
+            return key(*args, **kwargs)
+        return _memo_key(args, kwargs) if kwargs else args
+
+    if inspect.iscoroutinefunction(func): 
+        import asyncio
+
+        @functools.wraps(func)
+        async def decorated(*args, **kwargs): 
+            k = make_key(args, kwargs)
+            waited = 0.
+            while True: 
+                hit, found, leading = join(k, waited, asyncio.Event)
+                if hit: 
+                    return found
+                start = clock()
+                if not leading: 
+                    await found.done.wait()
+                    waited += clock() - start
+                    if found.error is not None: 
+                        raise found.error
+                    # its value may be gone again (evicted or expired), hence the loop
+                    continue
+                try: 
+                    value = await func(*args, **kwargs)
+                except BaseException as e: 
+                    finish(k, found, waited, clock() - start, error=e)
+                    raise
+                finish(k, found, waited, clock() - start, value)
+                return value
+    else: 
+        @functools.wraps(func)
+        def decorated(*args, **kwargs): 
+            k = make_key(args, kwargs)
+            waited = 0.
+            while True: 
+                hit, found, leading = join(k, waited, threading.Event)
+                if hit: 
+                    return found
+                start = clock()
+                if not leading: 
+                    found.done.wait()
+                    waited += clock() - start
+                    if found.error is not None: 
+                        raise found.error
+                    continue
+                try: 
+                    value = func(*args, **kwargs)
+                except BaseException as e: 
+                    finish(k, found, waited, clock() - start, error=e)
+                    raise
+                finish(k, found, waited, clock() - start, value)
+                return value
+
+    decorated.cache = cache
+    decorated.cache_stats = stats
+    decorated.cache_clear = cache.clear
+    return decorated
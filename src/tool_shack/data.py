@@ -3,8 +3,13 @@
 
 # generic data manipulation
 # functions defined in this scope are more easily understood by considering their type signatures.
-from itertools import islice
-from typing import TypeVar, Callable, Sequence, Iterator, Optional, Dict, List, Tuple
+import re
+import sys
+import copy
+import heapq
+from collections import deque
+from itertools import islice, groupby, chain
+from typing import TypeVar, Callable, Sequence, Iterable, Iterator, Optional, Dict, List, Tuple, Union, Awaitable, AsyncIterable, AsyncIterator, TextIO, Generic
 
 T = TypeVar('T')
 E = TypeVar('E')
@@ -72,44 +77,347 @@ def map_group(map_op: Callable[[T], E], groups: Dict[K, Sequence[T]]) -> Dict[K,
         k : [map_op(t) for t in ts] for k, ts in groups.items()
     }
 
-def big_join(getter_x: Callable[[T], K], getter_y: Callable[[E], K], xs: Sequence[T], ys: Sequence[E]) -> List[Tuple[T, E]]: 
+# columnar (numpy) backend for `group_by`, `reduce_group` and `map_group`.
+# `data` is either an array (rows along the first axis) or a dict of equally long column arrays,
+# `key` is a column name (dict data), a column index (2d array data) or an array of per-row keys.
+COLUMNAR_REDUCTIONS = ('sum', 'mean', 'min', 'max', 'count', 'first')
+
+def _columnar_keys(key, data): 
+    import numpy as np
+    if isinstance(data, dict): 
+        return np.asarray(data[key]) if isinstance(key, str) else np.asarray(key)
+    if isinstance(key, int): 
+        return np.asarray(data)[:, key]
+    return np.asarray(key)
+
+def _columnar_take(data, idx): 
+    import numpy as np
+    if isinstance(data, dict): 
+        return {name: np.asarray(col)[idx] for name, col in data.items()}
+    return np.asarray(data)[idx]
+
+def _columnar_factorize(keys): 
+    '''returns (unique keys, stable row order grouping equal keys together, group start offsets, group sizes)'''
+    import numpy as np
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    boundary = np.empty(len(sorted_keys), dtype=bool)
+    boundary[:1] = True
+    np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=boundary[1:])
+    starts = np.flatnonzero(boundary)
+    counts = np.diff(np.append(starts, len(sorted_keys)))
+    return sorted_keys[starts], order, starts, counts
+
+def _columnar_reduce(op: str, values, starts, counts): 
+    import numpy as np
+    if op == 'sum': return np.add.reduceat(values, starts, axis=0)
+    if op == 'min': return np.minimum.reduceat(values, starts, axis=0)
+    if op == 'max': return np.maximum.reduceat(values, starts, axis=0)
+    if op == 'first': return values[starts]
+    if op == 'count': return counts
+    if op == 'mean': 
+        shape = (-1,) + (1,) * (values.ndim - 1)
+        return np.add.reduceat(values, starts, axis=0) / counts.reshape(shape)
+    raise ValueError(f'unknown reduction: {op}, expecting one of {COLUMNAR_REDUCTIONS}')
+
+def columnar_group_by(key, data) -> Dict[K, object]: 
+    '''
+    vectorized `group_by` over columnar data, grouping with a single argsort instead of a python loop.
+
+    returns a dict of row subsets indexed by (python scalar) keys. 
+    unlike the lists of `group_by`, each value is a numpy array of rows (key column included), 
+    or a dict of column arrays if `data` is a dict.
+    '''
+    uniques, order, starts, counts = _columnar_factorize(_columnar_keys(key, data))
+    return {
+        k: _columnar_take(data, order[s: s + c]) 
+        for k, s, c in zip(uniques.tolist(), starts.tolist(), counts.tolist())
+    }
+
+def columnar_reduce_group(reduction_op, key, data) -> Dict[K, object]: 
+    '''
+    vectorized `reduce_group(op, group_by(key, data))` with `op` in `COLUMNAR_REDUCTIONS`.
+
+    for array data, returns reduced values (a row for 2d arrays, without the key column if `key` is its index) 
+    indexed by keys.
+    for dict data, `reduction_op` may be a dict of column name -> op (defaults to every non-key column), 
+    and each key maps to a dict of column name -> reduced value.
+    '''
+    uniques, order, starts, counts = _columnar_factorize(_columnar_keys(key, data))
+    ks = uniques.tolist()
+    if not isinstance(data, dict): 
+        if isinstance(key, int): 
+            import numpy as np
+            data = np.delete(np.asarray(data), key, axis=1)
+        reduced = _columnar_reduce(reduction_op, _columnar_take(data, order), starts, counts)
+        return dict(zip(ks, reduced.tolist()))
+
+    ops = reduction_op if isinstance(reduction_op, dict) else {
+        name: reduction_op for name in data if not (isinstance(key, str) and name == key)
+    }
+    columns = {
+        name: _columnar_reduce(op, _columnar_take(data[name], order), starts, counts).tolist()
+        for name, op in ops.items()
+    }
+    return {
+        k: {name: col[idx] for name, col in columns.items()}
+        for idx, k in enumerate(ks)
+    }
+
+def columnar_map_group(map_op, key, data) -> Dict[K, object]: 
+    '''
+    vectorized `map_group(op, group_by(key, data))`, 
+    `map_op` is applied once over the whole array (or dict of columns) and must therefore be vectorized.
+    '''
+    keys = _columnar_keys(key, data)
+    return columnar_group_by(keys, map_op(data))
+
+JOIN_MODES = ('inner', 'left', 'right', 'full', 'semi', 'anti')
+
+def _size_hint(xs) -> Optional[int]: 
+    try: 
+        return len(xs)
+    except TypeError: 
+        return None
+
+def _hash_join(getter_x, getter_y, xs, ys, how, build_x): 
+    if build_x: 
+        probe, probe_get, table_src, table_get = ys, getter_y, xs, getter_x
+        keep_probe, keep_table = how in ('right', 'full'), how in ('left', 'full')
+        pair = lambda p, b: (b, p)
+    else: 
+        probe, probe_get, table_src, table_get = xs, getter_x, ys, getter_y
+        keep_probe, keep_table = how in ('left', 'full'), how in ('right', 'full')
+        pair = lambda p, b: (p, b)
+
+    table = group_by(table_get, table_src)
+    matched = set() if keep_table else None
+    for p in probe: 
+        k = probe_get(p)
+        bucket = table.get(k)
+        if bucket is None: 
+            if keep_probe: yield pair(p, None)
+            continue
+        if matched is not None: matched.add(k)
+        for b in bucket: 
+            yield pair(p, b)
+
+    if keep_table: 
+        for k, bucket in table.items(): 
+            if k not in matched: 
+                for b in bucket: 
+                    yield pair(None, b)
+
+def _semi_join(getter_x, getter_y, xs, ys, keep_matched): 
+    keys = set(map(getter_y, ys))
+    for x in xs: 
+        if (getter_x(x) in keys) == keep_matched: 
+            yield x
+
+def hash_join(
+    getter_x: Callable[[T], K], getter_y: Callable[[E], K], 
+    xs: Iterable[T], ys: Iterable[E], 
+    how: str = 'inner', build: Optional[str] = None
+) -> Iterator: 
+    '''
+    streaming hash join of `xs` and `ys` on keys given by the respective getters.
+
+    a hash table (key -> list of items) is built over one side only, 
+    the other side is consumed lazily item by item, so it may be any iterator.
+    duplicated keys on either side produce every matching pair (many-to-many).
+
+    @param how : one of `JOIN_MODES`
+        * `inner` : `(x, y)` for every pair with equal keys
+        * `left` / `right` / `full` : outer joins, the missing side is filled with `None`
+        * `semi` / `anti` : items of `xs` that do / do not have a match in `ys`
+    @param build : the side to be hashed, `'x'` or `'y'`. 
+        by default the shorter side is hashed if both sizes are known, otherwise `ys`.
+
+    @returns a generator of tuples (or of `xs` items for `semi` / `anti` joins).
+        unmatched rows of the hashed side (outer joins) are emitted last.
+    '''
+    if how not in JOIN_MODES: 
+        raise ValueError(f'unknown join mode: {how}, expecting one of {JOIN_MODES}')
+    if how in ('semi', 'anti'): 
+        return _semi_join(getter_x, getter_y, xs, ys, how == 'semi')
+
+    if build is None: 
+        nx, ny = _size_hint(xs), _size_hint(ys)
+        build = 'x' if (nx is not None and ny is not None and nx < ny) else 'y'
+    if build not in ('x', 'y'): 
+        raise ValueError(f'build side should be either \'x\' or \'y\', got {build}')
+    return _hash_join(getter_x, getter_y, xs, ys, how, build == 'x')
+
+def big_join(
+    getter_x: Callable[[T], K], getter_y: Callable[[E], K], 
+    xs: Sequence[T], ys: Sequence[E], how: str = 'inner'
+) -> List[Tuple[T, E]]: 
     '''
     mimics the `join` operation in databases.
     given two sets of items `xs` and `ys` 
     and two getter functions to map elemetns in respective collections into a common key type,
 
     return a list of tuples joining elements of the same keys together.
+    items sharing a key are joined pairwise (many-to-many), see `hash_join` for the available `how` modes.
+    '''
+    return list(hash_join(getter_x, getter_y, xs, ys, how))
+
+def merge_sorted(*iterables: Iterable[T], key: Optional[Getter] = None, reverse: bool = False) -> Iterator[T]: 
+    '''
+    k-way merge of several already sorted iterables into one sorted stream.
+
+    holds only one pending item per input (a heap of size k), inputs are consumed lazily.
+    '''
+    return heapq.merge(*iterables, key=key, reverse=reverse)
+
+def group_by_sorted(getter: Getter, xs: Iterable[T]) -> Iterator[Tuple[K, Iterator[T]]]: 
+    '''
+    streaming counterpart of `group_by` for inputs sorted (or at least clustered) by key.
+
+    yields `(key, group_iter)` pairs without buffering any group.
+    note: each `group_iter` is only valid until the next pair is requested.
+    '''
+    return groupby(xs, key=getter)
+
+_exhausted = object()
+
+def merge_join(
+    getter_x: Callable[[T], K], getter_y: Callable[[E], K], 
+    xs: Iterable[T], ys: Iterable[E], how: str = 'inner'
+) -> Iterator: 
+    '''
+    sort-merge join of two streams sorted by key in ascending order. 
+    
+    same `how` modes and outputs as `hash_join`, but only the current group of `ys`
+    is held in memory, thus inputs may be arbitrarily large (e.g. sorted shard files).
+    output is sorted by key as well.
+    '''
+    if how not in JOIN_MODES: 
+        raise ValueError(f'unknown join mode: {how}, expecting one of {JOIN_MODES}')
+    return _merge_join(getter_x, getter_y, xs, ys, how)
+
+def _merge_join(getter_x, getter_y, xs, ys, how): 
+    keep_x = how in ('left', 'full', 'anti')
+    keep_y = how in ('right', 'full')
+    x_only = how in ('semi', 'anti')
+
+    gxs, gys = groupby(xs, key=getter_x), groupby(ys, key=getter_y)
+    kx, grp_x = next(gxs, (_exhausted, None))
+    ky, grp_y = next(gys, (_exhausted, None))
+    while kx is not _exhausted and ky is not _exhausted: 
+        if kx < ky: 
+            if keep_x: 
+                for x in grp_x: 
+                    yield x if x_only else (x, None)
+            kx, grp_x = next(gxs, (_exhausted, None))
+        elif ky < kx: 
+            if keep_y: 
+                for y in grp_y: 
+                    yield (None, y)
+            ky, grp_y = next(gys, (_exhausted, None))
+        else: 
+            if how == 'semi': 
+                yield from grp_x
+            elif how != 'anti': 
+                group_y = list(grp_y)
+                for x in grp_x: 
+                    for y in group_y: 
+                        yield (x, y)
+            kx, grp_x = next(gxs, (_exhausted, None))
+            ky, grp_y = next(gys, (_exhausted, None))
+
+    if keep_x and kx is not _exhausted: 
+        for _, grp_x in _chain_groups(kx, grp_x, gxs): 
+            for x in grp_x: 
+                yield x if x_only else (x, None)
+    if keep_y and ky is not _exhausted: 
+        for _, grp_y in _chain_groups(ky, grp_y, gys): 
+            for y in grp_y: 
+                yield (None, y)
+
+def _chain_groups(k, grp, rest): 
+    yield k, grp
+    yield from rest
+
+# a serializer is either a callable, or a dict mapping element types to callables (`str` as fallback)
+Serializer = Union[Callable[[T], str], Dict[type, Callable[[T], str]]]
+
+class _SerializerCache(): 
+    '''resolves (and memoizes) the serializer, composed with html escaping, per element type'''
+    def __init__(self, serializer: Serializer, escape: bool) -> None: 
+        self.serializer = serializer
+        self.escape = escape
+        self._cache: Dict[type, Callable[[T], str]] = {}
+
+    def _resolve(self, t: type) -> Callable[[T], str]: 
+        fn = self.serializer
+        if isinstance(fn, dict): 
+            fn = next((fn[base] for base in t.__mro__ if base in fn), str)
+        if self.escape: 
+            import html
+            return lambda x, fn=fn: html.escape(fn(x))
+        return fn
+
+    def __call__(self, x: T) -> str: 
+        t = type(x)
+        fn = self._cache.get(t)
+        if fn is None: 
+            fn = self._cache[t] = self._resolve(t)
+        return fn(x)
+
+TABLE_ALIGNMENTS = ('left', 'right', 'center')
+
+def iter_table(
+    xss: Iterable[Sequence[T]], serializer: Serializer = str, header: Optional[Sequence[str]] = None, 
+    align: Optional[Sequence[str]] = None, escape: bool = False
+) -> Iterator[str]: 
     '''
+    streaming version of `align_table`, yields the html code of the table row by row.
+
+    @param serializer : a callable, or a dict of type -> callable, resolved once per element type
+    @param header : column titles, rendered as a `<th>` row
+    @param align : per column text alignment (`left`, `right` or `center`), of both header and data cells
+    @param escape : html-escape the serialized cells (and the header)
+    '''
+    import html
+    if align is not None: 
+        for a in align: 
+            if a not in TABLE_ALIGNMENTS: 
+                raise ValueError(f'unknown alignment {a!r}, expected one of {TABLE_ALIGNMENTS}')
+    styles = [f' style="text-align:{a}"' for a in (align or ())]
+    open_tags = {idx: f'<td{style}>' for idx, style in enumerate(styles)}
+    serialize = _SerializerCache(serializer, escape)
+
+    yield '<table>'
+    if header is not None: 
+        th_tags = {idx: f'<th{style}>' for idx, style in enumerate(styles)}
+        th = '<th>'
+        yield f"<tr>{''.join(f'{th_tags.get(idx, th)}{html.escape(h) if escape else h}</th>' for idx, h in enumerate(header))}</tr>"
+    td = '<td>'
+    for xs in xss: 
+        yield f"<tr>{''.join(f'{open_tags.get(idx, td)}{serialize(x)}</td>' for idx, x in enumerate(xs))}</tr>"
+    yield '</table>'
 
-    x_indexed = index_by(getter_x, xs)
-    y_indexed = index_by(getter_y, ys)
-    x_ks = set(x_indexed.keys())
-    y_ks = set(y_indexed.keys())
-    common_ks = x_ks.intersection(y_ks)
-    return [
-        (x_indexed[k], y_indexed[k])
-        for k in common_ks
-    ]
+def write_table(f: TextIO, xss: Iterable[Sequence[T]], *args, **kwargs) -> None: 
+    '''writes the html table to the file-like `f` incrementally, see `iter_table` for the arguments'''
+    for piece in iter_table(xss, *args, **kwargs): 
+        f.write(piece)
 
-def align_table(xss : Sequence[Sequence[T]], serializer: Callable[[T], str] = str) -> str : 
+def align_table(xss : Sequence[Sequence[T]], serializer: Serializer = str, escape: bool = False) -> str : 
     '''
     return a list of list of data as a HTML table
 
     @param xss : Sequence of sequence of objects (serializable)
     @param serializer : a callable that converts input element type into readable strings.
+    @param escape : html-escape the serialized cells
 
-    @returns html code as string
+    @returns html code as string, use `iter_table` or `write_table` for large tables.
     '''
-    rows = []
-    for xs in xss : 
-        row = f"<tr>{''.join([f'<td>{serializer(x)}</td>' for x in xs])}</tr>"
-        rows.append(row)
-    return f"<table>{''.join(rows)}</table>"
+    return ''.join(iter_table(xss, serializer, escape=escape))
+
+_comment_pattern = re.compile(r'([\s]*#[\s\S]*$)|(^$)')
 
 def _not_comment(line: str) -> bool: 
-    import re
-    # this line is protected by re.compile's internal caching
-    _comment_pattern = re.compile(r'([\s]*#[\s\S]*$)|(^$)')
     return _comment_pattern.match(line) is None
 
 def comment_guard(xs: Iterator[str]) -> Iterator[str]: 
@@ -120,42 +428,271 @@ def comment_guard(xs: Iterator[str]) -> Iterator[str]:
     '''
     return filter(_not_comment, xs)
 
-def gen_disjoint_indices(population: int, max_try: int = 3) -> Iterator[int]: 
+def _read_line_blocks(path: str, block_size: int) -> Iterator[bytes]: 
+    '''memory-maps `path` and yields blocks of roughly `block_size` bytes, each ending on a line boundary'''
+    import mmap
+    import os
+    with open(path, 'rb') as f: 
+        size = os.fstat(f.fileno()).st_size
+        if size == 0: 
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm: 
+            pos = 0
+            while pos < size: 
+                end = min(pos + block_size, size)
+                if end < size: 
+                    nl = mm.rfind(b'\n', pos, end)
+                    if nl < 0: 
+                        nl = mm.find(b'\n', end)
+                    end = size if nl < 0 else nl + 1
+                yield mm[pos:end]
+                pos = end
+
+def read_uncommented(
+    path: str, strip_inline: bool = False, batched: bool = False, 
+    encoding: str = 'utf-8', block_size: int = 1 << 24
+) -> Iterator: 
+    '''
+    fast equivalent of `comment_guard(open(path))` for large files. 
+
+    the file is memory-mapped, decoded and split a block at a time, lines are then filtered
+    with plain string methods instead of a regex match per line.
+    comment lines and blank (whitespace-only) lines are skipped, 
+    lines are yielded without their line terminators.
+
+    @param strip_inline : also remove trailing comments, i.e. everything from the first `#` on a line
+    @param batched : yield lists of lines (one per block of `block_size` bytes) instead of single lines
+    '''
+    for block in _read_line_blocks(path, block_size): 
+        text = block.decode(encoding)
+        if '\r' in text: 
+            text = text.replace('\r\n', '\n')
+        # `[:1]` of a blank line is '', which is `in '#'` as well
+        lines = [line for line in text.split('\n') if line.lstrip()[:1] not in '#']
+        if strip_inline: 
+            lines = [line[:line.index('#')].rstrip() if '#' in line else line for line in lines]
+        if batched: 
+            yield lines
+        else: 
+            yield from lines
+
+_MASK64 = (1 << 64) - 1
+
+class RandomPermutation(): 
+    '''
+    a seeded, lazily evaluated random permutation of `range(population)`.
+
+    `perm[i]` is computed in O(1) time and memory by a keyed feistel network over the 
+    next even power of two, cycle-walking until the result falls inside the population.
+    distinct positions always map to distinct indices.
+
+    usage: 
+    ```
+    perm = RandomPermutation(10**9, seed=42)
+    perm[0], perm[1]                            # random access
+    for idx in perm.iter(start=1000): ...       # resume after 1000 draws
+    for idx in perm.iter(shard=rank, n_shards=world_size): ...   # disjoint per worker
+    ```
     '''
-    generate (most probably) disjoint indices within the range of [0, population).
+    def __init__(self, population: int, seed: Optional[int] = None, n_rounds: int = 4) -> None: 
+        import random
+        if population <= 0: 
+            raise ValueError(f'population should be positive, got {population}')
+        self.population = population
+        self.seed = seed
+        half_bits = max(1, ((population - 1).bit_length() + 1) // 2)
+        self._half_bits = half_bits
+        self._half_mask = (1 << half_bits) - 1
+        rng = random.Random(seed)
+        self._keys = [rng.getrandbits(64) for _ in range(n_rounds)]
+
+    def _encrypt(self, x: int) -> int: 
+        half_bits, half_mask = self._half_bits, self._half_mask
+        left, right = x >> half_bits, x & half_mask
+        for key in self._keys: 
+            # round function: keyed splitmix64 finalizer (inlined, this is the hot loop)
+            m = ((right ^ key) * 0xbf58476d1ce4e5b9) & _MASK64
+            m ^= m >> 31
+            m = (m * 0x94d049bb133111eb) & _MASK64
+            left, right = right, left ^ ((m ^ (m >> 29)) & half_mask)
+        return (left << half_bits) | right
+
+    def __len__(self) -> int: 
+        return self.population
+
+    def __getitem__(self, i: int) -> int: 
+        if not 0 <= i < self.population: 
+            raise IndexError(f'index {i} out of range for population {self.population}')
+        x = self._encrypt(i)
+        while x >= self.population: 
+            x = self._encrypt(x)
+        return x
+
+    def iter(self, start: int = 0, shard: int = 0, n_shards: int = 1) -> Iterator[int]: 
+        '''
+        yields `perm[i]` for positions `start + shard, start + shard + n_shards, ...` till the population is exhausted.
+        shards of the same seed are disjoint and together cover the whole population.
+        '''
+        for i in range(start + shard, self.population, n_shards): 
+            yield self[i]
+
+    def __iter__(self) -> Iterator[int]: 
+        return self.iter()
 
-    want to achieve the effect of:
+def gen_permutation(population: int, seed: Optional[int] = None, start: int = 0, shard: int = 0, n_shards: int = 1) -> Iterator[int]: 
+    '''
+    generate every index within the range of [0, population) exactly once, in random order.
+
+    achieves the effect of:
     ```python
     xs = [idx for idx in range(population)]
     random.shuffle(xs)
-    for x in xs: 
+    for x in xs[start:][shard::n_shards]: 
         yield x
     ```
-    but memory friendly if `population` is large.
+    but in constant memory, see `RandomPermutation`.
     '''
+    return RandomPermutation(population, seed).iter(start, shard, n_shards)
 
-    # TODO[improve]: need better implementations
-    import random
-    seen = set()
-    while True: 
-        candidate = random.randint(0, population - 1)
-        for _ in range(max_try): 
-            if candidate not in seen: 
-                seen.add(candidate)
-                break
-            candidate = random.randint(0, population - 1)
-        yield candidate
+def gen_disjoint_indices(population: int, max_try: int = 3) -> Iterator[int]: 
+    '''
+    generate disjoint indices within the range of [0, population), stops once all indices are drawn.
+
+    kept for compatibility, `max_try` is no longer used. prefer `gen_permutation`.
+    '''
+    return gen_permutation(population)
+
+WINDOW_PARTIAL = ('drop', 'keep', 'fill')
+
+class RingView(Sequence): 
+    '''
+    read-only sequence view over the ring buffer of `window(..., view=True)`.
+
+    the same object is yielded for every step and is only valid until the window advances, 
+    copy it (e.g. `tuple(v)`) to keep its content.
+    '''
+    __slots__ = ('_buf', '_head')
+
+    def __init__(self, buf: List[T]) -> None: 
+        self._buf = buf
+        self._head = 0
+
+    def __len__(self) -> int: 
+        return len(self._buf)
+
+    def __getitem__(self, i): 
+        n = len(self._buf)
+        if isinstance(i, slice): 
+            return [self[j] for j in range(*i.indices(n))]
+        if i < 0: 
+            i += n
+        if not 0 <= i < n: 
+            raise IndexError('window index out of range')
+        return self._buf[(self._head + i) % n]
+
+    def __iter__(self) -> Iterator[T]: 
+        return chain(islice(self._buf, self._head, None), islice(self._buf, 0, self._head))
+
+    def __repr__(self) -> str: 
+        return f'RingView({tuple(self)})'
 
-def window(seq, n=2):
-    "Returns a sliding window (of width n) over data from the iterable"
-    "   s -> (s0,s1,...s[n-1]), (s1,s2,...,sn), ...                   "
+def _window_tail(n_consumed: int, n: int, step: int, pending: int) -> int: 
+    '''
+    number of real elements in the trailing partial window (0 if there is none).
+    `pending` is the number of elements consumed after the last full window.
+    '''
+    if n_consumed < n: 
+        return n_consumed
+    return pending - step + n if pending > 0 else 0
+
+def _tuple_window(seq, n, step, partial, fillvalue): 
     it = iter(seq)
-    result = tuple(islice(it, n))
-    if len(result) == n:
-        yield result
-    for elem in it:
-        result = result[1:] + (elem,)
-        yield result
+    buf = deque(islice(it, n), maxlen=n)
+    pending = 0
+    if len(buf) == n: 
+        yield tuple(buf)
+        for elem in it: 
+            buf.append(elem)
+            pending += 1
+            if pending == step: 
+                yield tuple(buf)
+                pending = 0
+    n_tail = _window_tail(len(buf), n, step, pending)
+    if n_tail > 0 and partial != 'drop': 
+        tail = tuple(buf)[len(buf) - n_tail:]
+        yield tail if partial == 'keep' else tail + (fillvalue,) * (n - n_tail)
+
+def _ring_window(seq, n, step, partial, fillvalue): 
+    it = iter(seq)
+    buf = list(islice(it, n))
+    pending = 0
+    if len(buf) == n: 
+        view = RingView(buf)
+        yield view
+        head = 0
+        for elem in it: 
+            buf[head] = elem
+            head = (head + 1) % n
+            pending += 1
+            if pending == step: 
+                view._head = head
+                yield view
+                pending = 0
+        buf = buf[head:] + buf[:head]
+    n_tail = _window_tail(len(buf), n, step, pending)
+    if n_tail > 0 and partial != 'drop': 
+        tail = tuple(buf[len(buf) - n_tail:])
+        yield tail if partial == 'keep' else tail + (fillvalue,) * (n - n_tail)
+
+def _array_window(arr, n, step, partial, fillvalue): 
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+    length = len(arr)
+    n_full = (length - n) // step + 1 if length >= n else 0
+    pending = length - ((n_full - 1) * step + n) if n_full > 0 else 0
+    n_tail = _window_tail(length, n, step, pending)
+    if n_tail > 0 and partial != 'drop': 
+        if partial == 'keep': 
+            raise ValueError('partial=\'keep\' would produce ragged windows over an array, use \'drop\' or \'fill\'')
+        if fillvalue is None and arr.dtype != object: 
+            raise ValueError(f'partial=\'fill\' over an array of {arr.dtype} needs a fillvalue other than None')
+        padding = np.full((n - n_tail,) + arr.shape[1:], fillvalue, dtype=arr.dtype)
+        arr = np.concatenate([arr, padding])
+    elif n_full == 0: 
+        return np.empty((0,) + arr.shape[1:] + (n,), dtype=arr.dtype)
+    return sliding_window_view(arr, n, axis=0)[::step]
+
+def _check_window_args(n: int, step: int, partial: str) -> None: 
+    if n < 1 or step < 1: 
+        raise ValueError(f'window width and step should be positive, got n={n}, step={step}')
+    if partial not in WINDOW_PARTIAL: 
+        raise ValueError(f'unknown partial window policy: {partial}, expecting one of {WINDOW_PARTIAL}')
+
+def window(seq, n: int = 2, step: int = 1, partial: str = 'drop', fillvalue=None, view: bool = False):
+    '''
+    returns a sliding window (of width n, moving `step` elements at a time) over data from the iterable
+        s -> (s0,s1,...s[n-1]), (s[step],...,s[step+n-1]), ...
+
+    @param partial : what to do with a trailing window that runs past the end of the data 
+        (only happens when elements would otherwise be left uncovered), one of `WINDOW_PARTIAL`
+        * `drop` : discard it
+        * `keep` : yield it shorter than `n`
+        * `fill` : pad it to width `n` with `fillvalue`
+    @param view : yield a read-only `RingView` over an internal ring buffer instead of a new tuple
+        per step, thus nothing is allocated per step. the view is only valid until the next step.
+
+    if `seq` is a numpy array, a (read-only, zero-copy) `sliding_window_view` of shape 
+    `(n_windows, *seq.shape[1:], n)` is returned instead of a generator. 
+    filling such a window (unless it holds objects) needs an explicit `fillvalue` that fits its dtype, 
+    e.g. `np.nan` for floats, otherwise a `ValueError` is raised.
+    '''
+    _check_window_args(n, step, partial)
+    np = sys.modules.get('numpy')
+    if np is not None and isinstance(seq, np.ndarray): 
+        return _array_window(seq, n, step, partial, fillvalue)
+    if view: 
+        return _ring_window(seq, n, step, partial, fillvalue)
+    return _tuple_window(seq, n, step, partial, fillvalue)
 
 def chunk(iterable: Iterator[T], chunk_size: int) -> Iterator[T]:
     '''chunk([4, 2, 3, 1], 3) -> [[4, 2, 3], [1]]
@@ -171,21 +708,535 @@ def chunk(iterable: Iterator[T], chunk_size: int) -> Iterator[T]:
     if ret:
         yield ret
 
+class ChunkError(Exception): 
+    '''raised by `parallel_map` when `fn` fails on an item, carries the index of the failing chunk'''
+    def __init__(self, chunk_index: int, cause: BaseException) -> None: 
+        super().__init__(f'chunk #{chunk_index} failed with {type(cause).__name__}: {cause}')
+        self.chunk_index = chunk_index
+
+def _map_chunk(fn: Callable[[T], E], xs: List[T]) -> List[E]: 
+    return [fn(x) for x in xs]
+
+def parallel_map(
+    fn: Callable[[T], E], iterable: Iterable[T], chunk_size: int = 64, workers: Optional[int] = None, 
+    backend: str = 'thread', ordered: bool = True, max_in_flight: Optional[int] = None
+) -> Iterator[E]: 
+    '''
+    `map(fn, iterable)` over a pool of workers, one task per `chunk` of `chunk_size` items.
+
+    the input is consumed lazily, at most `max_in_flight` (default `2 * workers`) chunks are 
+    submitted but not yet yielded at any time, so generators (e.g. `comment_guard(open(f))`) 
+    are streamed without being loaded whole.
+
+    @param backend : `'thread'` or `'process'` (`fn` and items must then be picklable)
+    @param ordered : yield results in input order, otherwise as soon as each chunk completes.
+
+    an exception in `fn` is re-raised as a `ChunkError` (with the original as `__cause__`).
+    '''
+    if backend not in ('thread', 'process'): 
+        raise ValueError(f'unknown backend: {backend}, expecting \'thread\' or \'process\'')
+    if chunk_size < 1: 
+        raise ValueError(f'chunk_size should be positive, got {chunk_size}')
+    return _parallel_map(fn, iterable, chunk_size, workers, backend, ordered, max_in_flight)
+
+def _parallel_map(fn, iterable, chunk_size, workers, backend, ordered, max_in_flight): 
+    import os
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * workers
+    executor = ThreadPoolExecutor if backend == 'thread' else ProcessPoolExecutor
+    chunks = enumerate(chunk(iterable, chunk_size))
+
+    def collect(idx, future): 
+        try: 
+            return future.result()
+        except Exception as e: 
+            raise ChunkError(idx, e) from e
+
+    with executor(workers) as pool: 
+        in_flight = {}
+        def submit(n: int) -> None: 
+            for idx, xs in islice(chunks, n): 
+                in_flight[pool.submit(_map_chunk, fn, xs)] = idx
+
+        try: 
+            submit(max_in_flight)
+            while in_flight: 
+                if ordered: 
+                    # dicts keep insertion order, the first entry is the oldest chunk
+                    future = next(iter(in_flight))
+                    done = [future]
+                else: 
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done: 
+                    res = collect(in_flight.pop(future), future)
+                    submit(1)
+                    yield from res
+        finally: 
+            for future in in_flight: 
+                future.cancel()
+
+# async counterparts of the generators above, for use within an asyncio event loop.
+# inputs may be either async or plain iterables.
+AnyIterable = Union[Iterable[T], AsyncIterable[T]]
+
+async def _aiter(xs: AnyIterable) -> AsyncIterator[T]: 
+    if hasattr(xs, '__aiter__'): 
+        async for x in xs: 
+            yield x
+    else: 
+        for x in xs: 
+            yield x
+
+async def aunique_filter(xs: AnyIterable) -> AsyncIterator[T]: 
+    '''async `unique_filter`'''
+    last: Optional[T] = None
+    async for x in _aiter(xs): 
+        if last != x: 
+            yield x
+        last = x
+
+async def acomment_guard(xs: AnyIterable) -> AsyncIterator[str]: 
+    '''async `comment_guard`'''
+    async for line in _aiter(xs): 
+        if _not_comment(line): 
+            yield line
+
+async def awindow(xs: AnyIterable, n: int = 2, step: int = 1, partial: str = 'drop', fillvalue=None) -> AsyncIterator[tuple]: 
+    '''async `window`, yielding tuples'''
+    _check_window_args(n, step, partial)
+    buf = deque(maxlen=n)
+    n_consumed, pending = 0, 0
+    async for x in _aiter(xs): 
+        buf.append(x)
+        if n_consumed < n: 
+            n_consumed += 1
+            if n_consumed == n: 
+                yield tuple(buf)
+            continue
+        pending += 1
+        if pending == step: 
+            yield tuple(buf)
+            pending = 0
+    n_tail = _window_tail(n_consumed, n, step, pending)
+    if n_tail > 0 and partial != 'drop': 
+        tail = tuple(buf)[len(buf) - n_tail:]
+        yield tail if partial == 'keep' else tail + (fillvalue,) * (n - n_tail)
+
+async def achunk(xs: AnyIterable, chunk_size: int, max_delay: Optional[float] = None) -> AsyncIterator[List[T]]: 
+    '''
+    async `chunk`. 
+
+    if `max_delay` (seconds) is set, a partial chunk is flushed once its first item has waited 
+    that long, so slow sources still get bounded batching latency.
+    '''
+    import asyncio
+    if max_delay is None: 
+        ret = []
+        async for x in _aiter(xs): 
+            ret.append(x)
+            if len(ret) == chunk_size: 
+                yield ret
+                ret = []
+        if ret: 
+            yield ret
+        return
+
+    loop = asyncio.get_running_loop()
+    it = _aiter(xs).__aiter__()
+    ret, deadline, pending = [], None, None
+    try: 
+        while True: 
+            if pending is None: 
+                # kept across timeouts, cancelling a pending `__anext__` would break the source
+                pending = asyncio.ensure_future(it.__anext__())
+            timeout = None if deadline is None else max(0, deadline - loop.time())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done: 
+                yield ret
+                ret, deadline = [], None
+                continue
+            future, pending = pending, None
+            try: 
+                x = future.result()
+            except StopAsyncIteration: 
+                break
+            if not ret: 
+                deadline = loop.time() + max_delay
+            ret.append(x)
+            if len(ret) == chunk_size: 
+                yield ret
+                ret, deadline = [], None
+    finally: 
+        if pending is not None: 
+            pending.cancel()
+    if ret: 
+        yield ret
+
+async def amap(fn: Callable[[T], Awaitable[E]], xs: AnyIterable, concurrency: int = 8) -> AsyncIterator[E]: 
+    '''
+    applies the coroutine function `fn` to every item, running up to `concurrency` calls at a time.
+    results are yielded in input order, the input is consumed lazily.
+    '''
+    import asyncio
+    if concurrency < 1: 
+        raise ValueError(f'concurrency should be positive, got {concurrency}')
+    in_flight = deque()
+    it = _aiter(xs).__aiter__()
+    exhausted = False
+    try: 
+        while True: 
+            while not exhausted and len(in_flight) < concurrency: 
+                try: 
+                    x = await it.__anext__()
+                except StopAsyncIteration: 
+                    exhausted = True
+                    break
+                in_flight.append(asyncio.ensure_future(fn(x)))
+            if not in_flight: 
+                break
+            yield await in_flight.popleft()
+    finally: 
+        for task in in_flight: 
+            task.cancel()
+
 def find(target: T, xs: Sequence[T], key: Callable[[T], K] = lambda x: x) -> Optional[T]: 
     '''linear search on iterable
     
     returns the target element in `xs`, returns None if not found.
+    use a `KeyedIndex` instead when searching the same `xs` repeatedly.
     '''
     for x in xs: 
         if key(x) == target: return x
     return None
 
+class KeyedIndex(Generic[T]): 
+    '''
+    a hash index over items by `key`, the repeated-lookup counterpart of `find`.
+
+    items are grouped as in `group_by`, thus `find` returns the first appended item of a key 
+    (same as a linear `find` would) while `find_all` returns all of them. 
+    a sorted index of the distinct keys is (re)built lazily on the first `range` / `prefix` query 
+    after new keys were added.
+
+    usage: 
+    ```
+    idx = KeyedIndex(records, key=lambda r: r.name)
+    idx.find('abc')                 # == find('abc', records, key=lambda r: r.name), in O(1)
+    idx.append(new_record)
+    idx.range('a', 'c')             # items with 'a' <= key < 'c', in key order
+    idx.prefix('ab')                # items with keys starting with 'ab'
+    ```
+    '''
+    def __init__(self, xs: Iterable[T] = (), key: Callable[[T], K] = lambda x: x) -> None: 
+        self.key = key
+        self._groups: Dict[K, List[T]] = {}
+        self._sorted_keys: List[K] = []
+        self._n_sorted = 0
+        self._len = 0
+        self.extend(xs)
+
+    def append(self, x: T) -> None: 
+        k = self.key(x)
+        group = self._groups.get(k)
+        if group is None: 
+            self._groups[k] = [x]
+            self._sorted_keys.append(k)
+        else: 
+            group.append(x)
+        self._len += 1
+
+    def extend(self, xs: Iterable[T]) -> None: 
+        for x in xs: 
+            self.append(x)
+
+    def __len__(self) -> int: 
+        return self._len
+
+    def __contains__(self, target: K) -> bool: 
+        return target in self._groups
+
+    def find(self, target: K) -> Optional[T]: 
+        '''returns the first item of key `target`, None if not found'''
+        group = self._groups.get(target)
+        return None if group is None else group[0]
+
+    def find_all(self, target: K) -> List[T]: 
+        '''returns all items of key `target`, in insertion order'''
+        return list(self._groups.get(target, ()))
+
+    def _sorted(self) -> List[K]: 
+        if self._n_sorted != len(self._sorted_keys): 
+            # new keys are appended at the tail, timsort merges the two runs in linear time
+            self._sorted_keys.sort()
+            self._n_sorted = len(self._sorted_keys)
+        return self._sorted_keys
+
+    def range(self, lo: Optional[K] = None, hi: Optional[K] = None, inclusive: bool = False) -> Iterator[T]: 
+        '''
+        yields items with `lo <= key < hi` (`<= hi` if `inclusive`) in key order, 
+        a missing bound is unbounded.
+        '''
+        from bisect import bisect_left, bisect_right
+        keys = self._sorted()
+        start = 0 if lo is None else bisect_left(keys, lo)
+        end = len(keys) if hi is None else (bisect_right if inclusive else bisect_left)(keys, hi)
+        for k in keys[start:end]: 
+            yield from self._groups[k]
+
+    def prefix(self, prefix: str) -> Iterator[T]: 
+        '''yields items whose (string) keys start with `prefix`, in key order'''
+        from bisect import bisect_left
+        keys = self._sorted()
+        for idx in range(bisect_left(keys, prefix), len(keys)): 
+            if not keys[idx].startswith(prefix): 
+                break
+            yield from self._groups[keys[idx]]
+
+# tree utilities over nested containers (lists, tuples, namedtuples, dicts, sets and dataclasses).
+# everything else is a `leaf`. traversals are iterative, thus not limited by the recursion depth.
+class _NodeType(): 
+    '''how to take apart (`flatten`) and rebuild (`unflatten`) one kind of container'''
+    __slots__ = ('name', 'flatten', 'unflatten', 'prototype')
+    def __init__(self, name: str, flatten: Callable, unflatten: Callable, prototype: Optional[Callable] = None) -> None: 
+        self.name = name
+        # flatten: node -> (children, aux), unflatten: (aux, children, prototype node or None) -> node
+        self.flatten = flatten
+        self.unflatten = unflatten
+        # node -> what a `TreeDef` keeps to rebuild it (no children), None if aux suffices
+        self.prototype = prototype
+
+def _rebuild_dict(aux, children, proto): 
+    t, keys = aux
+    if t is dict: 
+        return dict(zip(keys, children))
+    # keeps subclass state, e.g. `defaultdict.default_factory`
+    res = copy.copy(proto)
+    res.clear()
+    res.update(zip(keys, children))
+    return res
+
+def _empty_dict(x): 
+    if type(x) is dict: 
+        return None
+    res = copy.copy(x)
+    res.clear()
+    return res
+
+def _rebuild_dataclass(aux, children, proto): 
+    t, _ = aux
+    res = copy.copy(proto) if proto is not None else t.__new__(t)
+    for name, v in zip(aux[1], children): 
+        # also works for frozen dataclasses
+        object.__setattr__(res, name, v)
+    return res
+
+_LIST = _NodeType(
+    'list', lambda x: (x, type(x)), 
+    lambda t, children, _: children if t is list else t(children)
+)
+_TUPLE = _NodeType(
+    'tuple', lambda x: (x, type(x)), 
+    lambda t, children, _: tuple(children) if t is tuple else t(children)
+)
+_NAMEDTUPLE = _NodeType('namedtuple', lambda x: (x, type(x)), lambda t, children, _: t._make(children))
+_DICT = _NodeType('dict', lambda x: (list(x.values()), (type(x), tuple(x))), _rebuild_dict, _empty_dict)
+_SET = _NodeType('set', lambda x: (list(x), type(x)), lambda t, children, _: t(children))
+def _flatten_dataclass(x) -> Tuple[list, tuple]: 
+    import dataclasses
+    fields = dataclasses.fields(x)
+    return [getattr(x, f.name) for f in fields], (type(x), tuple(f.name for f in fields))
+
+_DATACLASS = _NodeType('dataclass', _flatten_dataclass, _rebuild_dataclass)
+
+# type -> node type (None for leaves), filled on first sight of each type
+_node_types: Dict[type, Optional[_NodeType]] = {}
+
+def _node_type_of(t: type) -> Optional[_NodeType]: 
+    try: 
+        return _node_types[t]
+    except KeyError: 
+        pass
+    if issubclass(t, tuple): 
+        nt = _NAMEDTUPLE if hasattr(t, '_fields') else _TUPLE
+    elif issubclass(t, list): 
+        nt = _LIST
+    elif issubclass(t, dict): 
+        nt = _DICT
+    elif issubclass(t, (set, frozenset)): 
+        nt = _SET
+    elif hasattr(t, '__dataclass_fields__'): 
+        # what `dataclasses.is_dataclass` checks, without importing it
+        nt = _DATACLASS
+    else: 
+        nt = None
+    _node_types[t] = nt
+    return nt
+
+class TreeDef(): 
+    '''
+    the structure of a nested container, as returned by `tree_flatten`.
+
+    stored as a post-order program, so `unflatten` rebuilds a tree from its leaves
+    with neither traversal nor type dispatch. tree defs of same-shaped trees compare equal.
+    no node of the flattened tree is kept alive, only emptied copies of dict subclasses.
+    '''
+    __slots__ = ('_program', 'n_leaves', '_signature')
+
+    def __init__(self, program: list, n_leaves: int) -> None: 
+        # entries are None for a leaf, or (node type, aux, n_children, prototype node or None)
+        self._program = program
+        self.n_leaves = n_leaves
+        self._signature = tuple(
+            None if ins is None else (ins[0].name, ins[1], ins[2]) for ins in program
+        )
+
+    def unflatten(self, leaves: Iterable) -> object: 
+        '''rebuilds the tree from exactly `n_leaves` leaves, `ValueError` otherwise'''
+        it = iter(leaves)
+        stack = []
+        n_read = 0
+        for ins in self._program: 
+            if ins is None: 
+                leaf = next(it, _exhausted)
+                if leaf is _exhausted: 
+                    raise ValueError(f'expected {self.n_leaves} leaves, got {n_read}')
+                stack.append(leaf)
+                n_read += 1
+                continue
+            node_type, aux, n, proto = ins
+            split = len(stack) - n
+            children = stack[split:]
+            del stack[split:]
+            stack.append(node_type.unflatten(aux, children, proto))
+        if next(it, _exhausted) is not _exhausted: 
+            raise ValueError(f'expected {self.n_leaves} leaves, got more')
+        return stack[0]
+
+    def flatten_up_to(self, x) -> list: 
+        '''
+        the leaves of `x`, a tree of this structure, following the stored program 
+        (no type dispatch, no `is_leaf`, no new `TreeDef`). `ValueError` if `x` is shaped differently.
+        '''
+        leaves = []
+        stack = [x]
+        # the reversed post-order program visits nodes before their children, right to left
+        for ins in reversed(self._program): 
+            v = stack.pop()
+            if ins is None: 
+                leaves.append(v)
+                continue
+            node_type, aux, n, _ = ins
+            if _node_type_of(type(v)) is not node_type: 
+                raise ValueError(f'expected a {node_type.name} node, got {type(v).__name__}')
+            children, v_aux = node_type.flatten(v)
+            if v_aux != aux or len(children) != n: 
+                raise ValueError(f'{node_type.name} node does not match the tree def ({len(children)} children, expected {n})')
+            stack.extend(children)
+        leaves.reverse()
+        return leaves
+
+    def __eq__(self, other: object) -> bool: 
+        return isinstance(other, TreeDef) and self._signature == other._signature
+
+    def __hash__(self) -> int: 
+        return hash(self._signature)
+
+    def __repr__(self) -> str: 
+        return f'TreeDef(n_leaves={self.n_leaves}, n_nodes={len(self._program)})'
+
+def tree_flatten(x, is_leaf: Optional[Callable[[object], bool]] = None) -> Tuple[list, TreeDef]: 
+    '''
+    returns the leaves of `x` (left to right) and its structure, such that 
+    `treedef.unflatten(leaves)` rebuilds `x`.
+
+    @param is_leaf : optionally stop descending into containers for which this returns True
+    '''
+    leaves, program = [], []
+    stack = [(x, False)]
+    while stack: 
+        v, is_instruction = stack.pop()
+        if is_instruction: 
+            program.append(v)
+            continue
+        nt = _node_type_of(type(v))
+        if nt is None or (is_leaf is not None and is_leaf(v)): 
+            leaves.append(v)
+            program.append(None)
+            continue
+        children, aux = nt.flatten(v)
+        proto = nt.prototype(v) if nt.prototype is not None else None
+        stack.append(((nt, aux, len(children), proto), True))
+        stack.extend((c, False) for c in reversed(children))
+    return leaves, TreeDef(program, len(leaves))
+
+def tree_unflatten(treedef: TreeDef, leaves: Iterable) -> object: 
+    return treedef.unflatten(leaves)
+
+def tree_map(
+    op: Callable, x, predicate: Callable[[object], bool] = lambda x: True, 
+    is_leaf: Optional[Callable[[object], bool]] = None
+): 
+    '''
+    returns `x` with `op` applied to every leaf satisfying `predicate`.
+
+    containers whose leaves are all left untouched are shared with the input instead of being copied.
+    for repeated transforms over same-shaped trees, flatten once with `tree_flatten` 
+    and reuse the `TreeDef` with `tree_map_leaves` instead.
+
+    @param is_leaf : optionally stop descending into containers for which this returns True
+    '''
+    nt = _node_type_of(type(x))
+    if nt is None or (is_leaf is not None and is_leaf(x)): 
+        return op(x) if predicate(x) else x
+
+    children, aux = nt.flatten(x)
+    # frame: [node, node type, aux, children, next child index, mapped children, changed]
+    stack = [[x, nt, aux, children, 0, [], False]]
+    while True: 
+        frame = stack[-1]
+        children, idx = frame[3], frame[4]
+        if idx < len(children): 
+            frame[4] = idx + 1
+            c = children[idx]
+            ct = _node_type_of(type(c))
+            if ct is None or (is_leaf is not None and is_leaf(c)): 
+                r = op(c) if predicate(c) else c
+                frame[5].append(r)
+                if r is not c: 
+                    frame[6] = True
+            else: 
+                cc, ca = ct.flatten(c)
+                stack.append([c, ct, ca, cc, 0, [], False])
+            continue
+
+        stack.pop()
+        node, nt, aux, _, _, mapped, changed = frame
+        r = nt.unflatten(aux, mapped, node) if changed else node
+        if not stack: 
+            return r
+        parent = stack[-1]
+        parent[5].append(r)
+        if changed: 
+            parent[6] = True
+
+def tree_map_leaves(
+    op: Callable, treedef: TreeDef, leaves: Sequence, predicate: Callable[[object], bool] = lambda x: True
+): 
+    '''
+    fast path of `tree_map` for trees already taken apart: maps the `leaves` of a tree 
+    (from `tree_flatten`, or `treedef.flatten_up_to`) and rebuilds it with the cached `treedef`, 
+    thus without traversing or dispatching on any container.
+    '''
+    return treedef.unflatten([op(v) if predicate(v) else v for v in leaves])
+
+def _not_plain_container(x) -> bool: 
+    return not isinstance(x, (list, tuple, dict))
+
 def apply_function(x, op, predicate):
-    if isinstance(x, (list, tuple)):
-        return type(x)(apply_function(item, op, predicate) for item in x)
-    elif isinstance(x, dict):
-        return {k: apply_function(v, op, predicate) for k, v in x.items()}
-    elif predicate(x):
-        return op(x)
-    else:
-        return x
+    '''
+    applies `op` to the leaves of nested lists, tuples and dicts satisfying `predicate`, see `tree_map`.
+    sets and dataclasses are leaves here, as they always were.
+    '''
+    return tree_map(op, x, predicate, is_leaf=_not_plain_container)
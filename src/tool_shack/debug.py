@@ -1,14 +1,27 @@
 # author: shiyao
 # created: 2021/9/16
 
-from typing import Callable, Optional, Union, Pattern, List, Dict
-from termcolor import colored
-from collections import defaultdict
-from tool_shack.scripting import ColorGradientSerializer
+import os
+import sys
 import time
-import re
+import atexit
+import threading
+from typing import Callable, Optional, Union, Pattern, Dict, List, Tuple
+from termcolor import colored
+from tool_shack.profiler import default_profiler, format_memory
+
+__all__ = [
+    'TestFunc', 'testcase', 'find_attr', 'benchmark', 'print_benchmark', 
+    'benchmark_results', 'export_benchmark', 'load_benchmark', 'compare_benchmarks', 'print_comparison',
+    'Dashboard', 'dashboard_from_env', 'format_cache',
+]
 
-__all__ = ['TestFunc', 'testcase', 'find_attr']
+def __getattr__(name: str): 
+    # formerly imported at module level, now resolved on first access (PEP 562)
+    if name == 'ColorGradientSerializer': 
+        from tool_shack.scripting import ColorGradientSerializer
+        return ColorGradientSerializer
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 TestFunc = Callable[[], None]
    
@@ -41,6 +54,7 @@ def testcase(should_fail: bool = False):
 def find_attr(obj: object, pattern: Union[str, Pattern[str]]) -> None: 
     '''print list of matching attribute names associated with `obj`'''
 
+    import re
     pat = re.compile(pattern) if isinstance(pattern, str) else pattern
     candidates = (filter(lambda attrname: pat.search(attrname) is not None, dir(obj)))
     
@@ -58,43 +72,331 @@ def find_attr(obj: object, pattern: Union[str, Pattern[str]]) -> None:
     for c in candidates: 
         print(f'{colored(c, "green")} | {ignore_longer(getattr(obj, c).__doc__, 50)}')
 
-_benchmark_logs: Dict[str, List[float]] = defaultdict(lambda: [0])
+def benchmark(func=None, *, every: Optional[int] = None, sample_rate: Optional[float] = None, memory: bool = False): 
+    '''
+    times calls of `func` (sync or async) with the default hierarchical profiler, 
+    see `tool_shack.profiler.Profiler`. results are shown by `print_benchmark`.
 
-def benchmark(func): 
-    def decorated(*args, **kwargs): 
-        start = time.perf_counter()
-        res = func(*args, **kwargs)
-        end = time.perf_counter()
+    usable as `@benchmark`, or as `@benchmark(every=100)` / `@benchmark(sample_rate=0.01)` 
+    to only time a fraction of the calls of very hot functions (calls are still counted exactly).
+    `@benchmark(memory=True)` additionally records allocations (tracemalloc), rss and gc activity per call.
+    '''
+    if func is None: 
+        return lambda f: default_profiler.profile(f, every=every, sample_rate=sample_rate, memory=memory)
+    return default_profiler.profile(func, every=every, sample_rate=sample_rate, memory=memory)
 
-        elapsed = end - start
-        _benchmark_logs[func.__qualname__][0] += 1
-        _benchmark_logs[func.__qualname__].append(elapsed)
+def format_cache(c) -> str: 
+    '''one line summary of a `CacheStats`'''
+    return (
+        f'{c.hits} hits, {c.misses} misses ({c.hit_rate:.1%} hit rate), {c.evictions} evictions, '
+        f'saved ~{c.saved_time:.3f}s'
+    )
 
-        return res
-    return decorated
+def print_benchmark(call_tree: bool = False, top_allocations: int = 0): 
+    '''
+    prints timings (and memory usage, for `memory=True` functions) of every `benchmark`ed function,
+    and the hit / miss counters of cached functions.
 
-def print_benchmark(): 
-    import numpy as np 
-    collected = []
-    for name, logs in _benchmark_logs.items(): 
-        log = np.array(logs[1:])
-        nc = logs[0]
-        collected.append((name, log.mean(), log.std(), log.min(), log.max(), nc))
+    @param call_tree : also print the call tree of every thread
+    @param top_allocations : also print the source lines holding most traced memory
+    '''
+    report = default_profiler.report()
+    collected = [
+        (name, r.stats.mean, r.stats.std, r.stats.min, r.stats.max, r.calls, r.stats, r.self_time)
+        for name, r in report.items() if r.stats.count > 0
+    ]
+    for name, r in report.items(): 
+        if r.stats.count == 0 and r.cache is not None: 
+            print(f'{colored(name, attrs=["bold"])}\t| cache: {format_cache(r.cache)}')
+    if not collected: 
+        return
     
     # sorted by `mean` DESC
     collected.sort(key=lambda x: -x[1])
+    from tool_shack.scripting import ColorGradientSerializer
     painter = ColorGradientSerializer(
         (collected[-1][1], collected[0][1]), 
         reverse_gradient=True
     )
 
     fmt = '%.3f'
-    for name, mean, std, mini, maxi, nc in collected: 
+    for name, mean, std, mini, maxi, nc, stats, self_time in collected: 
         print(f'{colored(name, attrs=["bold"])}', end='\t| ')
-        print(f'{nc} calls, ', end='')
-        print(f'elapsed: {painter(mean,fmt)}s±{std:.3f} in [{painter(mini,fmt)} ~ {painter(maxi,fmt)}]s')
+        sampled = '' if nc == stats.count else f' ({stats.count} timed)'
+        print(f'{nc} calls{sampled}, ', end='')
+        print(f'elapsed: {painter(mean,fmt)}s±{std:.3f} in [{painter(mini,fmt)} ~ {painter(maxi,fmt)}]s', end=' | ')
+        print(f'p50/p95/p99: {stats.quantile(.5):.3f}/{stats.quantile(.95):.3f}/{stats.quantile(.99):.3f}s', end=' | ')
+        if nc == stats.count: 
+            print(f'self: {self_time:.3f}s of {stats.total:.3f}s')
+        else: 
+            # extrapolated from the timed calls to all of them
+            total = report[name].estimated_total
+            self_total = self_time * total / stats.total if stats.total > 0 else 0.
+            print(f'self: ~{self_total:.3f}s of ~{total:.3f}s (extrapolated)')
+        if report[name].memory is not None: 
+            print(f'\t| memory: {format_memory(report[name].memory)}')
+        if report[name].cache is not None: 
+            print(f'\t| cache: {format_cache(report[name].cache)}')
 
-    
-    
+    if call_tree: 
+        print(default_profiler.format_call_tree())
+    if top_allocations > 0: 
+        from tool_shack.profiler import top_allocations as _top_allocations
+        for stat in _top_allocations(top_allocations): 
+            print(stat)
+
+# machine readable benchmark results, and regression checks between two runs
+BENCHMARK_FIELDS = ('name', 'calls', 'count', 'mean', 'std', 'min', 'max', 'total', 'self_time', 'p50', 'p95', 'p99')
+
+def _environment_metadata() -> Dict[str, str]: 
+    import platform
+    import subprocess
+    from tool_shack.core import now_str
+    try: 
+        git_hash = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError): 
+        git_hash = ''
+    return {
+        'python': platform.python_version(), 
+        'implementation': platform.python_implementation(), 
+        'platform': platform.platform(), 
+        'cpu_count': str(os.cpu_count()), 
+        'git_hash': git_hash, 
+        'time': now_str(), 
+    }
+
+def benchmark_results() -> Dict[str, Dict[str, float]]: 
+    '''
+    current `benchmark` timings as plain dicts (one per decorated function, keyed by name).
+    names without a finished call yet (an open region, cache statistics only) are left out.
+    '''
+    results = {}
+    for name, r in default_profiler.report().items(): 
+        s = r.stats
+        if s.count == 0: 
+            continue
+        results[name] = {
+            'name': name, 'calls': r.calls, 'count': s.count, 'mean': s.mean, 'std': s.std, 'min': s.min, 'max': s.max, 
+            'total': s.total, 'self_time': r.self_time, 
+            'p50': s.quantile(.5), 'p95': s.quantile(.95), 'p99': s.quantile(.99), 
+        }
+    return results
+
+def export_benchmark(path: str, format: Optional[str] = None) -> None: 
+    '''
+    writes the `benchmark` timings along with environment metadata 
+    (python version, cpu count, git hash if available, ...) to `path`.
+
+    @param format : `json` or `csv`, by default taken from the file extension.
+        csv files carry the metadata as leading `# key: value` comment lines.
+    '''
+    import json
+    import csv
+    format = format or ('csv' if path.endswith('.csv') else 'json')
+    metadata, results = _environment_metadata(), benchmark_results()
+    with open(path, 'w', newline='') as f: 
+        if format == 'json': 
+            json.dump({'metadata': metadata, 'results': results}, f, indent=2, allow_nan=False)
+        elif format == 'csv': 
+            for k, v in metadata.items(): 
+                f.write(f'# {k}: {v}\n')
+            writer = csv.DictWriter(f, fieldnames=BENCHMARK_FIELDS)
+            writer.writeheader()
+            writer.writerows(results.values())
+        else: 
+            raise ValueError(f'unknown benchmark export format: {format}')
+
+def load_benchmark(path: str) -> Dict[str, Dict[str, float]]: 
+    '''reads the results written by `export_benchmark` (json or csv) back'''
+    import json
+    import csv
+    from tool_shack.data import comment_guard
+    with open(path, newline='') as f: 
+        if not path.endswith('.csv'): 
+            return json.load(f)['results']
+        return {
+            row['name']: {k: (v if k == 'name' else float(v)) for k, v in row.items()}
+            for row in csv.DictReader(comment_guard(f))
+        }
+
+class BenchmarkComparison(): 
+    '''the outcome of comparing one function's timings between a baseline and a current run'''
+    __slots__ = ('name', 'status', 'baseline', 'current')
+
+    def __init__(self, name: str, status: str, baseline: Optional[dict], current: Optional[dict]) -> None: 
+        self.name = name
+        # one of `regression`, `improvement`, `unchanged`, `new` or `missing`
+        self.status = status
+        self.baseline = baseline
+        self.current = current
+
+    @property
+    def ratio(self) -> float: 
+        '''current mean over baseline mean'''
+        if self.baseline is None or self.current is None or self.baseline['mean'] == 0: 
+            return float('nan')
+        return self.current['mean'] / self.baseline['mean']
+
+def _mean_interval(result: dict, z: float) -> Tuple[float, float]: 
+    half = z * result['std'] / max(result['count'], 1) ** .5
+    return result['mean'] - half, result['mean'] + half
+
+def compare_benchmarks(
+    baseline: Union[str, dict], current: Union[str, dict], 
+    confidence: float = 0.95, threshold: float = 0.05
+) -> List[BenchmarkComparison]: 
+    '''
+    compares mean timings per function of two benchmark results (paths or dicts from `benchmark_results`).
+
+    a function is a `regression` if the confidence interval of its current mean lies entirely above
+    the baseline's and the mean grew by more than `threshold` (relative), `improvement` vice versa.
+    '''
+    from statistics import NormalDist
+    baseline = load_benchmark(baseline) if isinstance(baseline, str) else baseline
+    current = load_benchmark(current) if isinstance(current, str) else current
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+
+    res = []
+    for name in sorted(set(baseline) | set(current)): 
+        base, cur = baseline.get(name), current.get(name)
+        if base is None or cur is None: 
+            res.append(BenchmarkComparison(name, 'new' if base is None else 'missing', base, cur))
+            continue
+        base_lo, base_hi = _mean_interval(base, z)
+        cur_lo, cur_hi = _mean_interval(cur, z)
+        status = 'unchanged'
+        if cur_lo > base_hi and cur['mean'] > base['mean'] * (1 + threshold): 
+            status = 'regression'
+        elif cur_hi < base_lo and cur['mean'] < base['mean'] * (1 - threshold): 
+            status = 'improvement'
+        res.append(BenchmarkComparison(name, status, base, cur))
+    return res
+
+def print_comparison(comparisons: List[BenchmarkComparison]) -> None: 
+    colors = {'regression': 'red', 'improvement': 'green'}
+    for c in comparisons: 
+        base = '-' if c.baseline is None else f'{c.baseline["mean"]:.6f}s'
+        cur = '-' if c.current is None else f'{c.current["mean"]:.6f}s'
+        print(f'{colored(c.name, attrs=["bold"])}\t| {base} -> {cur} (x{c.ratio:.3f}) | {colored(c.status, colors.get(c.status))}')
+
+# live view of the profiler while the program runs
+DASHBOARD_ENV = 'TOOL_SHACK_DASHBOARD'
+
+class Dashboard(): 
+    '''
+    a background thread redrawing, in place (ANSI cursor control), the call rate, mean, p95 
+    and number of calls of the `top` functions of `profiler` (by total time) every `interval` seconds.
+
+    the refresh interval backs off so that drawing takes at most `max_overhead` of the wall time.
+    other output to `stream` (stderr by default) while the dashboard runs garbles the view.
+
+    usage: 
+    ```
+    with Dashboard(interval=0.5): 
+        run()
+    ```
+    or set the environment variable `TOOL_SHACK_DASHBOARD` to `1` (or a refresh interval in seconds) 
+    to start one for `benchmark` when this module is imported.
+    '''
+    def __init__(self, profiler=None, interval: float = 1., stream=None, top: int = 20, max_overhead: float = 0.05) -> None: 
+        from tool_shack.scripting import ColorGradientSerializer
+        self.profiler = profiler or default_profiler
+        self.interval = interval
+        self.stream = stream
+        self.top = top
+        self.max_overhead = max_overhead
+        self.painter = ColorGradientSerializer(n_history=4 * top, reverse_gradient=True)
+        self._last_calls: Dict[str, int] = {}
+        self._last_time: Optional[float] = None
+        self._n_drawn = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def render(self) -> List[str]: 
+        '''lines of one frame, rates are calls per second since the previous frame'''
+        now = time.perf_counter()
+        report = self.profiler.report()
+        dt = None if self._last_time is None else max(now - self._last_time, 1e-9)
+        rows = sorted((r for r in report.values() if r.calls > 0), key=lambda r: -r.estimated_total)[:self.top]
+
+        lines = [colored(f'{"function":<32}{"calls/s":>12}{"mean ms":>12}{"p95 ms":>12}{"calls":>12}', attrs=['bold'])]
+        if rows: 
+            means = self.painter.color_many([r.stats.mean * 1e3 for r in rows], '%12.3f')
+            for r, mean in zip(rows, means): 
+                rate = '-' if dt is None else f'{(r.calls - self._last_calls.get(r.name, 0)) / dt:.1f}'
+                p95 = r.stats.quantile(.95) * 1e3 if r.stats.count > 0 else float('nan')
+                lines.append(f'{r.name[:31]:<32}{rate:>12}{mean}{p95:12.3f}{r.calls:>12}')
+        self._last_calls = {name: r.calls for name, r in report.items()}
+        self._last_time = now
+        return lines
+
+    def draw(self) -> None: 
+        stream = self.stream or sys.stderr
+        lines = self.render()
+        # back to the first line of the previous frame, and clear it to the end of screen
+        rewind = f'\x1b[{self._n_drawn}F' if self._n_drawn else ''
+        stream.write(rewind + '\x1b[J' + '\n'.join(lines) + '\n')
+        stream.flush()
+        self._n_drawn = len(lines)
+
+    def _run(self) -> None: 
+        wait = self.interval
+        while not self._stop.wait(wait): 
+            start = time.perf_counter()
+            self.draw()
+            wait = max(self.interval, (time.perf_counter() - start) / self.max_overhead)
+
+    def start(self) -> 'Dashboard': 
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='Dashboard', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self) -> None: 
+        '''stops refreshing, after drawing the final state'''
+        if self._thread is None: 
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        atexit.unregister(self.stop)
+        self.draw()
+
+    def __enter__(self) -> 'Dashboard': 
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None: 
+        self.stop()
+
+def dashboard_from_env(**kwargs) -> Optional[Dashboard]: 
+    '''starts a `Dashboard(**kwargs)` if `TOOL_SHACK_DASHBOARD` is set to a true value or a refresh interval'''
+    value = os.environ.get(DASHBOARD_ENV, '').strip().lower()
+    if value in ('', '0', 'false', 'no', 'off'): 
+        return None
+    try: 
+        kwargs.setdefault('interval', float(value))
+    except ValueError: 
+        pass
+    return Dashboard(**kwargs).start()
+
+_env_dashboard = dashboard_from_env()
+
+def main(argv: Optional[List[str]] = None) -> int: 
+    '''`python -m tool_shack.debug baseline.json current.json`, exits with 1 on regressions'''
+    import argparse
+    parser = argparse.ArgumentParser(description='compare two exported benchmark results')
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--threshold', type=float, default=0.05, help='minimal relative slowdown to report')
+    args = parser.parse_args(argv)
 
+    comparisons = compare_benchmarks(args.baseline, args.current, args.confidence, args.threshold)
+    print_comparison(comparisons)
+    return int(any(c.status == 'regression' for c in comparisons))
 
+if __name__ == '__main__': 
+    sys.exit(main())
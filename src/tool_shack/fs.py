@@ -3,38 +3,216 @@ import os
 import math
 import hashlib
 import sys
-from typing import Callable, TextIO, Any, TypeVar, Generic, Union
+import threading
+from collections import OrderedDict
+from typing import Callable, TextIO, Any, TypeVar, Generic, Union, Optional, Tuple, Hashable, Iterable, List
 
 class HashFilenameMapper(): 
+    '''
+    maps `parent_dir/filename` to `parent_dir/xx/filename`, with `xx` one of `n_bins` hex-named 
+    bin directories picked by the md5 digest of `filename`. bins are created on initialization unless `debug`.
+
+    see `storage.ShardedStore` for multi-level bins and a complete key-value interface.
+    '''
     def __init__(self,  parent_dir: str, n_bins: int = 128, debug=False) -> None: 
         self.debug = debug
         mod_depth = math.log2(n_bins)
         assert int(mod_depth) == mod_depth, f'n_bins must be a power of 2'
-        self.mod_depth = mod_depth
-        self.mod_depth_hex = int(math.ceil(mod_depth / 4))
+        self.mod_depth = int(mod_depth)
+        self.mod_depth_hex = max(1, int(math.ceil(mod_depth / 4)))
         self.n_bins = n_bins
 
         self.parent_dir = parent_dir
         self.prepare_parent_dir()
     
+    def bin_name(self, i: int) -> str: 
+        return f'{i:0{self.mod_depth_hex}x}'
+
     def prepare_parent_dir(self, ) -> None: 
         if not self.debug: 
             for i in range(self.n_bins): 
-                os.makedirs(f'i', exist_ok=True)
+                os.makedirs(osp.join(self.parent_dir, self.bin_name(i)), exist_ok=True)
 
     def __call__(self, p: str) -> str: 
         parent = osp.dirname(p)
-        assert parent == self.parent_dit
+        assert osp.normpath(parent) == osp.normpath(self.parent_dir), f'{p} is not in {self.parent_dir}'
         filename = osp.basename(p)
 
-        m = int(hashlib.md5().update(filename).hexdigest()[-self.mod_depth_hex:], base=16)
-        target = m % self.mod_depth
-        return osp.join(parent, target, filename)
+        m = int(hashlib.md5(filename.encode('utf-8')).hexdigest()[-self.mod_depth_hex:], base=16)
+        target = m % self.n_bins
+        return osp.join(parent, self.bin_name(target), filename)
 
 
 T = TypeVar('T')
-class DeferedReadError(Generic[T]): 
+
+_prefetch_pool = None
+_prefetch_pool_lock = threading.Lock()
+
+def _default_prefetch_pool(): 
+    global _prefetch_pool
+    with _prefetch_pool_lock: 
+        if _prefetch_pool is None: 
+            from concurrent.futures import ThreadPoolExecutor
+            _prefetch_pool = ThreadPoolExecutor(thread_name_prefix='LazyLoad')
+        return _prefetch_pool
+
+class LoadCache(): 
+    '''
+    LRU cache of loaded files shared by `LazyLoad`s, keyed by (path, loader, do_open) and 
+    checked against the file's mtime and size on every lookup, so that changed files are loaded again.
+
+    bounded by `max_items` entries and / or `max_bytes`, as estimated by `sizeof`. 
+    the default `sys.getsizeof` is shallow, pass e.g. `lambda a: a.nbytes` for numpy arrays.
+    '''
+    def __init__(self, max_items: Optional[int] = None, max_bytes: Optional[int] = None, sizeof: Callable[[Any], int] = sys.getsizeof) -> None: 
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        # key -> ((mtime, size), value, estimated bytes), least recently used first
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, stamp: Tuple[int, int]) -> Tuple[bool, Any]: 
+        '''(found, value) of `key`, if cached with the same `stamp`'''
+        with self._lock: 
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stamp: 
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def contains(self, key: Hashable, stamp: Tuple[int, int]) -> bool: 
+        '''whether `key` is cached with the same `stamp`, without counting a hit or a miss'''
+        with self._lock: 
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] == stamp
+
+    def put(self, key: Hashable, stamp: Tuple[int, int], value: Any) -> None: 
+        n_bytes = self.sizeof(value)
+        with self._lock: 
+            old = self._entries.pop(key, None)
+            if old is not None: 
+                self.n_bytes -= old[2]
+            self._entries[key] = (stamp, value, n_bytes)
+            self.n_bytes += n_bytes
+            while self._entries and (
+                (self.max_items is not None and len(self._entries) > self.max_items) or 
+                (self.max_bytes is not None and self.n_bytes > self.max_bytes)
+            ): 
+                _, (_, _, evicted_bytes) = self._entries.popitem(last=False)
+                self.n_bytes -= evicted_bytes
+
+    def __len__(self) -> int: 
+        return len(self._entries)
+
+    def clear(self) -> None: 
+        with self._lock: 
+            self._entries.clear()
+            self.n_bytes = 0
+
+class LazyLoad(Generic[T]): 
+    '''defers reading and parsing a file till the loaded content is first accessed through `.loaded`.
+
+    parameters: 
+    * `filename`: path to the file to be read. will be passed to `loader`.
+    * `loader`: maps an open file handler or a path string to the loaded data structure.
+        errors of reading (e.g. `FileNotFoundError`) and loading are raised on access.
+    * do_open: determines the type of the loader. if set (default), loader: (TextIO) -> T, 
+        if not set, loader: (str) -> T.
+    * prefetch: if set, the file is loaded right away on a shared thread pool 
+        (or on the given `concurrent.futures.Executor`), and `.loaded` waits for it.
+    * cache: a `LoadCache` to share loaded files between instances, unless the files changed since.
+        instances then keep no reference to the content, every access looks it up in the cache 
+        (and reads the file again once evicted), so that the cache bounds the memory taken.
+
+    usage: 
+    ```
+    # all files are read in parallel in the background
+    features = LazyLoad.many(paths, np.load, do_open=False, prefetch=True, cache=LoadCache(max_bytes=2**30, sizeof=lambda a: a.nbytes))
+    
+    # waits for (at most) the file being read
+    features[0].loaded
+    ```
+    '''
+    def __init__(self, filename: str, loader: Callable[[Union[TextIO, str]], T], do_open: bool = True, 
+        prefetch: Union[bool, Any] = False, cache: Optional[LoadCache] = None) -> None: 
+        self.filename = filename
+        self.loader = loader
+        self.do_open = do_open
+        self.cache = cache
+        self._loaded: Optional[T] = None
+        self._done = False
+        self._lock = threading.Lock()
+        self._future = None
+        if prefetch: 
+            pool = _default_prefetch_pool() if prefetch is True else prefetch
+            self._future = pool.submit(self._load)
+
+    @classmethod
+    def many(cls, filenames: Iterable[str], loader: Callable[[Union[TextIO, str]], T], do_open: bool = True, 
+        prefetch: Union[bool, Any] = False, cache: Optional[LoadCache] = None) -> List['LazyLoad[T]']: 
+        return [cls(f, loader, do_open, prefetch, cache) for f in filenames]
+
+    def _read(self) -> T: 
+        if self.do_open: 
+            with open(self.filename) as f: 
+                return self.loader(f)
+        return self.loader(self.filename)
+
+    def _cache_key(self) -> Tuple[Hashable, Tuple[int, int]]: 
+        st = os.stat(self.filename)
+        return (osp.abspath(self.filename), self.loader, self.do_open), (st.st_mtime_ns, st.st_size)
+
+    def _load(self) -> T: 
+        if self.cache is None: 
+            return self._read()
+        key, stamp = self._cache_key()
+        found, value = self.cache.get(key, stamp)
+        if not found: 
+            # stamped before reading: a change during the read only causes another read later
+            value = self._read()
+            self.cache.put(key, stamp, value)
+        return value
+
+    @property
+    def is_loaded(self) -> bool: 
+        if self.cache is None: 
+            return self._done
+        future = self._future
+        if future is not None: 
+            return future.done()
+        try: 
+            return self.cache.contains(*self._cache_key())
+        except OSError: 
+            return False
+
+    @property
+    def loaded(self) -> T: 
+        if self._done: 
+            return self._loaded
+        if self.cache is not None: 
+            # the prefetched value is handed out once, later accesses go through the cache
+            future, self._future = self._future, None
+            return future.result() if future is not None else self._load()
+        with self._lock: 
+            if not self._done: 
+                self._loaded = self._future.result() if self._future is not None else self._load()
+                self._done = True
+        return self._loaded
+
+    def refresh(self) -> None: 
+        '''forgets the loaded content, the next access loads it again (from the cache, if still valid)'''
+        with self._lock: 
+            self._loaded, self._done, self._future = None, False, None
+
+class DeferedReadError(LazyLoad[T]): 
     '''defers a `FileNotFound` error till the loaded content is actually being read, instead of on initialization.
+    unlike `LazyLoad`, the file itself is read eagerly.
     
     parameters: 
     * `filename`: path to the file to be read. will be passed to `loader`.
@@ -60,20 +238,16 @@ class DeferedReadError(Generic[T]):
     
     '''
     def __init__(self, filename: str, loader: Callable[[Union[TextIO, str]], T], do_open: bool = True) -> None: 
-        self._loaded = None
-        self.filename = filename
+        super().__init__(filename, loader, do_open)
+        self._missing = False
         try: 
-            if do_open: 
-                with open(filename) as f: 
-                    self._loaded = loader(f)
-            else: 
-                self._loaded = loader(filename)
+            super().loaded
         except FileNotFoundError: 
+            self._missing = True
             print(f'warn: file [{filename}] cannot be loaded but carry on.', file=sys.stderr)
     
     @property
     def loaded(self, ) -> T: 
-        if self._loaded is not None: 
-            return self._loaded
-        else: 
+        if self._missing: 
             raise FileNotFoundError(f'error: file [{self.filename}] not found, but was acutally read!')
+        return super().loaded
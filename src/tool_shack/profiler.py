@@ -0,0 +1,841 @@
+# low overhead, fixed memory, hierarchical timing of decorated functions and regions.
+# backs `tool_shack.debug.benchmark` and `tool_shack.debug.print_benchmark`.
+import math
+import time
+import weakref
+import functools
+import threading
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+# bucket index of non-positive values, sorts before every other bucket
+_ZERO_BUCKET = -(1 << 40)
+
+class LogHistogram(): 
+    '''
+    histogram of positive values with fixed relative precision (HDR-style).
+
+    each power of two is split into `2 * sub_buckets` linear buckets,
+    so quantiles are accurate within ~`1 / (2 * sub_buckets)` relative error (0.8% by default)
+    and memory is bounded by the dynamic range of the values, not their number.
+    '''
+    __slots__ = ('sub_buckets', 'counts', '_span')
+
+    def __init__(self, sub_buckets: int = 64) -> None: 
+        self.sub_buckets = sub_buckets
+        self.counts: Dict[int, int] = {}
+        self._span = 2 * sub_buckets
+
+    def add(self, v: float) -> None: 
+        if v > 0: 
+            # mantissa in [0.5, 1), thus `int(m * 2 * span)` is `span + sub-bucket`
+            m, e = math.frexp(v)
+            idx = e * self._span + int(m * 2 * self._span)
+        else: 
+            idx = _ZERO_BUCKET
+        counts = self.counts
+        counts[idx] = counts.get(idx, 0) + 1
+
+    def _bucket_value(self, idx: int) -> float: 
+        if idx == _ZERO_BUCKET: 
+            return 0.
+        e, sub = divmod(idx, self._span)
+        return math.ldexp(0.5 + (sub + 0.5) / (2 * self._span), e - 1)
+
+    def quantile(self, q: float) -> float: 
+        '''value below which a fraction `q` of the samples fall (nan if empty)'''
+        n = sum(self.counts.values())
+        if n == 0: 
+            return math.nan
+        rank = q * (n - 1)
+        seen = 0
+        for idx in sorted(self.counts): 
+            seen += self.counts[idx]
+            if seen > rank: 
+                return self._bucket_value(idx)
+        return self._bucket_value(max(self.counts))
+
+    def merge(self, other: 'LogHistogram') -> None: 
+        assert other.sub_buckets == self.sub_buckets, 'cannot merge histograms of different precisions'
+        for idx, c in other.counts.items(): 
+            self.counts[idx] = self.counts.get(idx, 0) + c
+
+class StreamingStats(): 
+    '''
+    running count / mean / variance (welford) / min / max / total of a stream of values,
+    plus a `LogHistogram` for quantiles. memory does not grow with the number of samples.
+    '''
+    __slots__ = ('count', 'mean', '_m2', 'min', 'max', 'total', 'hist')
+
+    def __init__(self) -> None: 
+        self.count = 0
+        self.mean = 0.
+        self._m2 = 0.
+        self.min = math.inf
+        self.max = -math.inf
+        self.total = 0.
+        self.hist = LogHistogram()
+
+    def add(self, v: float) -> None: 
+        self.count += 1
+        delta = v - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (v - self.mean)
+        self.total += v
+        if v < self.min: self.min = v
+        if v > self.max: self.max = v
+        self.hist.add(v)
+
+    def merge(self, other: 'StreamingStats') -> None: 
+        '''merges `other` into `self` (chan et al. parallel variance)'''
+        if other.count == 0: 
+            return
+        n = self.count + other.count
+        delta = other.mean - self.mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / n
+        self.mean += delta * other.count / n
+        self.count = n
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.hist.merge(other.hist)
+
+    @property
+    def var(self) -> float: 
+        '''population variance (same as `numpy.var`)'''
+        return self._m2 / self.count if self.count else math.nan
+
+    @property
+    def std(self) -> float: 
+        return math.sqrt(self.var) if self.count else math.nan
+
+    def quantile(self, q: float) -> float: 
+        return self.hist.quantile(q)
+
+# opt-in memory accounting: tracemalloc peak / net allocations, rss and garbage collections.
+# note that all of these are process wide, concurrent threads add to each other's numbers.
+def rss_bytes() -> int: 
+    '''resident set size of this process, read from `/proc/self/statm` (0 where unavailable)'''
+    import os
+    try: 
+        with open('/proc/self/statm') as f: 
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError): 
+        return 0
+
+# cumulative [number of collections, seconds spent collecting], maintained by `_gc_callback`
+_gc_totals = [0, 0.]
+_gc_started = [0.]
+
+def _gc_callback(phase: str, info: dict) -> None: 
+    if phase == 'start': 
+        _gc_started[0] = time.perf_counter()
+    else: 
+        _gc_totals[0] += 1
+        _gc_totals[1] += time.perf_counter() - _gc_started[0]
+
+class MemoryDelta(): 
+    '''memory accounting of one call / region, all sizes in bytes'''
+    __slots__ = ('peak', 'net', 'rss', 'gc_collections', 'gc_pause')
+
+    def __init__(self, peak: int, net: int, rss: int, gc_collections: int, gc_pause: float) -> None: 
+        # highest traced allocation above the level at entry
+        self.peak = peak
+        # traced memory still allocated at exit
+        self.net = net
+        self.rss = rss
+        self.gc_collections = gc_collections
+        self.gc_pause = gc_pause
+
+class _MemoryFrame(): 
+    __slots__ = ('current', 'rss', 'gc_collections', 'gc_pause', 'peak')
+
+    def __init__(self, current: int) -> None: 
+        self.current = current
+        self.rss = rss_bytes()
+        self.gc_collections, self.gc_pause = _gc_totals
+        # highest absolute traced memory seen so far, tracemalloc's own peak is reset by nested frames
+        self.peak = current
+
+# frames of the memory profiled calls / regions running, tracing and the gc callback are on while there are any
+_memory_frames: List[_MemoryFrame] = []
+_memory_lock = threading.Lock()
+# whether the first running frame started tracemalloc, and the last one should stop it
+_tracing_owned = [False]
+
+def _memory_enter() -> _MemoryFrame: 
+    import gc
+    import tracemalloc
+    with _memory_lock: 
+        if not _memory_frames: 
+            _tracing_owned[0] = not tracemalloc.is_tracing()
+            if _tracing_owned[0]: 
+                tracemalloc.start()
+            gc.callbacks.append(_gc_callback)
+        current, peak = tracemalloc.get_traced_memory()
+        for f in _memory_frames: 
+            f.peak = max(f.peak, peak)
+        tracemalloc.reset_peak()
+        frame = _MemoryFrame(current)
+        _memory_frames.append(frame)
+    return frame
+
+def _memory_exit(frame: _MemoryFrame) -> MemoryDelta: 
+    import gc
+    import tracemalloc
+    with _memory_lock: 
+        current, peak = tracemalloc.get_traced_memory()
+        _memory_frames.remove(frame)
+        for f in _memory_frames: 
+            f.peak = max(f.peak, peak)
+        peak = max(peak, frame.peak)
+        if not _memory_frames: 
+            # tracing slows down every allocation, and the callback every collection
+            gc.callbacks.remove(_gc_callback)
+            if _tracing_owned[0]: 
+                tracemalloc.stop()
+    return MemoryDelta(
+        peak - frame.current, current - frame.current, rss_bytes() - frame.rss, 
+        _gc_totals[0] - frame.gc_collections, _gc_totals[1] - frame.gc_pause
+    )
+
+class MemoryStats(): 
+    '''aggregated `MemoryDelta`s of a function / region'''
+    __slots__ = ('peak', 'net', 'rss', 'gc_collections', 'gc_pause')
+
+    def __init__(self) -> None: 
+        # distribution of per-call peaks, the other fields are totals over all calls
+        self.peak = StreamingStats()
+        self.net = 0
+        self.rss = 0
+        self.gc_collections = 0
+        self.gc_pause = 0.
+
+    def add(self, delta: MemoryDelta) -> None: 
+        self.peak.add(delta.peak)
+        self.net += delta.net
+        self.rss += delta.rss
+        self.gc_collections += delta.gc_collections
+        self.gc_pause += delta.gc_pause
+
+    def copy(self) -> 'MemoryStats': 
+        res = MemoryStats()
+        res.peak.merge(self.peak)
+        res.net, res.rss, res.gc_collections, res.gc_pause = self.net, self.rss, self.gc_collections, self.gc_pause
+        return res
+
+def format_memory(m) -> str: 
+    '''one line summary of a `MemoryDelta` or `MemoryStats`'''
+    from humanize import naturalsize
+    peak = m.peak if isinstance(m.peak, (int, float)) else m.peak.max
+    return (
+        f'peak +{naturalsize(peak)}, net {naturalsize(m.net)}, rss {naturalsize(m.rss)}, '
+        f'gc: {m.gc_collections} collections in {m.gc_pause:.3f}s'
+    )
+
+class CacheStats(): 
+    '''
+    hit / miss counters of a caching decorator, with the time spent serving hits and computing misses.
+    updated by the caches themselves (from any thread), reported next to the timings of the same name.
+    '''
+    def __init__(self) -> None: 
+        # guards the counters, caches may hold it to update them directly along with their own state
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None: 
+        with self.lock: 
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.hit_time = 0.
+            self.miss_time = 0.
+            # hits of caches knowing what each hit saved (the computation time of its value)
+            self.exact_hits = 0
+            self.exact_saved = 0.
+
+    def record_hit(self, elapsed: float, saved: Optional[float] = None) -> None: 
+        with self.lock: 
+            self.hits += 1
+            self.hit_time += elapsed
+            if saved is not None: 
+                self.exact_hits += 1
+                self.exact_saved += saved
+
+    def record_miss(self, elapsed: float) -> None: 
+        with self.lock: 
+            self.misses += 1
+            self.miss_time += elapsed
+
+    def record_evictions(self, n: int) -> None: 
+        with self.lock: 
+            self.evictions += n
+
+    @property
+    def hit_rate(self) -> float: 
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.
+
+    @property
+    def saved_time(self) -> float: 
+        '''time saved by the hits, exact if every hit reported it, otherwise estimated with the mean time of a miss'''
+        if self.exact_hits == self.hits: 
+            return self.exact_saved
+        if self.misses == 0: 
+            return 0.
+        return self.hits * self.miss_time / self.misses - self.hit_time
+
+def top_allocations(n: int = 10, key_type: str = 'lineno') -> list: 
+    '''
+    the `n` source lines (or `key_type` as in `tracemalloc.Snapshot.statistics`) holding 
+    the most traced memory right now. empty unless tracemalloc is tracing 
+    (within a memory profiled call / region, or after `tracemalloc.start()`).
+    '''
+    import tracemalloc
+    if not tracemalloc.is_tracing(): 
+        return []
+    return tracemalloc.take_snapshot().statistics(key_type)[:n]
+
+class CallNode(): 
+    '''a node of the call tree, i.e. a decorated function / region under a given chain of callers'''
+    __slots__ = ('name', 'parent', 'children', 'stats', 'child_time', 'thread_id')
+
+    def __init__(self, name: str, parent: Optional['CallNode'], thread_id: Optional[int]) -> None: 
+        self.name = name
+        self.parent = parent
+        self.children: Dict[str, CallNode] = {}
+        self.stats = StreamingStats()
+        # total time spent in decorated callees, `stats.total - child_time` is the self time
+        self.child_time = 0.
+        # None in the merged tree of finished threads
+        self.thread_id = thread_id
+
+    @property
+    def path(self) -> Tuple[str, ...]: 
+        names = []
+        node = self
+        while node.parent is not None: 
+            names.append(node.name)
+            node = node.parent
+        return tuple(reversed(names))
+
+    @property
+    def self_time(self) -> float: 
+        # children running concurrently (e.g. gathered asyncio tasks) may add up to more than the wall time
+        return max(0., self.stats.total - self.child_time)
+
+def _merge_tree(dst: CallNode, src: CallNode) -> None: 
+    '''adds the timings of `src` and its descendants to the nodes of the same paths under `dst`'''
+    stack = [(dst, src)]
+    while stack: 
+        d, s = stack.pop()
+        d.stats.merge(s.stats)
+        d.child_time += s.child_time
+        for name, child in tuple(s.children.items()): 
+            target = d.children.get(name)
+            if target is None: 
+                target = d.children[name] = CallNode(name, d, d.thread_id)
+            stack.append((target, child))
+
+class _ThreadExit(): 
+    '''kept in a thread's locals only, collected when the thread exits'''
+    __slots__ = ('__weakref__',)
+
+class FunctionReport(): 
+    '''
+    timings of one decorated function / region, merged over threads and call sites.
+
+    `calls` is the exact number of calls, which exceeds `stats.count` (the timed calls) 
+    for functions profiled with sampling. 
+    '''
+    __slots__ = ('name', 'stats', 'self_time', 'calls', 'sampled', 'memory', 'cache')
+
+    def __init__(self, name: str) -> None: 
+        self.name = name
+        self.stats = StreamingStats()
+        self.self_time = 0.
+        self.calls = 0
+        self.sampled = False
+        # `MemoryStats`, for functions / regions profiled with `memory=True`
+        self.memory: Optional[MemoryStats] = None
+        # `CacheStats`, for functions wrapped by a cache reporting to this profiler
+        self.cache: Optional[CacheStats] = None
+
+    @property
+    def estimated_total(self) -> float: 
+        '''total time extrapolated from the timed calls to all calls'''
+        if not self.sampled or self.stats.count == 0: 
+            return self.stats.total
+        return self.stats.mean * self.calls
+
+class _CallCounter(): 
+    '''
+    exact call counter of a sampled function, one cell per thread so increments need no lock.
+    cells are [calls, timed calls].
+    '''
+    __slots__ = ('local', '_cells', '_lock')
+
+    def __init__(self) -> None: 
+        self._lock = threading.Lock()
+        self.reset()
+
+    def new_cell(self) -> List[int]: 
+        cell = self.local.cell = [0, 0]
+        with self._lock: 
+            self._cells.append(cell)
+        return cell
+
+    @property
+    def total(self) -> int: 
+        with self._lock: 
+            return sum(cell[0] for cell in self._cells)
+
+    @property
+    def timed(self) -> int: 
+        with self._lock: 
+            return sum(cell[1] for cell in self._cells)
+
+    def reset(self) -> None: 
+        with self._lock: 
+            self.local = threading.local()
+            self._cells: List[List[int]] = []
+
+class _Region(): 
+    __slots__ = ('_profiler', '_name', '_node', '_token', '_start', '_track_memory', '_frame', 'memory')
+
+    def __init__(self, profiler: 'Profiler', name: str, memory: bool = False) -> None: 
+        self._profiler = profiler
+        self._name = name
+        self._track_memory = memory
+        self.memory: Optional[MemoryDelta] = None
+
+    def __enter__(self) -> None: 
+        if self._track_memory: 
+            self._frame = _memory_enter()
+        self._node, self._token = self._profiler._enter(self._name)
+        self._start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None: 
+        self._profiler._exit(self._node, self._token, time.perf_counter() - self._start)
+        if self._track_memory: 
+            self.memory = _memory_exit(self._frame)
+            self._profiler._record_memory(self._name, self.memory)
+
+class Profiler(): 
+    '''
+    hierarchical wall-time profiler.
+
+    every thread records into its own call tree (no locking on the hot path),
+    the current position in the tree is tracked with a `ContextVar`,
+    so interleaving asyncio tasks nest correctly as well. trees are merged when reporting.
+    the trees of finished threads are folded into a single one, so memory does not grow with thread churn.
+
+    recursive calls are timed at every depth, but only the outermost call adds to a function's total.
+
+    usage: 
+    ```
+    profiler = Profiler()
+
+    @profiler.profile
+    def f(): ...
+
+    with profiler.region('loading'): 
+        f()
+
+    profiler.report()       # {name: FunctionReport}
+    profiler.call_tree()    # [root CallNode per live thread, and one for finished threads]
+    ```
+    '''
+    def __init__(self) -> None: 
+        self._local = threading.local()
+        self._roots: List[CallNode] = []
+        # merged trees of finished threads, among `_roots` once any thread finished
+        self._finished: Optional[CallNode] = None
+        self._lock = threading.Lock()
+        self._current: ContextVar[Optional[CallNode]] = ContextVar(f'profiler_{id(self)}', default=None)
+        self._counters: Dict[str, List[_CallCounter]] = {}
+        self._memory: Dict[str, MemoryStats] = {}
+        self._caches: Dict[str, CacheStats] = {}
+        # code object -> name of every decorated / watched function, used by `StackSampler`
+        self.watched_code: Dict[object, str] = {}
+
+    def _root(self) -> CallNode: 
+        try: 
+            return self._local.root
+        except AttributeError: 
+            root = self._local.root = CallNode('<root>', None, threading.get_ident())
+            with self._lock: 
+                self._roots.append(root)
+            marker = self._local.exit_marker = _ThreadExit()
+            weakref.finalize(marker, Profiler._retire, weakref.ref(self), root).atexit = False
+            return root
+
+    @staticmethod
+    def _retire(ref: 'weakref.ref[Profiler]', root: CallNode) -> None: 
+        '''folds the tree of a finished thread into the tree of finished threads'''
+        self = ref()
+        if self is None: 
+            return
+        with self._lock: 
+            # trees dropped by `reset` are not retired
+            if not any(r is root for r in self._roots): 
+                return
+            self._roots.remove(root)
+            if self._finished is None: 
+                self._finished = CallNode('<root>', None, None)
+                self._roots.append(self._finished)
+            _merge_tree(self._finished, root)
+
+    def _adopt(self, foreign: CallNode) -> CallNode: 
+        '''the node of this thread's tree with the same path as `foreign` (e.g. a context copied into another thread)'''
+        node = self._root()
+        for name in foreign.path: 
+            child = node.children.get(name)
+            if child is None: 
+                child = node.children[name] = CallNode(name, node, node.thread_id)
+            node = child
+        return node
+
+    def _enter(self, name: str): 
+        parent = self._current.get()
+        if parent is None: 
+            parent = self._root()
+        elif parent.thread_id != threading.get_ident(): 
+            parent = self._adopt(parent)
+        node = parent.children.get(name)
+        if node is None: 
+            node = parent.children[name] = CallNode(name, parent, parent.thread_id)
+        return node, self._current.set(node)
+
+    def _exit(self, node: CallNode, token, elapsed: float) -> None: 
+        self._current.reset(token)
+        node.stats.add(elapsed)
+        node.parent.child_time += elapsed
+
+    def watch(self, func: Callable, name: Optional[str] = None) -> Callable: 
+        '''
+        registers `func` for attribution by a `StackSampler` only, and returns it unchanged
+        (no per-call overhead at all).
+        '''
+        code = getattr(func, '__code__', None)
+        if code is not None: 
+            self.watched_code[code] = name or func.__qualname__
+        return func
+
+    def profile(
+        self, func: Optional[Callable] = None, *, name: Optional[str] = None, 
+        every: Optional[int] = None, sample_rate: Optional[float] = None, memory: bool = False
+    ) -> Callable: 
+        '''
+        decorator timing calls of `func` (sync or async), reported as `name` (default `__qualname__`).
+
+        by default every call is timed. for very hot functions, only every `every`-th call 
+        (per thread), or a random `sample_rate` fraction of calls is timed instead, 
+        while all calls are still counted exactly. untimed calls are not part of the call tree.
+
+        with `memory` set, every call also records its allocations, see `MemoryStats`.
+        '''
+        if func is None: 
+            return lambda f: self.profile(f, name=name, every=every, sample_rate=sample_rate, memory=memory)
+        key = name or func.__qualname__
+        self.watch(func, key)
+        decorated = self._timed(func, key, every, sample_rate)
+        return self._track_memory(key, decorated) if memory else decorated
+
+    def _track_memory(self, key: str, func: Callable) -> Callable: 
+        import inspect
+        if inspect.iscoroutinefunction(func): 
+            @functools.wraps(func)
+            async def decorated(*args, **kwargs): 
+                frame = _memory_enter()
+                try: 
+                    return await func(*args, **kwargs)
+                finally: 
+                    self._record_memory(key, _memory_exit(frame))
+        else: 
+            @functools.wraps(func)
+            def decorated(*args, **kwargs): 
+                frame = _memory_enter()
+                try: 
+                    return func(*args, **kwargs)
+                finally: 
+                    self._record_memory(key, _memory_exit(frame))
+        return decorated
+
+    def _record_memory(self, key: str, delta: 'MemoryDelta') -> None: 
+        with self._lock: 
+            stats = self._memory.get(key)
+            if stats is None: 
+                stats = self._memory[key] = MemoryStats()
+            stats.add(delta)
+
+    def _timed(self, func: Callable, key: str, every: Optional[int], sample_rate: Optional[float]) -> Callable: 
+        import inspect
+        enter, exit, clock = self._enter, self._exit, time.perf_counter
+        is_async = inspect.iscoroutinefunction(func)
+
+        if every is None and sample_rate is None: 
+            if is_async: 
+                @functools.wraps(func)
+                async def decorated(*args, **kwargs): 
+                    node, token = enter(key)
+                    start = clock()
+                    try: 
+                        return await func(*args, **kwargs)
+                    finally: 
+                        exit(node, token, clock() - start)
+            else: 
+                @functools.wraps(func)
+                def decorated(*args, **kwargs): 
+                    node, token = enter(key)
+                    start = clock()
+                    try: 
+                        return func(*args, **kwargs)
+                    finally: 
+                        exit(node, token, clock() - start)
+            return decorated
+
+        if every is not None and every < 1: 
+            raise ValueError(f'every should be a positive integer, got {every}')
+        if every is None and not 0 < sample_rate <= 1: 
+            raise ValueError(f'sample_rate should be in (0, 1], got {sample_rate}')
+        from random import random
+        counter = _CallCounter()
+        self._counters.setdefault(key, []).append(counter)
+
+        if is_async: 
+            @functools.wraps(func)
+            async def decorated(*args, **kwargs): 
+                try: 
+                    cell = counter.local.cell
+                except AttributeError: 
+                    cell = counter.new_cell()
+                cell[0] += 1
+                if (cell[0] % every) if every else (random() >= sample_rate): 
+                    return await func(*args, **kwargs)
+                cell[1] += 1
+                node, token = enter(key)
+                start = clock()
+                try: 
+                    return await func(*args, **kwargs)
+                finally: 
+                    exit(node, token, clock() - start)
+        else: 
+            @functools.wraps(func)
+            def decorated(*args, **kwargs): 
+                try: 
+                    cell = counter.local.cell
+                except AttributeError: 
+                    cell = counter.new_cell()
+                cell[0] += 1
+                if (cell[0] % every) if every else (random() >= sample_rate): 
+                    return func(*args, **kwargs)
+                cell[1] += 1
+                node, token = enter(key)
+                start = clock()
+                try: 
+                    return func(*args, **kwargs)
+                finally: 
+                    exit(node, token, clock() - start)
+        return decorated
+
+    def cache_stats(self, name: str) -> CacheStats: 
+        '''the hit / miss counters reported for `name`, created on first request'''
+        with self._lock: 
+            stats = self._caches.get(name)
+            if stats is None: 
+                stats = self._caches[name] = CacheStats()
+            return stats
+
+    def region(self, name: str, memory: bool = False) -> _Region: 
+        '''
+        context manager timing the surrounded block as `name` (and recording its allocations if `memory`), 
+        the allocations of the last exit are kept as `region.memory`.
+        '''
+        return _Region(self, name, memory)
+
+    def call_tree(self) -> List[CallNode]: 
+        '''root nodes of the call tree of every live thread that recorded anything, and of finished threads'''
+        with self._lock: 
+            return list(self._roots)
+
+    def iter_nodes(self): 
+        '''yields every (non-root) call node of every thread'''
+        stack = self.call_tree()
+        while stack: 
+            node = stack.pop()
+            children = tuple(node.children.values())
+            stack.extend(children)
+            if node.parent is not None: 
+                yield node
+
+    def report(self) -> Dict[str, FunctionReport]: 
+        '''timings per function / region name, merged over threads and call sites'''
+        res: Dict[str, FunctionReport] = {}
+        # (node, names of its ancestors)
+        stack = [(child, frozenset()) for root in self.call_tree() for child in tuple(root.children.values())]
+        while stack: 
+            node, callers = stack.pop()
+            r = res.get(node.name)
+            if r is None: 
+                r = res[node.name] = FunctionReport(node.name)
+            r.stats.merge(node.stats)
+            if node.name in callers: 
+                # recursive calls, already part of the total of the outermost call
+                r.stats.total -= node.stats.total
+            r.self_time += node.self_time
+            callers = callers | {node.name}
+            stack.extend((child, callers) for child in tuple(node.children.values()))
+        for r in res.values(): 
+            r.calls = r.stats.count
+        for name, counters in self._counters.items(): 
+            r = res.get(name)
+            if r is None: 
+                r = res[name] = FunctionReport(name)
+            r.sampled = True
+            # the timed calls are already counted, unsampled profilers of the same name count only those
+            r.calls += sum(c.total - c.timed for c in counters)
+        with self._lock: 
+            for name, stats in self._memory.items(): 
+                r = res.get(name)
+                if r is None: 
+                    r = res[name] = FunctionReport(name)
+                r.memory = stats.copy()
+            for name, stats in self._caches.items(): 
+                r = res.get(name)
+                if r is None: 
+                    r = res[name] = FunctionReport(name)
+                r.cache = stats
+        return res
+
+    def format_call_tree(self, indent: int = 2) -> str: 
+        lines = []
+        for root in self.call_tree(): 
+            lines.append('finished threads' if root.thread_id is None else f'thread {root.thread_id}')
+            stack = [(child, 1) for child in reversed(tuple(root.children.values()))]
+            while stack: 
+                node, depth = stack.pop()
+                s = node.stats
+                lines.append(
+                    f'{" " * indent * depth}{node.name}: {s.count} calls, '
+                    f'total {s.total:.3f}s, self {node.self_time:.3f}s'
+                )
+                stack.extend((child, depth + 1) for child in reversed(tuple(node.children.values())))
+        return '\n'.join(lines)
+
+    def reset(self) -> None: 
+        '''drops everything recorded so far (calls in flight are recorded into detached trees)'''
+        with self._lock: 
+            self._roots = []
+            self._finished = None
+            local, self._local = self._local, threading.local()
+            self._memory = {}
+            caches = list(self._caches.values())
+        # dropping the markers of the old locals calls `_retire`, which takes the lock
+        del local
+        for counters in self._counters.values(): 
+            for c in counters: 
+                c.reset()
+        # held by the caches, so cleared in place
+        for stats in caches: 
+            stats.reset()
+
+class StackSampler(): 
+    '''
+    statistical profiler: a background thread inspecting the stacks of all threads
+    (`sys._current_frames`) `hz` times per second, and attributing each sample to the 
+    functions decorated (or `watch`ed) by `profiler` that are on the stack. 
+
+    costs nothing per call of the watched functions, at the price of sampling noise.
+
+    usage: 
+    ```
+    with StackSampler(hz=200) as sampler: 
+        run()
+    print(sampler.format_report())
+    ```
+    '''
+    def __init__(self, profiler: Optional['Profiler'] = None, hz: float = 100.) -> None: 
+        self.profiler = profiler or default_profiler
+        self.interval = 1. / hz
+        # name -> number of samples with the function innermost (self) / anywhere on the stack (total)
+        self.self_samples: Dict[str, int] = {}
+        self.total_samples: Dict[str, int] = {}
+        self.n_samples = 0
+        # guards the counts against the sampler thread while reporting
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sample(self) -> None: 
+        '''takes one sample of all threads but the calling one'''
+        import sys
+        watched = self.profiler.watched_code
+        me = threading.get_ident()
+        innermost, on_stack = [], []
+        for tid, frame in sys._current_frames().items(): 
+            if tid == me: 
+                continue
+            seen = set()
+            while frame is not None: 
+                name = watched.get(frame.f_code)
+                if name is not None: 
+                    if not seen: 
+                        innermost.append(name)
+                    if name not in seen: 
+                        seen.add(name)
+                        on_stack.append(name)
+                frame = frame.f_back
+        with self._lock: 
+            for name in innermost: 
+                self.self_samples[name] = self.self_samples.get(name, 0) + 1
+            for name in on_stack: 
+                self.total_samples[name] = self.total_samples.get(name, 0) + 1
+            self.n_samples += 1
+
+    def _run(self) -> None: 
+        while not self._stop.wait(self.interval): 
+            self.sample()
+
+    def start(self) -> 'StackSampler': 
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='StackSampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None: 
+        self._stop.set()
+        if self._thread is not None: 
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> 'StackSampler': 
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None: 
+        self.stop()
+
+    def _counts(self) -> Tuple[Dict[str, int], Dict[str, int]]: 
+        '''consistent copies of (self_samples, total_samples), safe while sampling'''
+        with self._lock: 
+            return dict(self.self_samples), dict(self.total_samples)
+
+    def report(self) -> Dict[str, Tuple[float, float]]: 
+        '''estimated (self, total) wall time in seconds per watched function'''
+        self_samples, total_samples = self._counts()
+        return {
+            name: (self_samples.get(name, 0) * self.interval, n * self.interval)
+            for name, n in total_samples.items()
+        }
+
+    def format_report(self) -> str: 
+        self_samples, total_samples = self._counts()
+        rows = sorted(total_samples.items(), key=lambda kv: -kv[1])
+        dt = self.interval
+        return '\n'.join(
+            f'{name}: ~{n * dt:.3f}s total, ~{self_samples.get(name, 0) * dt:.3f}s self ({n} samples)'
+            for name, n in rows
+        )
+
+# the profiler behind `debug.benchmark`
+default_profiler = Profiler()
@@ -3,17 +3,27 @@
 
 import sys
 import time 
-import datetime
-import inspect 
+import atexit
+import itertools
+import threading
+from contextvars import ContextVar
 from termcolor import colored
 from tool_shack.core import now_str
+from tool_shack.profiler import default_profiler, format_memory
 from collections import deque
 from contextlib import contextmanager
-import humanize
-import colorful
-import colour
 
-from typing import Optional, Callable, Tuple, TextIO
+from typing import Optional, Callable, Tuple, TextIO, Union, Dict, List
+
+# heavy dependencies are imported where used, 
+# and still reachable as attributes of this module (PEP 562)
+_LAZY_MODULES = ('datetime', 'inspect', 'humanize', 'colorful', 'colour')
+
+def __getattr__(name: str): 
+    if name in _LAZY_MODULES: 
+        import importlib
+        return importlib.import_module(name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 class EmptyContext(): 
     '''
@@ -30,35 +40,196 @@ class EmptyContext():
     def __exit__(self, exec_type, exc_val, exc_tb): 
         pass
 
+# indentation level of the current thread / asyncio task
+_indent_level: ContextVar[int] = ContextVar('indent_level', default=0)
+
 class IndentStdout(): 
+    '''
+    stand-in for `sys.stdout` indenting every line by the indentation level of the writing thread / task.
+
+    installed as `sys.stdout` while at least one capture is active (in any thread) and restored afterwards.
+    output is buffered per thread up to newline boundaries and written through a lock, 
+    thus lines of concurrent stages never interleave.
+    '''
     def __init__(self, indent_space = 2): 
         self.indent_space = indent_space
-        self.indent_level = 0
         self._sys_stdout = sys.stdout
+        self._lock = threading.Lock()
+        self._n_active = 0
+        # thread id -> trailing text not yet terminated by a newline
+        self._pending: Dict[int, str] = {}
+
+    @property
+    def indent_level(self) -> int: return _indent_level.get()
 
     @property
     def activated(self,) -> bool: return self.indent_level > 0
 
-    def write(self, message):
-        indent_str = ' ' * (self.indent_space * self.indent_level)
-        self._sys_stdout.write(indent_str + message)
+    def _indented(self, text: str) -> str: 
+        indent_str = ' ' * (self.indent_space * _indent_level.get())
+        if not indent_str: 
+            return text
+        return ''.join(indent_str + line for line in text.splitlines(keepends=True))
+
+    def write(self, message): 
+        tid = threading.get_ident()
+        with self._lock: 
+            head, sep, tail = (self._pending.pop(tid, '') + message).rpartition('\n')
+            if tail: 
+                self._pending[tid] = tail
+            if sep: 
+                self._sys_stdout.write(self._indented(head + sep))
+        return len(message)
     
     def flush(self, ): 
-        self._sys_stdout.flush()
+        with self._lock: 
+            tail = self._pending.pop(threading.get_ident(), '')
+            if tail: 
+                self._sys_stdout.write(self._indented(tail))
+            self._sys_stdout.flush()
     
     def print_through(self, *args, **kwargs):
         print(*args, **kwargs, file=self._sys_stdout)
+
+    def __getattr__(self, name): 
+        # everything else (encoding, isatty, fileno, ...) is the underlying stream's
+        return getattr(self._sys_stdout, name)
     
     def increase(self, ): 
-        self.indent_level += 1
-        if self.activated: sys.stdout = self
+        '''indents the current thread / task one more level, returns a token for `decrease`'''
+        token = _indent_level.set(_indent_level.get() + 1)
+        with self._lock: 
+            if self._n_active == 0 and sys.stdout is not self: 
+                self._sys_stdout = sys.stdout
+                sys.stdout = self
+            self._n_active += 1
+        return token
     
-    def decrease(self, ): 
-        self.indent_level -= 1
-        if not self.activated: sys.stdout = self._sys_stdout
+    def decrease(self, token = None): 
+        self.flush()
+        try: 
+            if token is None: raise ValueError()
+            _indent_level.reset(token)
+        except ValueError: 
+            # not entered in this context (or no token), just step one level back
+            _indent_level.set(max(0, _indent_level.get() - 1))
+        with self._lock: 
+            self._n_active -= 1
+            if self._n_active > 0: 
+                return
+            for tail in self._pending.values(): 
+                self._sys_stdout.write(tail)
+            self._pending.clear()
+            if sys.stdout is self: 
+                sys.stdout = self._sys_stdout
 
 _indent_stdout = IndentStdout()
 
+class JsonLinesSink(): 
+    '''writes every stage event as one json object per line, to a path or an open text file'''
+    def __init__(self, f: Union[str, TextIO]) -> None: 
+        self._owned = isinstance(f, str)
+        self.f = open(f, 'w') if self._owned else f
+
+    def write(self, event: dict) -> None: 
+        import json
+        self.f.write(json.dumps(event) + '\n')
+
+    def close(self) -> None: 
+        self.f.flush()
+        if self._owned: self.f.close()
+
+class ChromeTraceSink(): 
+    '''
+    writes stage events in the chrome trace-event format, loadable in `chrome://tracing` or perfetto.
+
+    stages are written as async spans (`b` / `e`, with the stage id as span id) rather than per-thread 
+    `B` / `E` pairs, as interleaving asyncio tasks enter and exit their stages out of order on one thread.
+    '''
+    def __init__(self, path: str) -> None: 
+        import os
+        self.f = open(path, 'w')
+        self.f.write('[')
+        self.pid = os.getpid()
+        self._seen_threads = set()
+        self._first = True
+
+    def _write(self, record: dict) -> None: 
+        import json
+        self.f.write(('\n' if self._first else ',\n') + json.dumps(record))
+        self._first = False
+
+    def write(self, event: dict) -> None: 
+        tid = event['thread']
+        if tid not in self._seen_threads: 
+            self._seen_threads.add(tid)
+            self._write({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': event['thread_name']}})
+        args = {k: v for k, v in event.items() if k not in ('event', 'name', 'ts', 'thread', 'thread_name')}
+        self._write({
+            'name': event['name'], 'cat': 'stage', 'ph': 'b' if event['event'] == 'start' else 'e', 'id': event['id'], 
+            'ts': event['ts'] * 1e6, 'pid': self.pid, 'tid': tid, 'args': args, 
+        })
+
+    def close(self) -> None: 
+        self.f.write('\n]\n')
+        self.f.close()
+
+class EventWriter(): 
+    '''
+    hands structured stage events over to a background thread, which writes them to every sink
+    (objects with `write(event: dict)` and `close()`, e.g. `JsonLinesSink`, `ChromeTraceSink`).
+    emitting only costs the caller an enqueue.
+
+    usage: 
+    ```
+    with EventWriter(JsonLinesSink('stages.jsonl'), ChromeTraceSink('trace.json')) as events: 
+        with StageLogger('loading', logger=None, events=events): 
+            ...
+    ```
+    '''
+    def __init__(self, *sinks) -> None: 
+        import queue
+        self.sinks = sinks
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name='EventWriter', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def emit(self, event: dict) -> None: 
+        self._queue.put(event)
+
+    def _run(self) -> None: 
+        while True: 
+            event = self._queue.get()
+            if event is None: 
+                return
+            for sink in self.sinks: 
+                try: 
+                    sink.write(event)
+                except Exception as e: 
+                    print(f'warn: event sink {sink} failed with {type(e).__name__}: {e}', file=sys.stderr)
+
+    def close(self) -> None: 
+        '''writes all pending events and closes the sinks'''
+        if self._thread is None: 
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        for sink in self.sinks: 
+            sink.close()
+        atexit.unregister(self.close)
+
+    def __enter__(self) -> 'EventWriter': 
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None: 
+        self.close()
+
+# (stage id, depth) of the innermost stage of the current thread / task, for structured events
+_current_stage: ContextVar[Optional[Tuple[int, int]]] = ContextVar('current_stage', default=None)
+_stage_ids = itertools.count()
+
 class StageLogger(): 
     '''
     print timing information before and after the surrounded context.
@@ -69,31 +240,66 @@ class StageLogger():
         logger (callable): the printer, default to the python `print` function, can be altered to any logger api \
             as long as it support basic `print` usage. (i.e. `print(str) -> None`)
         capture (bool): capture `sys.stdout` to add appropriate indentation to all `print` calls.
+        profile (bool): record the timings of the stage into the default profiler, \
+            thus shown by `debug.print_benchmark`, `debug.Dashboard` and the benchmark exports.
+        memory (bool): report allocations (tracemalloc peak / net), rss and gc activity of the stage on exit, \
+            implies `profile`.
+        events (EventWriter): also emit structured `start` / `end` events (monotonic timestamps, nesting, \
+            thread and exception info) through this writer. pass `logger=None` to skip the text output altogether.
     '''
-    def __init__(self, stage_name: str, additional: Optional[str] = None, logger: Callable[[str], None]=print, capture: bool = False) -> None: 
+    def __init__(self, stage_name: str, additional: Optional[str] = None, logger: Optional[Callable[[str], None]]=print, capture: bool = False, profile: bool = False, memory: bool = False, events: Optional['EventWriter'] = None) -> None: 
         self.msg_raw = stage_name
-        self.msg = colored(stage_name, 'green', attrs=['bold'])
+        self.msg = colored(stage_name, 'green', attrs=['bold']) if logger is not None else stage_name
         self.additional = additional
         self.logger = logger
         self.capture = capture
+        self.region = default_profiler.region(stage_name, memory=memory) if profile or memory else None
+        self.events = events
+
+    def _emit(self, event: str, ts: float, **fields) -> None: 
+        thread = threading.current_thread()
+        self.events.emit({
+            'event': event, 'name': self.msg_raw, 'ts': ts, 'id': self.stage_id, 'parent': self.parent_id, 
+            'depth': self.depth, 'thread': thread.ident, 'thread_name': thread.name, **fields
+        })
 
     def __enter__(self): 
+        if self.region is not None: self.region.__enter__()
         self.start_time = time.perf_counter()
-        self.logger(f'{colored(">", "green")} start [{self.msg}] | on {now_str()}')
-        if self.additional is not None: 
-            self.logger(f'\t{self.additional}')
-        if self.capture: _indent_stdout.increase()
+        if self.events is not None: 
+            parent = _current_stage.get()
+            self.stage_id = next(_stage_ids)
+            self.parent_id, self.depth = (None, 0) if parent is None else (parent[0], parent[1] + 1)
+            self._stage_token = _current_stage.set((self.stage_id, self.depth))
+            self._emit('start', self.start_time)
+        if self.logger is not None: 
+            self.logger(f'{colored(">", "green")} start [{self.msg}] | on {now_str()}')
+            if self.additional is not None: 
+                self.logger(f'\t{self.additional}')
+        if self.capture: self._indent_token = _indent_stdout.increase()
     
     def __exit__(self, _exc_type, _exc_val, _exc_tb): 
-        if self.capture: _indent_stdout.decrease()
+        if self.capture: _indent_stdout.decrease(self._indent_token)
 
-        elapsed = (time.perf_counter() - self.start_time)
+        end_time = time.perf_counter()
+        elapsed = (end_time - self.start_time)
+        if self.events is not None: 
+            _current_stage.reset(self._stage_token)
+            exc = {} if _exc_type is None else {'exc_type': _exc_type.__name__, 'exc_message': str(_exc_val)}
+            self._emit('end', end_time, elapsed=elapsed, **exc)
+        if self.region is not None: self.region.__exit__(_exc_type, _exc_val, _exc_tb)
+        if self.logger is None: 
+            return None
+        import datetime
+        import humanize
         elapsed_delta = datetime.timedelta(0, elapsed)
         if _exc_tb is not None: 
             msg = colored(self.msg_raw, 'red')
             self.logger(f'{colored("<", "red", attrs=["bold"])} [{msg}] raised an {_exc_type} | on {now_str()} | after {humanize.precisedelta(elapsed_delta)}')
         else : 
             self.logger(f'{colored("<", "green")} done  [{self.msg}] | on {now_str()} | after {humanize.precisedelta(elapsed_delta)}')
+        if self.region is not None and self.region.memory is not None: 
+            self.logger(f'\tmemory: {format_memory(self.region.memory)}')
         return None
 
 
@@ -111,12 +317,12 @@ class AggregateVars() :
         self._Manager_include_self = include_self
 
     def __enter__(self) : 
-        self.upper_list = set(inspect.currentframe().f_back.f_locals.keys())
+        self.upper_list = set(sys._getframe(1).f_locals.keys())
         self.content = []
         return self
 
     def __exit__(self, exec_type, exc_val, exc_tb) : 
-        new_list = inspect.currentframe().f_back.f_locals.items()
+        new_list = sys._getframe(1).f_locals.items()
         for k, v in new_list : 
             if (k not in self.upper_list) :
                 if isinstance(v,type(self)) : 
@@ -143,6 +349,7 @@ class ColorGradientSerializer():
         n_history: int = 100,
         reverse_gradient: bool = False
     ): 
+        import colour
         if reverse_gradient: 
             start_color_name, end_color_name = end_color_name, start_color_name
         self.palette = {
@@ -155,9 +362,17 @@ class ColorGradientSerializer():
         self.v_range = value_range
         self.n_gradient = n_gradient
         self.alpha = alpha
+        self.n_history = n_history
         self.history = deque(maxlen=n_history)
-        self.history.append(value_range[0])
-        self.history.append(value_range[1])
+        # monotonic deques of (index, value) over the last `n_history` values, 
+        # fronts are the running min / max
+        self._n_seen = 0
+        self._min_queue: deque = deque()
+        self._max_queue: deque = deque()
+        # (colorful.colormode, [(prefix, suffix) per bucket])
+        self._styles: Optional[Tuple[int, List[Tuple[str, str]]]] = None
+        self.update_v_range(value_range[0])
+        self.update_v_range(value_range[1])
     
     def map_value(self, v: float) -> int: 
         s, e = self.v_range
@@ -167,20 +382,71 @@ class ColorGradientSerializer():
     
     def update_v_range(self, v: float) -> None: 
         self.history.append(v)
-        self.v_range = (min(self.history), max(self.history))
+        idx, expired = self._n_seen, self._n_seen - self.n_history
+        self._n_seen += 1
+        min_q, max_q = self._min_queue, self._max_queue
+        while min_q and min_q[-1][1] >= v: min_q.pop()
+        min_q.append((idx, v))
+        while max_q and max_q[-1][1] <= v: max_q.pop()
+        max_q.append((idx, v))
+        if min_q[0][0] <= expired: min_q.popleft()
+        if max_q[0][0] <= expired: max_q.popleft()
+        self.v_range = (min_q[0][1], max_q[0][1])
+
+    def styles(self) -> List[Tuple[str, str]]: 
+        '''escape sequences (prefix, suffix) of every bucket, rebuilt only when colorful's color mode changes'''
+        import colorful
+        if self._styles is None or self._styles[0] != colorful.colormode: 
+            styles = []
+            with colorful.with_palette(self.palette) as C: 
+                for cid in range(self.n_gradient): 
+                    prefix, _, suffix = str(getattr(C, str(cid))('\0')).partition('\0')
+                    styles.append((prefix, suffix))
+            self._styles = (colorful.colormode, styles)
+        return self._styles[1]
 
     def _print_gradient(self) -> None: 
+        import colorful
         import numpy as np
         with colorful.with_palette(self.palette) as C: 
             for (cid, hexname), v in zip(self.palette.items(), np.linspace(*self.v_range, self.n_gradient)): 
                 print(getattr(C, cid)(f'{v}: {hexname}'))
 
     def __call__(self, value: float, format: Optional[str] = None) -> str: 
-        with colorful.with_palette(self.palette) as C: 
-            res = getattr(C, str(self.map_value(value)))(('%f' if format is None else format)%(value))
+        prefix, suffix = self.styles()[self.map_value(value)]
+        res = prefix + ('%f' if format is None else format)%(value) + suffix
         self.update_v_range(value)
         return res
 
+    def color_many(self, values, format: Optional[str] = None) -> List[str]: 
+        '''
+        colors a whole array of values against the current value range in one pass, 
+        then updates the range with them.
+
+        unlike calling the serializer on each value, later values are not colored 
+        against a range already updated by earlier ones.
+        '''
+        import numpy as np
+        values = np.asarray(values, dtype=float).ravel()
+        s, e = self.v_range
+        n = self.n_gradient
+        if e > s: 
+            buckets = np.clip(((values - s) / (e - s) * n).astype(int), 0, n - 1)
+        else: 
+            buckets = np.where(values >= e, n - 1, 0)
+        # same boundary rules as `map_value`
+        buckets[values <= s] = 0
+        buckets[values >= e] = n - 1
+        styles = self.styles()
+        fmt = '%f' if format is None else format
+        res = [
+            styles[b][0] + fmt%(v) + styles[b][1]
+            for b, v in zip(buckets.tolist(), values.tolist())
+        ]
+        for v in values[-self.n_history:].tolist(): 
+            self.update_v_range(v)
+        return res
+
 
 @contextmanager
 def move_stdout(f: TextIO): 
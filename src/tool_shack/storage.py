@@ -1,13 +1,534 @@
 import os
+import mmap
+import zlib
+import struct
 import hashlib
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, Optional, Set, Tuple, Union
+
+def _sha1(key: bytes) -> int: 
+    return int.from_bytes(hashlib.sha1(key).digest()[:8], 'big')
+
+def _md5(key: bytes) -> int: 
+    return int.from_bytes(hashlib.md5(key).digest()[:8], 'big')
+
+def _blake2b(key: bytes) -> int: 
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'big')
+
+def _xxh64(key: bytes) -> int: 
+    import xxhash
+    return xxhash.xxh64_intdigest(key)
+
+# name -> (bytes -> int) hash used to pick the bucket of a key.
+# `crc32` and `xxh64` (needs the `xxhash` package) are not cryptographic, but several times faster.
+SHARD_HASHES: Dict[str, Callable[[bytes], int]] = {
+    'sha1': _sha1,
+    'md5': _md5,
+    'blake2b': _blake2b,
+    'crc32': zlib.crc32,
+    'xxh64': _xxh64,
+}
+
+def shard_dirs(key: str, fan_out: int = 256, depth: int = 2, hash: Union[str, Callable[[bytes], int]] = 'sha1') -> str: 
+    '''relative bucket directory of `key`: `depth` levels of hex-named directories, `fan_out` per level'''
+    h = (SHARD_HASHES[hash] if isinstance(hash, str) else hash)(key.encode('utf-8'))
+    width = len(f'{fan_out - 1:x}')
+    parts = []
+    for _ in range(depth): 
+        h, bucket = divmod(h, fan_out)
+        parts.append(f'{bucket:0{width}x}')
+    return os.path.join(*parts) if parts else ''
+
+# bucket directories known to exist, shared by `translate` calls
+_known_dirs: Set[str] = set()
 
 def translate(base_path: str, filename: str, create_hashdirs: bool = True) -> str: 
     '''
-    translate logical path to hash-based system path, reducing 
-    the number of files stored in `real` directories. this may 
+    translate logical path to hash-based system path, reducing
+    the number of files stored in `real` directories. this may
     speed up disk seeking.
 
     input path should comply with `base_path/filename`. translated path: 
-    `base_path/../filename`
+    `base_path/xx/yy/filename`, with the bucket directories `xx/yy` picked by the sha1 digest of `filename`
+    (the layout of a default `ShardedStore`).
     '''
-    hashlib.sha1(filename.encode('utf-8')).digest()
+    bucket = os.path.join(base_path, shard_dirs(filename))
+    if create_hashdirs and bucket not in _known_dirs: 
+        os.makedirs(bucket, exist_ok=True)
+        _known_dirs.add(bucket)
+    return os.path.join(bucket, filename)
+
+_MISSING = object()
+
+class ShardedStore(): 
+    '''
+    a key -> bytes store keeping one file per key under `root`,
+    spread over `fan_out ** depth` hashed bucket directories so that no directory grows too large.
+
+    bucket directories are created on first write into them and remembered,
+    so writes into a known bucket cost no extra syscalls.
+    writes go through a temporary file renamed into place, readers never see partial values.
+
+    keys are file names: non-empty, without path separators and not starting with `.`.
+
+    usage: 
+    ```
+    store = ShardedStore('features/', fan_out=256, depth=2, hash='crc32')
+    store.put('utt_0001.npy', data)
+    assert store.exists('utt_0001.npy')
+    data = store.get('utt_0001.npy')
+    for key in store.iter(): 
+        ...
+    ```
+    '''
+    def __init__(self, root: str, fan_out: int = 256, depth: int = 2, hash: Union[str, Callable[[bytes], int]] = 'sha1') -> None: 
+        if fan_out < 1 or depth < 0: 
+            raise ValueError(f'fan_out should be positive and depth non-negative, got {fan_out} and {depth}')
+        if isinstance(hash, str) and hash not in SHARD_HASHES: 
+            raise ValueError(f'unknown hash {hash!r}, expected one of {list(SHARD_HASHES)} or a callable')
+        self.root = root
+        self.fan_out = fan_out
+        self.depth = depth
+        self.hash = hash
+        self._known_dirs: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def _check_key(self, key: str) -> None: 
+        if not key or key.startswith('.') or os.sep in key or (os.altsep is not None and os.altsep in key): 
+            raise ValueError(f'invalid key {key!r}: keys are file names, not starting with "."')
+
+    def path(self, key: str) -> str: 
+        '''file holding the value of `key` (which may not exist)'''
+        self._check_key(key)
+        return os.path.join(self.root, shard_dirs(key, self.fan_out, self.depth, self.hash), key)
+
+    def _ensure_dir(self, d: str) -> None: 
+        if d in self._known_dirs: 
+            return
+        os.makedirs(d, exist_ok=True)
+        with self._lock: 
+            self._known_dirs.add(d)
+
+    def put(self, key: str, data: bytes) -> str: 
+        '''stores `data` under `key` (replacing any previous value), returns its path'''
+        path = self.path(key)
+        d = os.path.dirname(path)
+        self._ensure_dir(d)
+        # fixed length, so keys up to the file name limit fit, and distinct per key and writer
+        writer = f'{key}/{os.getpid()}/{threading.get_ident()}'.encode()
+        tmp = os.path.join(d, f'.{hashlib.blake2b(writer, digest_size=8).hexdigest()}.tmp')
+        try: 
+            f = open(tmp, 'wb')
+        except FileNotFoundError: 
+            # the bucket was removed behind our back
+            with self._lock: 
+                self._known_dirs.discard(d)
+            self._ensure_dir(d)
+            f = open(tmp, 'wb')
+        with f: 
+            f.write(data)
+        os.replace(tmp, path)
+        return path
+
+    def get(self, key: str, default=_MISSING) -> bytes: 
+        '''value of `key`, `default` (or a `KeyError`) if missing'''
+        try: 
+            with open(self.path(key), 'rb') as f: 
+                return f.read()
+        except FileNotFoundError: 
+            if default is _MISSING: 
+                raise KeyError(key) from None
+            return default
+
+    def exists(self, key: str) -> bool: 
+        return os.path.isfile(self.path(key))
+
+    __contains__ = exists
+
+    def delete(self, key: str) -> None: 
+        '''removes `key`, `KeyError` if missing. emptied bucket directories are kept'''
+        try: 
+            os.remove(self.path(key))
+        except FileNotFoundError: 
+            raise KeyError(key) from None
+
+    def iter(self) -> Iterator[str]: 
+        '''all keys in the store, in no particular order'''
+        dirs = [self.root]
+        for _ in range(self.depth): 
+            dirs = [e.path for d in dirs if os.path.isdir(d) for e in os.scandir(d) if e.is_dir()]
+        for d in dirs: 
+            if not os.path.isdir(d): 
+                continue
+            for e in os.scandir(d): 
+                if not e.name.startswith('.') and e.is_file(): 
+                    yield e.name
+
+    __iter__ = iter
+
+# pack files: many small values appended into few large segment files
+PACK_FSYNC_POLICIES = ('always', 'batch', 'never')
+
+_RECORD = struct.Struct('<HI')          # key length, value length (`_TOMBSTONE` for deletions)
+_TOMBSTONE = 0xFFFFFFFF
+_INDEX_MAGIC = b'TSPACK01'
+_INDEX_HEADER = struct.Struct('<8sQI')  # magic, number of entries, number of segments
+_INDEX_SEGMENT = struct.Struct('<IQ')   # segment id, bytes of the segment covered by the index
+
+def _key_hash(key: bytes) -> int: 
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+class PackStore(): 
+    '''
+    a key -> bytes store appending all values into a few large segment files under `root`, 
+    saving the inode and the open / close round trips per value of `ShardedStore`.
+
+    * records (key, value) are appended to the active segment, a new one is started past `segment_bytes`.
+    * writes are buffered and reach the file every `batch_bytes`. `fsync` is one of 
+        `always` (every put is written and synced), `batch` (every write of the buffer is synced), 
+        `never` (left to the OS).
+    * the index is a sorted array of key hashes with parallel arrays of (segment, offset), 
+        20 bytes per key on disk, looked up by bisection. it is saved by `save_index` / `close`, 
+        records appended after the last save are replayed on opening, and a torn last record is dropped.
+    * `get` returns a read-only `memoryview` into the mmap-ed segment, without copying.
+        it stays valid until the segment is compacted away, `bytes(view)` keeps a copy.
+    * overwritten and deleted values stay in their segments until `compact` rewrites the live ones.
+
+    usage: 
+    ```
+    with PackStore('features.pack/') as store: 
+        store.put('utt_0001', data)
+        array = np.frombuffer(store.get('utt_0001'), dtype=np.float32)
+    ```
+    '''
+    # number of unindexed changes that triggers merging them into the sorted arrays 
+    # (at least a quarter of the index, keeping the amortized cost per write constant)
+    MERGE_THRESHOLD = 1 << 16
+
+    def __init__(self, root: str, segment_bytes: int = 256 << 20, batch_bytes: int = 1 << 20, fsync: str = 'batch') -> None: 
+        if fsync not in PACK_FSYNC_POLICIES: 
+            raise ValueError(f'fsync should be one of {PACK_FSYNC_POLICIES}, got {fsync!r}')
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.segment_bytes = segment_bytes
+        self.batch_bytes = batch_bytes
+        self.fsync = fsync
+        self._lock = threading.RLock()
+
+        # the saved index: sorted key hashes, and the location of each record
+        self._hashes = array('Q')
+        self._segments = array('I')
+        self._offsets = array('Q')
+        # changes since: key -> (segment, offset), or None when deleted
+        self._recent: Dict[bytes, Optional[Tuple[int, int]]] = {}
+        # locations in the saved index overwritten / deleted since
+        self._superseded: Set[Tuple[int, int]] = set()
+        # segment id -> bytes written to its file
+        self._sizes: Dict[int, int] = {}
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._buffer = bytearray()
+        self._n_live = 0
+
+        # nothing is buffered while replaying
+        self._active = -1
+        self._load()
+        self._active = max(self._sizes, default=0)
+        self._sizes.setdefault(self._active, 0)
+        self._file = open(self._segment_path(self._active), 'ab')
+
+    def _segment_path(self, seg: int) -> str: 
+        return os.path.join(self.root, f'{seg:08d}.seg')
+
+    def _index_path(self) -> str: 
+        return os.path.join(self.root, 'index')
+
+    def _load(self) -> None: 
+        for name in os.listdir(self.root): 
+            if name.endswith('.seg'): 
+                self._sizes[int(name[:-4])] = os.path.getsize(os.path.join(self.root, name))
+        covered: Dict[int, int] = {}
+        if os.path.exists(self._index_path()): 
+            with open(self._index_path(), 'rb') as f: 
+                raw = f.read()
+            magic, n, n_segments = _INDEX_HEADER.unpack_from(raw)
+            if magic != _INDEX_MAGIC: 
+                raise ValueError(f'{self._index_path()} is not a pack index')
+            pos = _INDEX_HEADER.size
+            for _ in range(n_segments): 
+                seg, size = _INDEX_SEGMENT.unpack_from(raw, pos)
+                covered[seg] = size
+                pos += _INDEX_SEGMENT.size
+            for arr in (self._hashes, self._segments, self._offsets): 
+                end = pos + n * arr.itemsize
+                arr.frombytes(raw[pos:end])
+                pos = end
+            self._n_live = n
+        last_covered = max(covered, default=-1)
+        for seg in sorted(self._sizes): 
+            if seg not in covered and seg < last_covered: 
+                # left behind by an interrupted `compact`
+                os.remove(self._segment_path(seg))
+                del self._sizes[seg]
+            elif seg >= last_covered: 
+                self._replay(seg, covered.get(seg, 0))
+
+    def _replay(self, seg: int, start: int) -> None: 
+        '''indexes the records appended to `seg` after offset `start`'''
+        with open(self._segment_path(seg), 'rb') as f: 
+            f.seek(start)
+            data = f.read()
+        pos = 0
+        while pos + _RECORD.size <= len(data): 
+            klen, vlen = _RECORD.unpack_from(data, pos)
+            key_start = pos + _RECORD.size
+            end = key_start + klen + (0 if vlen == _TOMBSTONE else vlen)
+            if end > len(data): 
+                break
+            key = bytes(data[key_start:key_start + klen])
+            self._supersede(key)
+            if vlen == _TOMBSTONE: 
+                self._recent[key] = None
+            else: 
+                self._recent[key] = (seg, start + pos)
+                self._n_live += 1
+            pos = end
+        if start + pos < self._sizes[seg]: 
+            # torn write of the last record
+            os.truncate(self._segment_path(seg), start + pos)
+            self._sizes[seg] = start + pos
+
+    def _read(self, loc: Tuple[int, int]) -> Tuple[memoryview, Optional[memoryview]]: 
+        '''(key, value) of the record at `loc`, value is None for deletions'''
+        seg, off = loc
+        if seg == self._active and off >= self._sizes[seg]: 
+            self._write_buffer(sync=False)
+        m = self._maps.get(seg)
+        if m is None or len(m) < self._sizes[seg]: 
+            # the segment grew since it was mapped, older views keep the old map alive
+            with open(self._segment_path(seg), 'rb') as f: 
+                m = self._maps[seg] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        klen, vlen = _RECORD.unpack_from(m, off)
+        view = memoryview(m)
+        key_start = off + _RECORD.size
+        key = view[key_start:key_start + klen]
+        if vlen == _TOMBSTONE: 
+            return key, None
+        return key, view[key_start + klen:key_start + klen + vlen]
+
+    def _find_saved(self, key: bytes) -> Optional[Tuple[int, int]]: 
+        h = _key_hash(key)
+        hashes = self._hashes
+        i = bisect_left(hashes, h)
+        while i < len(hashes) and hashes[i] == h: 
+            loc = (self._segments[i], self._offsets[i])
+            if loc not in self._superseded and self._read(loc)[0] == key: 
+                return loc
+            i += 1
+        return None
+
+    def _lookup(self, key: bytes) -> Optional[Tuple[int, int]]: 
+        if key in self._recent: 
+            return self._recent[key]
+        return self._find_saved(key)
+
+    def _supersede(self, key: bytes) -> None: 
+        '''forgets the current record of `key` before a new one is appended'''
+        if key in self._recent: 
+            # its saved record (if any) was superseded already
+            if self._recent[key] is not None: 
+                self._n_live -= 1
+            return
+        loc = self._find_saved(key)
+        if loc is not None: 
+            self._superseded.add(loc)
+            self._n_live -= 1
+
+    def _write_buffer(self, sync: bool) -> None: 
+        if self._buffer: 
+            self._file.write(self._buffer)
+            self._file.flush()
+            self._sizes[self._active] += len(self._buffer)
+            self._buffer.clear()
+        if sync: 
+            os.fsync(self._file.fileno())
+
+    def _roll(self) -> None: 
+        self._write_buffer(sync=self.fsync != 'never')
+        self._file.close()
+        self._active += 1
+        self._sizes[self._active] = 0
+        self._file = open(self._segment_path(self._active), 'ab')
+
+    def _append(self, key: bytes, value: Optional[bytes]) -> Tuple[int, int]: 
+        if self._sizes[self._active] + len(self._buffer) >= self.segment_bytes: 
+            self._roll()
+        loc = (self._active, self._sizes[self._active] + len(self._buffer))
+        self._buffer += _RECORD.pack(len(key), _TOMBSTONE if value is None else len(value))
+        self._buffer += key
+        if value is not None: 
+            self._buffer += value
+        if self.fsync == 'always': 
+            self._write_buffer(sync=True)
+        elif len(self._buffer) >= self.batch_bytes: 
+            self._write_buffer(sync=self.fsync == 'batch')
+        return loc
+
+    def _merge(self) -> None: 
+        '''folds the recent changes into the sorted arrays'''
+        superseded = self._superseded
+        entries = [
+            e for e in zip(self._hashes, self._segments, self._offsets) 
+            if (e[1], e[2]) not in superseded
+        ]
+        entries.extend((_key_hash(k), *loc) for k, loc in self._recent.items() if loc is not None)
+        entries.sort()
+        self._hashes = array('Q', [e[0] for e in entries])
+        self._segments = array('I', [e[1] for e in entries])
+        self._offsets = array('Q', [e[2] for e in entries])
+        self._recent.clear()
+        superseded.clear()
+
+    def _check_key(self, key: str) -> bytes: 
+        encoded = key.encode('utf-8')
+        if len(encoded) > 0xFFFF: 
+            raise ValueError(f'keys are limited to 65535 bytes, got {len(encoded)}')
+        return encoded
+
+    def put(self, key: str, data: bytes) -> None: 
+        '''stores `data` under `key`, replacing any previous value'''
+        encoded = self._check_key(key)
+        if len(data) >= _TOMBSTONE: 
+            raise ValueError(f'values are limited to {_TOMBSTONE - 1} bytes, got {len(data)}')
+        with self._lock: 
+            self._supersede(encoded)
+            self._recent[encoded] = self._append(encoded, data)
+            self._n_live += 1
+            if len(self._recent) + len(self._superseded) > max(self.MERGE_THRESHOLD, len(self._hashes) // 4): 
+                self._merge()
+
+    def get(self, key: str, default=_MISSING) -> memoryview: 
+        '''zero-copy view of the value of `key`, `default` (or a `KeyError`) if missing'''
+        with self._lock: 
+            loc = self._lookup(self._check_key(key))
+            if loc is None: 
+                if default is _MISSING: 
+                    raise KeyError(key)
+                return default
+            return self._read(loc)[1]
+
+    def exists(self, key: str) -> bool: 
+        with self._lock: 
+            return self._lookup(self._check_key(key)) is not None
+
+    __contains__ = exists
+
+    def delete(self, key: str) -> None: 
+        '''removes `key`, `KeyError` if missing'''
+        encoded = self._check_key(key)
+        with self._lock: 
+            if self._lookup(encoded) is None: 
+                raise KeyError(key)
+            self._supersede(encoded)
+            self._append(encoded, None)
+            self._recent[encoded] = None
+
+    def __len__(self) -> int: 
+        return self._n_live
+
+    def _iter_live(self) -> Iterator[Tuple[bytes, Tuple[int, int]]]: 
+        for key, loc in self._recent.items(): 
+            if loc is not None: 
+                yield key, loc
+        for loc in zip(self._segments, self._offsets): 
+            if loc not in self._superseded: 
+                yield bytes(self._read(loc)[0]), loc
+
+    def iter(self) -> Iterator[str]: 
+        '''all keys in the store, in no particular order'''
+        with self._lock: 
+            keys = [key.decode('utf-8') for key, _ in self._iter_live()]
+        return iter(keys)
+
+    __iter__ = iter
+
+    def flush(self) -> None: 
+        '''writes the buffered records, and syncs them unless `fsync='never'`'''
+        with self._lock: 
+            self._write_buffer(sync=self.fsync != 'never')
+
+    def save_index(self) -> None: 
+        '''persists the index, so that opening the store needs no replay'''
+        with self._lock: 
+            self.flush()
+            self._merge()
+            tmp = self._index_path() + '.tmp'
+            with open(tmp, 'wb') as f: 
+                f.write(_INDEX_HEADER.pack(_INDEX_MAGIC, len(self._hashes), len(self._sizes)))
+                for seg, size in sorted(self._sizes.items()): 
+                    f.write(_INDEX_SEGMENT.pack(seg, size))
+                for arr in (self._hashes, self._segments, self._offsets): 
+                    f.write(arr.tobytes())
+                f.flush()
+                if self.fsync != 'never': 
+                    os.fsync(f.fileno())
+            os.replace(tmp, self._index_path())
+
+    def compact(self) -> None: 
+        '''rewrites the live records into new segments and removes the old ones'''
+        with self._lock: 
+            self._write_buffer(sync=False)
+            live = list(self._iter_live())
+            old_segments = sorted(self._sizes)
+            self._file.close()
+            self._active = old_segments[-1] + 1
+            self._sizes[self._active] = 0
+            self._file = open(self._segment_path(self._active), 'ab')
+
+            recent = {}
+            for key, loc in live: 
+                if self._sizes[self._active] + len(self._buffer) >= self.segment_bytes: 
+                    self._roll()
+                recent[key] = (self._active, self._sizes[self._active] + len(self._buffer))
+                value = self._read(loc)[1]
+                self._buffer += _RECORD.pack(len(key), len(value))
+                self._buffer += key
+                self._buffer += value
+                if len(self._buffer) >= self.batch_bytes: 
+                    self._write_buffer(sync=False)
+
+            self._hashes, self._segments, self._offsets = array('Q'), array('I'), array('Q')
+            self._superseded.clear()
+            self._recent = recent
+            self._n_live = len(recent)
+            for seg in old_segments: 
+                del self._sizes[seg]
+            # the index refers to the new segments only from here on
+            self.save_index()
+            for seg in old_segments: 
+                m = self._maps.pop(seg, None)
+                if m is not None: 
+                    try: 
+                        m.close()
+                    except BufferError: 
+                        # views handed out by `get` still use it
+                        pass
+                os.remove(self._segment_path(seg))
+
+    def close(self) -> None: 
+        with self._lock: 
+            self.save_index()
+            self._file.close()
+            for m in self._maps.values(): 
+                try: 
+                    m.close()
+                except BufferError: 
+                    pass
+            self._maps.clear()
+
+    def __enter__(self) -> 'PackStore': 
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None: 
+        self.close()
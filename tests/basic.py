@@ -132,6 +132,1141 @@ def test_linear_find():
     for idx, x in enumerate(xs): 
         assert idx == data.find(x, xs)
 
+@testcase()
+def test_hash_join(): 
+    xs = [(1, 'a'), (2, 'b'), (2, 'bb'), (4, 'd')]
+    ys = [(2, 'B'), (2, 'BB'), (3, 'C'), (4, 'D')]
+    getter = lambda x: x[0]
+
+    inner = data.big_join(getter, getter, xs, ys)
+    assert sorted(inner) == [
+        ((2, 'b'), (2, 'B')), ((2, 'b'), (2, 'BB')), 
+        ((2, 'bb'), (2, 'B')), ((2, 'bb'), (2, 'BB')), 
+        ((4, 'd'), (4, 'D')),
+    ]
+    for build in ('x', 'y'): 
+        full = list(data.hash_join(getter, getter, xs, ys, 'full', build=build))
+        assert ((1, 'a'), None) in full and (None, (3, 'C')) in full
+        assert len(full) == 7
+        left = list(data.hash_join(getter, getter, xs, ys, 'left', build=build))
+        assert len(left) == 6 and (None, (3, 'C')) not in left
+        right = list(data.hash_join(getter, getter, xs, ys, 'right', build=build))
+        assert len(right) == 6 and ((1, 'a'), None) not in right
+    assert data.big_join(getter, getter, xs, iter(ys), 'semi') == xs[1:]
+    assert data.big_join(getter, getter, iter(xs), ys, 'anti') == [(1, 'a')]
+
+@testcase()
+def test_sorted_streams(): 
+    getter = lambda x: x[0]
+    xs = [(1, 'a'), (2, 'b'), (2, 'bb'), (4, 'd'), (5, 'e')]
+    ys = [(0, 'Z'), (2, 'B'), (2, 'BB'), (3, 'C'), (4, 'D')]
+    for how in data.JOIN_MODES: 
+        merged = list(data.merge_join(getter, getter, iter(xs), iter(ys), how))
+        hashed = list(data.hash_join(getter, getter, xs, ys, how))
+        assert sorted(merged, key=str) == sorted(hashed, key=str), how
+
+    groups = [(k, list(g)) for k, g in data.group_by_sorted(getter, iter(xs))]
+    assert groups == [(1, [(1, 'a')]), (2, [(2, 'b'), (2, 'bb')]), (4, [(4, 'd')]), (5, [(5, 'e')])]
+
+    merged = list(data.merge_sorted([1, 4, 7], iter([2, 5]), [0, 3, 6, 8]))
+    assert merged == list(range(9))
+
+@testcase()
+def test_columnar_groups(): 
+    import numpy as np
+    rows = [(3, 1.0), (1, 2.0), (3, 3.0), (2, 4.0), (1, 5.0)]
+    table = {
+        'k': np.array([r[0] for r in rows]), 
+        'v': np.array([r[1] for r in rows]),
+    }
+    getter = lambda x: x[0]
+
+    groups = data.group_by(getter, rows)
+    columnar = data.columnar_group_by('k', table)
+    assert groups.keys() == columnar.keys()
+    for k, ts in groups.items(): 
+        assert [t[1] for t in ts] == columnar[k]['v'].tolist()
+
+    expected = data.reduce_group(lambda ts: sum(t[1] for t in ts), groups)
+    assert {k: r['v'] for k, r in data.columnar_reduce_group('sum', 'k', table).items()} == expected
+    assert data.columnar_reduce_group('count', table['k'], table['v']) == {1: 2, 2: 1, 3: 2}
+    assert data.columnar_reduce_group({'v': 'first'}, 'k', table) == {1: {'v': 2.0}, 2: {'v': 4.0}, 3: {'v': 1.0}}
+    assert data.columnar_map_group(lambda v: v * 2, table['k'], table['v'])[3].tolist() == [2.0, 6.0]
+
+    # the key column of 2d data is grouped on, not reduced
+    matrix = np.array(rows)
+    assert data.columnar_group_by(0, matrix)[3].tolist() == [[3., 1.], [3., 3.]]
+    assert data.columnar_reduce_group('sum', 0, matrix) == {k: [v] for k, v in expected.items()}
+
+@testcase()
+def test_permutation(): 
+    for population in (1, 2, 7, 64, 1000): 
+        drawn = list(data.gen_permutation(population, seed=3))
+        assert sorted(drawn) == list(range(population))
+    assert list(data.gen_permutation(1000, seed=3)) == list(data.gen_permutation(1000, seed=3))
+    assert list(data.gen_permutation(1000, seed=3)) != list(data.gen_permutation(1000, seed=4))
+
+    perm = data.RandomPermutation(1000, seed=5)
+    assert list(perm.iter(start=600)) == list(perm)[600:]
+    shards = [list(perm.iter(shard=rank, n_shards=3)) for rank in range(3)]
+    assert sorted(sum(shards, [])) == list(range(1000))
+    assert perm[10**2] == list(perm)[10**2]
+
+    assert sorted(data.gen_disjoint_indices(100)) == list(range(100))
+
+@testcase()
+def test_window(): 
+    import numpy as np
+    xs = list(range(7))
+    assert list(data.window(xs, 3)) == [(0, 1, 2), (1, 2, 3), (2, 3, 4), (3, 4, 5), (4, 5, 6)]
+    assert list(data.window(xs[:2], 3)) == []
+    assert list(data.window(xs, 3, step=2)) == [(0, 1, 2), (2, 3, 4), (4, 5, 6)]
+    assert list(data.window(xs, 3, step=4)) == [(0, 1, 2), (4, 5, 6)]
+    assert list(data.window(xs, 4, step=2)) == [(0, 1, 2, 3), (2, 3, 4, 5)]
+    assert list(data.window(xs, 4, step=2, partial='keep')) == [(0, 1, 2, 3), (2, 3, 4, 5), (4, 5, 6)]
+    assert list(data.window(xs, 4, step=2, partial='fill', fillvalue=-1))[-1] == (4, 5, 6, -1)
+    assert list(data.window(xs[:2], 3, partial='fill')) == [(0, 1, None)]
+
+    for n, step, partial in [(3, 1, 'drop'), (3, 2, 'keep'), (4, 3, 'fill'), (2, 5, 'keep'), (9, 1, 'keep')]: 
+        expected = list(data.window(xs, n, step, partial))
+        assert [tuple(v) for v in data.window(iter(xs), n, step, partial, view=True)] == expected
+        if partial != 'keep': 
+            arr = data.window(np.array(xs), n, step, partial, fillvalue=-1)
+            assert [tuple(r) for r in arr.tolist()] == list(data.window(xs, n, step, partial, fillvalue=-1))
+    try: 
+        data.window(np.arange(7), 4, step=2, partial='fill')
+        raise AssertionError('expected a ValueError')
+    except ValueError: 
+        pass
+    assert data.window(np.arange(7, dtype=object), 4, step=2, partial='fill')[-1].tolist() == [4, 5, 6, None]
+    v = next(data.window(xs, 3, view=True))
+    assert v[-1] == 2 and v[1:] == [1, 2] and len(v) == 3
+
+def _fails_on_seven(x): 
+    if x == 7: 
+        raise KeyError(x)
+    return x
+
+@testcase()
+def test_parallel_map(): 
+    xs = list(range(-500, 500))
+    for backend in ('thread', 'process'): 
+        ys = list(data.parallel_map(abs, iter(xs), chunk_size=16, workers=3, backend=backend))
+        assert ys == [abs(x) for x in xs]
+        ys = data.parallel_map(abs, xs, chunk_size=7, workers=3, backend=backend, ordered=False)
+        assert sorted(ys) == sorted(abs(x) for x in xs)
+        try: 
+            list(data.parallel_map(_fails_on_seven, range(20), chunk_size=3, workers=2, backend=backend))
+            raise AssertionError('should have raised')
+        except data.ChunkError as e: 
+            assert e.chunk_index == 2 and isinstance(e.__cause__, KeyError)
+
+    lines = ['# header', 'a', '', 'bb', '  # indented comment', 'ccc']
+    assert list(data.parallel_map(len, data.comment_guard(lines), chunk_size=2, workers=2)) == [1, 2, 3]
+
+@testcase()
+def test_async_pipeline(): 
+    import asyncio
+
+    async def alist(xs): 
+        return [x async for x in xs]
+
+    async def slow_source(): 
+        for x in range(5): 
+            await asyncio.sleep(0.03 if x == 3 else 0)
+            yield x
+
+    async def double_later(x): 
+        await asyncio.sleep(0.001 * (10 - x))
+        return 2 * x
+
+    async def run(): 
+        xs = [1, 1, 2, 3, 3, 3, 5]
+        assert await alist(data.aunique_filter(xs)) == list(data.unique_filter(xs))
+        assert await alist(data.acomment_guard(['# c', 'a', '', 'b'])) == ['a', 'b']
+        for n, step, partial in [(2, 1, 'drop'), (3, 2, 'keep'), (4, 3, 'fill'), (9, 1, 'keep')]: 
+            assert await alist(data.awindow(xs, n, step, partial)) == list(data.window(xs, n, step, partial))
+        assert await alist(data.achunk(range(5), 2)) == [[0, 1], [2, 3], [4]]
+        assert await alist(data.achunk(slow_source(), 10, max_delay=0.01)) == [[0, 1, 2], [3, 4]]
+        assert await alist(data.amap(double_later, range(10), concurrency=3)) == [2 * x for x in range(10)]
+
+    asyncio.run(run())
+
+@testcase()
+def test_html_table(): 
+    import io
+    xss = [[1, 'a<b'], [2.5, None]]
+    assert data.align_table(xss) == '<table><tr><td>1</td><td>a<b</td></tr><tr><td>2.5</td><td>None</td></tr></table>'
+    assert data.align_table(xss) == ''.join(data.iter_table(iter(xss)))
+
+    with io.StringIO() as f: 
+        data.write_table(f, xss, {float: '{:.2f}'.format}, header=['n', 's&t'], align=['right'], escape=True)
+        written = f.getvalue()
+    assert written == (
+        '<table><tr><th style="text-align:right">n</th><th>s&amp;t</th></tr>'
+        '<tr><td style="text-align:right">1</td><td>a&lt;b</td></tr>'
+        '<tr><td style="text-align:right">2.50</td><td>None</td></tr></table>'
+    )
+    try: 
+        list(data.iter_table(xss, align=['right;color:red']))
+        raise AssertionError('expected a ValueError')
+    except ValueError: 
+        pass
+
+@testcase()
+def test_read_uncommented(): 
+    import os
+    import tempfile
+    content = '# header\nfirst line\n\n   \n  # indented comment\n  indented # trailing\r\nlast'
+    with tempfile.TemporaryDirectory() as tmp: 
+        path = os.path.join(tmp, 'manifest.txt')
+        with open(path, 'w', newline='') as f: 
+            f.write(content)
+        expected = ['first line', '  indented # trailing', 'last']
+        assert list(data.read_uncommented(path)) == expected
+        assert list(data.read_uncommented(path, block_size=4)) == expected
+        assert list(data.read_uncommented(path, strip_inline=True)) == ['first line', '  indented', 'last']
+        assert sum(data.read_uncommented(path, batched=True, block_size=16), []) == expected
+        with open(path) as f: 
+            assert [l.rstrip() for l in data.comment_guard(f) if l.strip()] == expected
+
+        open(path, 'w').close()
+        assert list(data.read_uncommented(path)) == []
+
+@testcase()
+def test_keyed_index(): 
+    xs = ['apple', 'avocado', 'banana', 'blueberry', 'cherry', 'apricot']
+    key = lambda s: s[:2]
+    idx = data.KeyedIndex(xs, key=key)
+    for x in xs: 
+        assert idx.find(key(x)) == data.find(key(x), xs, key)
+    assert idx.find('zz') is None and 'zz' not in idx and 'ap' in idx
+    assert idx.find_all('ap') == ['apple', 'apricot']
+    assert len(idx) == 6
+
+    idx.append('date')
+    idx.append('apex')
+    assert idx.find_all('ap') == ['apple', 'apricot', 'apex']
+    assert list(idx.range('b', 'd')) == ['banana', 'blueberry', 'cherry']
+    assert list(idx.range('b', 'da', inclusive=True)) == ['banana', 'blueberry', 'cherry', 'date']
+    assert list(idx.range(hi='av')) == ['apple', 'apricot', 'apex']
+    assert list(idx.prefix('a')) == ['apple', 'apricot', 'apex', 'avocado']
+    assert list(idx.prefix('x')) == []
+
+    nums = data.KeyedIndex(range(10))
+    assert list(nums.range(3, 6)) == [3, 4, 5] and nums.find(7) == 7
+
+@testcase()
+def test_tree_map(): 
+    import dataclasses
+    from collections import namedtuple, defaultdict
+
+    Pair = namedtuple('Pair', ['a', 'b'])
+
+    @dataclasses.dataclass(frozen=True)
+    class Box(): 
+        content: object
+        label: str = 'box'
+
+    untouched = {'s': 'text', 'l': ['a', ('b',)]}
+    tree = {
+        'xs': [1, 2.0, (3, 'x')], 
+        'pair': Pair(4, [5]), 
+        'box': Box({6, 7}), 
+        'dd': defaultdict(list, {'k': 8}), 
+        'untouched': untouched,
+    }
+    is_int = lambda v: isinstance(v, int)
+    res = data.tree_map(lambda v: v * 10, tree, is_int)
+    assert res['xs'] == [10, 2.0, (30, 'x')]
+    assert res['pair'] == Pair(40, [50]) and type(res['pair']) is Pair
+    assert res['box'] == Box({60, 70})
+    assert res['dd'] == {'k': 80} and res['dd'].default_factory is list
+    assert res['untouched'] is untouched and res['xs'] is not tree['xs']
+    assert tree['xs'] == [1, 2.0, (3, 'x')]
+    # apply_function only descends into lists, tuples and dicts
+    legacy = data.apply_function(tree, lambda v: v * 10 if is_int(v) else None, lambda v: not isinstance(v, str))
+    assert legacy['box'] is None and legacy['pair'] == Pair(40, [50])
+
+    deep = 0
+    for _ in range(10000): 
+        deep = [deep]
+    nested = data.tree_map(lambda v: v + 1, deep)
+    for _ in range(10000): 
+        nested = nested[0]
+    assert nested == 1
+
+    leaves, treedef = data.tree_flatten(tree)
+    assert leaves[:5] == [1, 2.0, 3, 'x', 4] and treedef.n_leaves == len(leaves)
+    assert treedef.unflatten(leaves) == tree
+    mapped = data.tree_unflatten(treedef, [v * 10 if is_int(v) else v for v in leaves])
+    assert mapped == res == data.tree_map_leaves(lambda v: v * 10, treedef, leaves, is_int)
+    # same-shaped trees are taken apart along the cached tree def
+    assert treedef.flatten_up_to(mapped) == data.tree_flatten(mapped)[0]
+    for other_shape in ({**tree, 'xs': [1, 2.0]}, {**tree, 'pair': (4, [5])}): 
+        try: 
+            treedef.flatten_up_to(other_shape)
+            raise AssertionError('expected a ValueError')
+        except ValueError: 
+            pass
+    _, other = data.tree_flatten(mapped)
+    assert other == treedef and hash(other) == hash(treedef)
+    assert data.tree_flatten([1, [2]])[1] != data.tree_flatten([1, (2,)])[1]
+    assert data.tree_flatten([1, (2, 3)], is_leaf=lambda v: isinstance(v, tuple))[0] == [1, (2, 3)]
+    for wrong in (leaves[:-1], leaves + [0]): 
+        try: 
+            treedef.unflatten(wrong)
+            raise AssertionError('expected a ValueError')
+        except ValueError: 
+            pass
+
+    # a tree def keeps neither the nodes nor the leaves it was built from alive
+    import gc
+    import weakref
+    class Leaf(): 
+        pass
+    batch = {'dd': defaultdict(list, {'k': Leaf()}), 'box': Box(Pair(Leaf(), [Leaf()]))}
+    refs = [weakref.ref(v) for v in data.tree_flatten(batch)[0] if isinstance(v, Leaf)] + [weakref.ref(batch['box'])]
+    treedef = data.tree_flatten(batch)[1]
+    del batch
+    gc.collect()
+    assert all(r() is None for r in refs)
+    rebuilt = treedef.unflatten([1, 2, 3, 'box'])
+    assert rebuilt == {'dd': {'k': 1}, 'box': Box(Pair(2, [3]))} and rebuilt['dd'].default_factory is list
+
+@testcase()
+def test_profiler(): 
+    import time
+    import random
+    import asyncio
+    import threading
+    from tool_shack.profiler import Profiler, StreamingStats
+
+    stats = StreamingStats()
+    xs = [random.random() for _ in range(1000)]
+    for x in xs: 
+        stats.add(x)
+    mean = sum(xs) / len(xs)
+    assert abs(stats.mean - mean) < 1e-9
+    assert abs(stats.var - sum((x - mean) ** 2 for x in xs) / len(xs)) < 1e-9
+    assert abs(stats.quantile(.5) - sorted(xs)[499]) < 0.02
+    halves = StreamingStats(), StreamingStats()
+    for idx, x in enumerate(xs): 
+        halves[idx % 2].add(x)
+    halves[0].merge(halves[1])
+    assert abs(halves[0].var - stats.var) < 1e-9 and halves[0].count == 1000
+
+    profiler = Profiler()
+
+    @profiler.profile(name='inner')
+    def inner(): 
+        time.sleep(0.002)
+
+    @profiler.profile(name='outer')
+    def outer(): 
+        inner()
+        inner()
+
+    @profiler.profile(name='task')
+    async def task(): 
+        await asyncio.sleep(0.002)
+        inner()
+
+    async def run_tasks(): 
+        await asyncio.gather(*[task() for _ in range(5)])
+
+    threads = [threading.Thread(target=outer) for _ in range(4)]
+    for t in threads: 
+        t.start()
+    for t in threads: 
+        t.join()
+    with profiler.region('tasks'): 
+        asyncio.run(run_tasks())
+
+    report = profiler.report()
+    assert report['outer'].stats.count == 4 and report['inner'].stats.count == 13
+    assert report['task'].stats.count == 5
+    assert report['outer'].self_time < report['outer'].stats.total / 2
+    # the trees of the finished threads are merged into one
+    assert len(profiler.call_tree()) == 2
+    paths = {node.path for node in profiler.iter_nodes()}
+    assert paths == {('outer',), ('outer', 'inner'), ('tasks',), ('tasks', 'task'), ('tasks', 'task', 'inner')}
+    tprint(profiler.format_call_tree())
+
+    for _ in range(5): 
+        threads = [threading.Thread(target=inner) for _ in range(10)]
+        for t in threads: 
+            t.start()
+        for t in threads: 
+            t.join()
+    assert len(profiler.call_tree()) == 2 and profiler.report()['inner'].stats.count == 63
+
+    @profiler.profile(name='recursive')
+    def recursive(n): 
+        time.sleep(0.002)
+        if n > 0: 
+            recursive(n - 1)
+    profiler.reset()
+    recursive(3)
+    r = profiler.report()['recursive']
+    assert r.stats.count == 4 and r.stats.total < r.stats.max * 1.01
+    assert abs(r.self_time - r.stats.total) < 0.1 * r.stats.total
+
+@testcase()
+def test_benchmark_export(): 
+    import os
+    import copy
+    import tempfile
+
+    @debug.benchmark
+    def exported(): 
+        return sum(range(100))
+
+    for _ in range(50): 
+        exported()
+    results = debug.benchmark_results()
+    name = exported.__qualname__
+    assert results[name]['count'] == 50
+
+    with tempfile.TemporaryDirectory() as tmp: 
+        for ext in ('json', 'csv'): 
+            path = os.path.join(tmp, f'bench.{ext}')
+            debug.export_benchmark(path)
+            loaded = debug.load_benchmark(path)
+            assert abs(loaded[name]['mean'] - results[name]['mean']) < 1e-12
+
+        # a single preempted call may blow up the measured spread, pin it to keep the comparisons deterministic
+        results[name]['std'] = results[name]['mean'] / 10
+        slower = copy.deepcopy(results)
+        slower[name]['mean'] *= 2
+        slower['only_new'] = dict(results[name], name='only_new')
+        status = {c.name: c.status for c in debug.compare_benchmarks(results, slower)}
+        assert status[name] == 'regression' and status['only_new'] == 'new'
+        status = {c.name: c.status for c in debug.compare_benchmarks(slower, results)}
+        assert status[name] == 'improvement' and status['only_new'] == 'missing'
+        assert debug.compare_benchmarks(results, results)[0].status == 'unchanged'
+
+        import json
+        for file, res in (('pinned.json', results), ('slower.json', slower)): 
+            with open(os.path.join(tmp, file), 'w') as f: 
+                json.dump({'metadata': {}, 'results': res}, f)
+        assert debug.main([os.path.join(tmp, 'pinned.json'), os.path.join(tmp, 'slower.json')]) == 1
+        assert debug.main([os.path.join(tmp, 'bench.csv'), os.path.join(tmp, 'bench.json')]) == 0
+
+        # a region still open at export time has no timings to write, strict parsers reject NaN / Infinity
+        def strict(constant): 
+            raise ValueError(f'non-standard json constant {constant}')
+        from tool_shack.profiler import default_profiler
+        with default_profiler.region('open at export'): 
+            debug.export_benchmark(os.path.join(tmp, 'open.json'))
+        with open(os.path.join(tmp, 'open.json')) as f: 
+            assert 'open at export' not in json.load(f, parse_constant=strict)['results']
+
+@testcase()
+def test_sampled_profiling(): 
+    import time
+    import threading
+    from tool_shack.profiler import Profiler, StackSampler
+
+    profiler = Profiler()
+
+    @profiler.profile(name='every', every=10)
+    def every(x): 
+        return x
+
+    @profiler.profile(name='rate', sample_rate=0.5)
+    def rate(x): 
+        return x
+
+    def spin(): 
+        end = time.perf_counter() + 0.1
+        while time.perf_counter() < end: 
+            pass
+    profiler.watch(spin, 'spin')
+
+    def work(): 
+        for i in range(1000): 
+            every(i)
+            rate(i)
+    threads = [threading.Thread(target=work) for _ in range(3)]
+    for t in threads: 
+        t.start()
+    for t in threads: 
+        t.join()
+
+    report = profiler.report()
+    assert report['every'].calls == 3000 and report['every'].stats.count == 300
+    assert report['rate'].calls == 3000 and 1000 < report['rate'].stats.count < 2000
+    assert report['every'].sampled and report['every'].estimated_total > report['every'].stats.total
+
+    # sampled and unsampled profilers of the same name add up
+    @profiler.profile(name='mixed')
+    def exact(x): 
+        return x
+
+    @profiler.profile(name='mixed', every=4)
+    def sampled(x): 
+        return x
+
+    for i in range(8): 
+        exact(i)
+        sampled(i)
+    mixed = profiler.report()['mixed']
+    assert mixed.calls == 16 and mixed.stats.count == 10
+
+    with StackSampler(profiler, hz=200) as sampler: 
+        t = threading.Thread(target=spin)
+        t.start()
+        t.join()
+    self_time, total = sampler.report()['spin']
+    assert total > 0.02 and self_time == total
+    tprint(sampler.format_report())
+
+    profiler.reset()
+    assert profiler.report()['every'].calls == 0
+
+@testcase()
+def test_memory_tracking(): 
+    import io
+    import gc
+    from tool_shack import profiler as profiler_module
+    from tool_shack.profiler import Profiler, top_allocations
+
+    profiler = Profiler()
+
+    @profiler.profile(name='allocate', memory=True)
+    def allocate(n): 
+        return [object() for _ in range(n)]
+
+    kept = allocate(10000)
+    with profiler.region('outer', memory=True): 
+        allocate(100000)
+        gc.collect()
+    report = profiler.report()
+    mem = report['allocate'].memory
+    assert mem.peak.count == 2 and mem.peak.max > 100000 * 16
+    assert mem.net > 10000 * 16 and mem.gc_collections == 0
+    outer = report['outer'].memory
+    assert outer.peak.max >= mem.peak.max and outer.gc_collections >= 1
+    assert abs(outer.net) < mem.net
+    with profiler.region('snapshot', memory=True): 
+        assert len(top_allocations(3)) == 3
+    del kept
+
+    with io.StringIO() as f: 
+        with scripting.move_stdout(f): 
+            with scripting.StageLogger('alloc stage', memory=True): 
+                allocate(1000)
+        assert 'memory: peak' in f.getvalue()
+
+    # tracing only lasts as long as memory profiled regions, unless started before them
+    import tracemalloc
+    assert not tracemalloc.is_tracing() and gc.callbacks.count(profiler_module._gc_callback) == 0
+    tracemalloc.start()
+    with profiler.region('traced', memory=True): 
+        pass
+    assert tracemalloc.is_tracing()
+    tracemalloc.stop()
+
+@testcase()
+def test_stage_events(): 
+    import os
+    import json
+    import tempfile
+    import threading
+
+    with tempfile.TemporaryDirectory() as tmp: 
+        jsonl, trace = os.path.join(tmp, 'stages.jsonl'), os.path.join(tmp, 'trace.json')
+        with scripting.EventWriter(scripting.JsonLinesSink(jsonl), scripting.ChromeTraceSink(trace)) as events: 
+            def stages(): 
+                with scripting.StageLogger('outer', logger=None, events=events): 
+                    with scripting.StageLogger('inner', logger=None, events=events): 
+                        pass
+                    try: 
+                        with scripting.StageLogger('failing', logger=None, events=events): 
+                            raise KeyError('missing')
+                    except KeyError: 
+                        pass
+            threads = [threading.Thread(target=stages) for _ in range(3)]
+            for t in threads: 
+                t.start()
+            for t in threads: 
+                t.join()
+
+        with open(jsonl) as f: 
+            records = [json.loads(line) for line in f]
+        assert len(records) == 18
+        by_id = {}
+        for r in records: 
+            by_id.setdefault(r['id'], []).append(r)
+        for start, end in by_id.values(): 
+            assert start['event'] == 'start' and end['event'] == 'end'
+            assert end['ts'] >= start['ts'] and start['thread'] == end['thread']
+            if start['name'] == 'outer': 
+                assert start['depth'] == 0 and start['parent'] is None
+            else: 
+                assert start['depth'] == 1 and by_id[start['parent']][0]['name'] == 'outer'
+            if start['name'] == 'failing': 
+                assert end['exc_type'] == 'KeyError'
+
+        with open(trace) as f: 
+            trace_events = json.load(f)
+        assert sum(e['ph'] == 'b' for e in trace_events) == 9
+        # one metadata record per distinct thread id (ids may be reused by later threads)
+        assert sum(e['ph'] == 'M' for e in trace_events) == len({e['tid'] for e in trace_events})
+
+        # stages of interleaving asyncio tasks exit out of order on one thread, their spans are told apart by id
+        import asyncio
+        async def task(name, delay): 
+            with scripting.StageLogger(name, logger=None, events=task_events): 
+                await asyncio.sleep(delay)
+        async def interleaved(): 
+            await asyncio.gather(task('slow', 0.02), task('fast', 0.01))
+        with scripting.EventWriter(scripting.ChromeTraceSink(trace)) as task_events: 
+            asyncio.run(interleaved())
+        with open(trace) as f: 
+            spans = {}
+            for e in json.load(f): 
+                if e['ph'] != 'M': 
+                    spans.setdefault(e['id'], []).append(e)
+        assert sorted(begin['name'] for begin, _ in spans.values()) == ['fast', 'slow']
+        for begin, end in spans.values(): 
+            assert (begin['ph'], end['ph']) == ('b', 'e') and begin['name'] == end['name'] and end['ts'] >= begin['ts']
+
+@testcase()
+def test_concurrent_capture(): 
+    import io
+    import sys
+    import re
+    import asyncio
+    import threading
+
+    def nested(tag, depth): 
+        if depth == 0: 
+            return
+        with scripting.StageLogger(tag, logger=None, capture=True): 
+            print(f'{tag} level {depth}')
+            nested(tag, depth - 1)
+            print(f'{tag} after {depth}', 'in', 'pieces')
+
+    async def task(tag): 
+        with scripting.StageLogger(tag, logger=None, capture=True): 
+            print(f'{tag} level 1')
+            await asyncio.sleep(0)
+            print(f'{tag} after 1', 'in', 'pieces')
+
+    async def tasks(): 
+        await asyncio.gather(*(task(f'a{i}') for i in range(200)))
+
+    def failing(): 
+        with scripting.StageLogger('failing', logger=None, capture=True): 
+            raise KeyError('missing')
+
+    with io.StringIO() as f: 
+        with scripting.move_stdout(f): 
+            threads = [threading.Thread(target=nested, args=(f't{i}', 3)) for i in range(200)]
+            for t in threads: 
+                t.start()
+            asyncio.run(tasks())
+            for t in threads: 
+                t.join()
+            try: 
+                failing()
+            except KeyError: 
+                pass
+            assert sys.stdout is f
+        lines = f.getvalue().splitlines()
+
+    assert len(lines) == 200 * 6 + 200 * 2
+    # indentation of a line is twice the depth of the stage printing it
+    for line in lines: 
+        m = re.fullmatch(r'( *)(\w+) (level|after) (\d)( in pieces)?', line)
+        assert m is not None, line
+        depth = int(m.group(4)) if m.group(2).startswith('a') else 4 - int(m.group(4))
+        assert len(m.group(1)) == 2 * depth, line
+    assert not scripting._indent_stdout.activated
+
+@testcase()
+def test_color_gradient(): 
+    import random
+    import colorful
+    import numpy as np
+
+    saved_mode = colorful.colormode
+    colorful.use_true_colors()
+    try: 
+        painter = scripting.ColorGradientSerializer((0, 1), n_history=16)
+        values = [random.uniform(-1, 2) for _ in range(200)]
+        history = [0, 1]
+        for v in values: 
+            bucket = painter.map_value(v)
+            with colorful.with_palette(painter.palette) as C: 
+                expected = str(getattr(C, str(bucket))('%.2f'%v))
+            assert painter(v, '%.2f') == expected
+            history = (history + [v])[-16:]
+            assert painter.v_range == (min(history), max(history))
+
+        batch = np.array(values[:50])
+        expected = [painter.styles()[painter.map_value(v)] for v in values[:50]]
+        colored_batch = painter.color_many(batch, '%.2f')
+        assert colored_batch == [pre + '%.2f'%v + suf for (pre, suf), v in zip(expected, values[:50])]
+        assert painter.v_range == (min(values[34:50]), max(values[34:50]))
+    finally: 
+        colorful.colormode = saved_mode
+
+@testcase()
+def test_dashboard(): 
+    import io
+    import os
+    import time
+    from tool_shack.profiler import Profiler
+
+    profiler = Profiler()
+
+    @profiler.profile(name='tick')
+    def tick(): 
+        time.sleep(0.001)
+
+    stream = io.StringIO()
+    with debug.Dashboard(profiler, interval=0.01, stream=stream) as dashboard: 
+        for _ in range(50): 
+            tick()
+    frames = stream.getvalue().split('\x1b[J')[1:]
+    assert len(frames) >= 2
+    # every frame after the first rewinds over the previous one
+    assert stream.getvalue().count('\x1b[2F') == len(frames) - 1
+    assert 'tick' in frames[-1] and frames[-1].rstrip().endswith('50')
+    assert dashboard._thread is None
+
+    # profiled stages show up on the dashboard of the default profiler, the others stay out of it
+    for _ in range(3): 
+        with scripting.StageLogger('dashboard stage', logger=None, profile=True): 
+            time.sleep(0.001)
+        with scripting.StageLogger('unprofiled stage', logger=None): 
+            time.sleep(0.001)
+    assert 'unprofiled stage' not in debug.benchmark_results()
+    row = [line for line in debug.Dashboard(stream=io.StringIO(), top=1000).render() if 'dashboard stage' in line]
+    assert len(row) == 1 and row[0].rstrip().endswith('3')
+
+    saved = os.environ.get(debug.DASHBOARD_ENV)
+    try: 
+        os.environ[debug.DASHBOARD_ENV] = '0'
+        assert debug.dashboard_from_env() is None
+        os.environ[debug.DASHBOARD_ENV] = '0.5'
+        dashboard = debug.dashboard_from_env(profiler=profiler, stream=io.StringIO())
+        assert dashboard.interval == 0.5
+        dashboard.stop()
+    finally: 
+        if saved is None: 
+            os.environ.pop(debug.DASHBOARD_ENV)
+        else: 
+            os.environ[debug.DASHBOARD_ENV] = saved
+
+@testcase()
+def test_lazy_api(): 
+    import sys
+    import subprocess
+    import tool_shack
+
+    for name, module in tool_shack._LAZY_ATTRS.items(): 
+        assert getattr(tool_shack, name) is getattr(sys.modules[f'tool_shack.{module}'], name)
+    assert tool_shack.storage is sys.modules['tool_shack.storage']
+    assert set(tool_shack._LAZY_ATTRS) | set(tool_shack._SUBMODULES) <= set(dir(tool_shack))
+    assert set(tool_shack._LAZY_ATTRS) | set(tool_shack._SUBMODULES) == set(tool_shack.__all__)
+    try: 
+        tool_shack.missing
+        raise AssertionError('expected an AttributeError')
+    except AttributeError: 
+        pass
+
+    import humanize
+    assert scripting.humanize is humanize
+    try: 
+        scripting.missing
+        raise AssertionError('expected an AttributeError')
+    except AttributeError: 
+        pass
+
+    # nothing but the package itself is imported until used
+    code = (
+        'import sys, tool_shack; '
+        'assert not [m for m in sys.modules if m.startswith("tool_shack.")]; '
+        'tool_shack.window; '
+        'assert "tool_shack.data" in sys.modules and "tool_shack.debug" not in sys.modules'
+    )
+    subprocess.run([sys.executable, '-c', code], check=True)
+
+@testcase()
+def test_sharded_store(): 
+    import os
+    import shutil
+    import tempfile
+    from tool_shack import fs, storage
+
+    with tempfile.TemporaryDirectory() as tmp: 
+        for hash in ('sha1', 'crc32'): 
+            store = storage.ShardedStore(os.path.join(tmp, hash), fan_out=16, depth=2, hash=hash)
+            keys = [f'item_{i}.bin' for i in range(200)]
+            for i, k in enumerate(keys): 
+                store.put(k, str(i).encode())
+            assert all(store.get(k) == str(i).encode() for i, k in enumerate(keys))
+            assert sorted(store.iter()) == sorted(keys)
+            # 2 levels of single hex digit buckets
+            assert os.path.relpath(store.path(keys[0]), store.root).count(os.sep) == 2
+            assert len(os.listdir(store.root)) <= 16
+
+            store.put(keys[0], b'replaced')
+            assert store.get(keys[0]) == b'replaced'
+            store.delete(keys[1])
+            assert not store.exists(keys[1]) and keys[1] not in store and keys[2] in store
+            assert store.get(keys[1], None) is None
+            for missing in (store.get, store.delete): 
+                try: 
+                    missing(keys[1])
+                    raise AssertionError('expected a KeyError')
+                except KeyError: 
+                    pass
+            
+            # buckets removed behind the store's back are recreated
+            shutil.rmtree(os.path.dirname(store.path(keys[2])))
+            store.put(keys[2], b'back')
+            assert store.get(keys[2]) == b'back'
+
+            # the temporary file name does not grow with the key
+            longest = 'k' * 255
+            store.put(longest, b'long')
+            assert store.get(longest) == b'long' and longest in set(store.iter())
+
+        for bad in ('', '.hidden', 'a/b'): 
+            try: 
+                store.put(bad, b'')
+                raise AssertionError('expected a ValueError')
+            except ValueError: 
+                pass
+
+        path = storage.translate(os.path.join(tmp, 'sha1'), 'item_3.bin')
+        assert path == storage.ShardedStore(os.path.join(tmp, 'sha1')).path('item_3.bin') and os.path.isdir(os.path.dirname(path))
+
+        mapper = fs.HashFilenameMapper(os.path.join(tmp, 'bins'), n_bins=8)
+        assert len(os.listdir(mapper.parent_dir)) == 8
+        mapped = mapper(os.path.join(tmp, 'bins', 'a.txt'))
+        assert os.path.isdir(os.path.dirname(mapped)) and os.path.basename(mapped) == 'a.txt'
+
+@testcase()
+def test_pack_store(): 
+    import os
+    import random
+    import tempfile
+    from tool_shack.storage import PackStore
+
+    with tempfile.TemporaryDirectory() as tmp: 
+        store = PackStore(tmp, segment_bytes=4096, batch_bytes=512)
+        store.MERGE_THRESHOLD = 16
+        expected = {}
+        for _ in range(2000): 
+            k = f'key_{random.randrange(300)}'
+            if k in expected and random.random() < 0.2: 
+                store.delete(k)
+                del expected[k]
+            else: 
+                expected[k] = os.urandom(random.randrange(64))
+                store.put(k, expected[k])
+
+        def check(store): 
+            assert len(store) == len(expected) and sorted(store.iter()) == sorted(expected)
+            assert all(bytes(store.get(k)) == v for k, v in expected.items())
+            assert all(store.exists(k) == (k in expected) for k in (f'key_{i}' for i in range(300)))
+        check(store)
+        assert isinstance(store.get(next(iter(expected))), memoryview)
+        assert len([f for f in os.listdir(tmp) if f.endswith('.seg')]) > 1
+
+        # reopened without a saved index, the segments are replayed
+        store.flush()
+        check(PackStore(tmp))
+        store.close()
+        store = PackStore(tmp, segment_bytes=4096)
+        check(store)
+
+        size = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp))
+        store.compact()
+        check(store)
+        assert sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp)) < size
+
+        # a torn last record is dropped on opening
+        store.put('last', b'complete')
+        store.flush()
+        with open(os.path.join(tmp, max(f for f in os.listdir(tmp) if f.endswith('.seg'))), 'ab') as f: 
+            f.write(b'\x05\x00\x10')
+        expected['last'] = b'complete'
+        reopened = PackStore(tmp)
+        check(reopened)
+        reopened.put('after', b'torn')
+        reopened.close()
+        assert bytes(PackStore(tmp).get('after')) == b'torn'
+
+@testcase()
+def test_lazy_load(): 
+    import os
+    import time
+    import tempfile
+    import threading
+    from tool_shack import fs
+
+    with tempfile.TemporaryDirectory() as tmp: 
+        paths = [os.path.join(tmp, f'{i}.txt') for i in range(20)]
+        for i, p in enumerate(paths): 
+            with open(p, 'w') as f: 
+                f.write(str(i))
+        reads = []
+        def loader(f): 
+            reads.append(threading.get_ident())
+            return int(f.read())
+
+        lazy = fs.LazyLoad.many(paths, loader)
+        assert not reads and not lazy[3].is_loaded
+        assert lazy[3].loaded == 3 and lazy[3].loaded == 3 and len(reads) == 1
+
+        reads.clear()
+        prefetched = fs.LazyLoad.many(paths, loader, prefetch=True)
+        assert [x.loaded for x in prefetched] == list(range(20))
+        assert len(reads) == 20 and threading.get_ident() not in reads
+
+        missing = fs.LazyLoad(os.path.join(tmp, 'missing.txt'), loader, prefetch=True)
+        try: 
+            missing.loaded
+            raise AssertionError('expected a FileNotFoundError')
+        except FileNotFoundError: 
+            pass
+
+        reads.clear()
+        cache = fs.LoadCache(max_items=2)
+        assert fs.LazyLoad(paths[0], loader, cache=cache).loaded == 0
+        assert fs.LazyLoad(paths[0], loader, cache=cache).loaded == 0
+        assert len(reads) == 1 and (cache.hits, cache.misses) == (1, 1)
+        # changed files are read again
+        time.sleep(0.01)
+        with open(paths[0], 'w') as f: 
+            f.write('100')
+        assert fs.LazyLoad(paths[0], loader, cache=cache).loaded == 100 and len(reads) == 2
+        for p in paths[1:3]: 
+            fs.LazyLoad(p, loader, cache=cache).loaded
+        assert len(cache) == 2
+        fs.LazyLoad(paths[0], loader, cache=cache).loaded
+        assert len(reads) == 5
+
+        bounded = fs.LoadCache(max_bytes=10, sizeof=lambda _: 4)
+        for p in paths[:5]: 
+            fs.LazyLoad(p, loader, cache=bounded).loaded
+        assert len(bounded) == 2 and bounded.n_bytes == 8
+
+        # instances sharing a cache hold no reference, evicted contents are freed
+        import gc
+        import weakref
+        class Content(): 
+            def __init__(self, f): 
+                self.value = int(f.read())
+        small = fs.LoadCache(max_items=1)
+        held = fs.LazyLoad.many(paths[:2], Content, cache=small)
+        first = weakref.ref(held[0].loaded)
+        assert held[0].is_loaded and held[1].loaded.value == 1 and not held[0].is_loaded
+        gc.collect()
+        assert first() is None and held[0].loaded.value == 100
+        prefetched = fs.LazyLoad(paths[3], Content, prefetch=True, cache=small)
+        assert prefetched.loaded.value == 3 and prefetched._future is None
+
+        deferred = fs.DeferedReadError(os.path.join(tmp, 'missing.txt'), loader)
+        try: 
+            deferred.loaded
+            raise AssertionError('expected a FileNotFoundError')
+        except FileNotFoundError: 
+            pass
+        assert fs.DeferedReadError(paths[4], loader).is_loaded
+
+@testcase()
+def test_disk_cache(): 
+    import time
+    import tempfile
+    import dataclasses
+    import numpy as np
+    from tool_shack import cache
+    from tool_shack.profiler import Profiler
+
+    assert cache.stable_hash({'a': 1, 'b': {2, 3}}) == cache.stable_hash({'b': {3, 2}, 'a': 1})
+    assert cache.stable_hash((1, 2)) != cache.stable_hash([1, 2]) != cache.stable_hash((True, 2))
+    assert cache.stable_hash(np.arange(4)) != cache.stable_hash(np.arange(4).astype(np.float32))
+
+    @dataclasses.dataclass
+    class Config: 
+        n: int
+        names: tuple
+    assert cache.stable_hash(Config(1, ('a',))) == cache.stable_hash(Config(1, ('a',)))
+    try: 
+        cache.stable_hash(object())
+        raise AssertionError('expected a TypeError')
+    except TypeError: 
+        pass
+
+    profiler = Profiler()
+    calls = []
+    with tempfile.TemporaryDirectory() as tmp: 
+        @cache.disk_cache(directory=tmp, profiler=profiler)
+        def slow_add(x, y=1): 
+            calls.append((x, y))
+            return x + y
+
+        assert slow_add(1) == 2 and slow_add(x=1, y=1) == 2 and slow_add(1, 2) == 3
+        assert calls == [(1, 1), (1, 2)]
+        stats = profiler.report()['test_disk_cache.<locals>.slow_add'].cache
+        assert (stats.hits, stats.misses) == (1, 2)
+
+        # another process (here: another decoration) sees the stored results
+        @cache.disk_cache(directory=tmp, profiler=profiler, name='again')
+        def slow_add(x, y=1): 
+            calls.append((x, y))
+            return x + y
+        assert slow_add(1, 2) == 3 and len(calls) == 2
+        slow_add.cache_clear()
+        assert slow_add(1, 2) == 3 and len(calls) == 3
+
+    with tempfile.TemporaryDirectory() as tmp: 
+        @cache.disk_cache(directory=tmp, max_entries=3, profiler=profiler, name='bounded')
+        def square(x): 
+            calls.append(x)
+            return x * x
+        for x in range(6): 
+            square(x)
+        # evicted down to 90% of the limit
+        assert len(square.cache) == 2 and square.cache_stats.evictions == 4
+
+    with tempfile.TemporaryDirectory() as tmp: 
+        @cache.disk_cache(directory=tmp, max_entries=20, profiler=profiler, name='rescans')
+        def cube(x): 
+            return x ** 3
+        n_scans = []
+        scan = cube.cache._scan
+        cube.cache._scan = lambda: n_scans.append(1) or scan()
+        for x in range(60): 
+            cube(x)
+        # a rescan every few writes past the limit, not on every one of them
+        assert len(cube.cache) <= 20 and len(n_scans) <= 15
+
+    with tempfile.TemporaryDirectory() as tmp: 
+        @cache.disk_cache(directory=tmp, ttl=0.05, serializer='json', profiler=profiler, name='expiring')
+        def config(name): 
+            calls.append(name)
+            return {'name': name}
+        assert config('a') == config('a') == {'name': 'a'} and calls[-1] == 'a' and calls.count('a') == 1
+        time.sleep(0.1)
+        assert config('a') == {'name': 'a'} and calls.count('a') == 2
+
+    with tempfile.TemporaryDirectory() as tmp: 
+        @cache.disk_cache(directory=tmp, serializer='npy', profiler=profiler, name='arrays')
+        def ramp(n): 
+            return np.arange(n, dtype=np.float32)
+        ramp(5)
+        loaded = ramp(5)
+        assert isinstance(loaded, np.memmap) and (loaded == np.arange(5)).all()
+
+    assert debug.format_cache(stats).startswith('1 hits, 2 misses')
+
+@testcase()
+def test_memo(): 
+    import time
+    import asyncio
+    import threading
+    from tool_shack import cache
+    from tool_shack.profiler import Profiler
+
+    profiler = Profiler()
+    calls = []
+
+    @cache.memo(max_entries=4, profiler=profiler, name='square')
+    def square(x, offset=0): 
+        calls.append(x)
+        return x * x + offset
+
+    assert [square(i % 3) for i in range(9)] == [0, 1, 4] * 3 and calls == [0, 1, 2]
+    assert square(2, offset=1) == 5 and square(2, offset=1) == 5 and calls.count(2) == 2
+    for x in range(10, 15): 
+        square(x)
+    assert len(square.cache) == 4 and square.cache_stats.evictions >= 2
+    assert (square.cache_stats.hits, square.cache_stats.misses) == (7, 9)
+
+    # single flight: concurrent misses compute once, and the waiters' time saved is counted
+    @cache.memo(profiler=profiler, name='slow')
+    def slow(x): 
+        calls.append(('slow', x))
+        time.sleep(0.05)
+        return x
+    threads = [threading.Thread(target=slow, args=(1,)) for _ in range(16)]
+    for t in threads: 
+        t.start()
+    for t in threads: 
+        t.join()
+    assert calls.count(('slow', 1)) == 1
+    assert slow.cache_stats.hits == 15 and slow.cache_stats.misses == 1
+    slow(1)
+    assert slow.cache_stats.saved_time > 0.04
+
+    @cache.memo(ttl=0.05, profiler=profiler, name='expiring')
+    def expiring(x): 
+        calls.append(('expiring', x))
+        return x
+    expiring(1), expiring(1)
+    time.sleep(0.1)
+    expiring(1)
+    assert calls.count(('expiring', 1)) == 2
+
+    @cache.memo(max_bytes=100, sizeof=len, profiler=profiler, name='sized')
+    def blob(n): 
+        return b'x' * n
+    blob(40), blob(40), blob(50), blob(30)
+    assert len(blob.cache) == 2 and blob.cache.n_bytes == 80
+
+    @cache.memo(profiler=profiler, name='fetch')
+    async def fetch(x): 
+        calls.append(('fetch', x))
+        await asyncio.sleep(0.01)
+        return x * 2
+    async def main(): 
+        return await asyncio.gather(*(fetch(i % 2) for i in range(10)))
+    assert asyncio.run(main()) == [0, 2] * 5
+    assert calls.count(('fetch', 0)) == calls.count(('fetch', 1)) == 1
+
+    @cache.memo(profiler=profiler, name='failing')
+    def failing(x): 
+        calls.append(('failing', x))
+        raise KeyError(x)
+    for _ in range(2): 
+        try: 
+            failing(1)
+            raise AssertionError('expected a KeyError')
+        except KeyError: 
+            pass
+    assert calls.count(('failing', 1)) == 2
+
+    # callers waiting for a failing call get its exception instead of retrying it one after another
+    @cache.memo(profiler=profiler, name='failing_slowly')
+    def failing_slowly(x): 
+        calls.append(('failing_slowly', x))
+        time.sleep(0.05)
+        raise KeyError(x)
+    errors = []
+    def call(): 
+        try: 
+            failing_slowly(1)
+        except KeyError as e: 
+            errors.append(e)
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for t in threads: 
+        t.start()
+    for t in threads: 
+        t.join()
+    assert len(errors) == 8 and calls.count(('failing_slowly', 1)) == 1
+
+    report = profiler.report()
+    assert report['square'].cache.hits == 7 and report['fetch'].cache.misses == 2
+
 @testcase()
 def temp_pwd(): 
     import sh
@@ -159,6 +1294,31 @@ def main():
         test_find_attr,
         test_stdout_redirect,
         test_linear_find,
+        test_hash_join,
+        test_sorted_streams,
+        test_columnar_groups,
+        test_permutation,
+        test_window,
+        test_parallel_map,
+        test_async_pipeline,
+        test_html_table,
+        test_read_uncommented,
+        test_keyed_index,
+        test_tree_map,
+        test_profiler,
+        test_benchmark_export,
+        test_sampled_profiling,
+        test_memory_tracking,
+        test_stage_events,
+        test_concurrent_capture,
+        test_color_gradient,
+        test_dashboard,
+        test_lazy_api,
+        test_sharded_store,
+        test_pack_store,
+        test_lazy_load,
+        test_disk_cache,
+        test_memo,
         temp_pwd,
     ]
 
@@ -28,6 +28,11 @@ class A():
 
 
 if __name__ == '__main__': 
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--export', default=None, help='also write results to a .json / .csv file')
+    args = parser.parse_args()
+
     a = A()
     b = A()
     for _ in range(15): 
@@ -39,3 +44,5 @@ if __name__ == '__main__':
 
     
     tsd.print_benchmark()
+    if args.export is not None: 
+        tsd.export_benchmark(args.export)
@@ -0,0 +1,47 @@
+# compares `ColorGradientSerializer` against its original per-call implementation 
+# (palette context + O(n_history) min/max on every value) and against `color_many`.
+# run by hand: `python tests/color_benchmark.py -n 100000 --history 1000`
+import argparse
+import random
+import time
+
+import colorful
+import numpy as np
+
+from tool_shack.scripting import ColorGradientSerializer
+
+
+class PerCallGradient(ColorGradientSerializer): 
+    def update_v_range(self, v): 
+        self.history.append(v)
+        self.v_range = (min(self.history), max(self.history))
+
+    def __call__(self, value, format=None): 
+        with colorful.with_palette(self.palette) as C: 
+            res = getattr(C, str(self.map_value(value)))(('%f' if format is None else format)%(value))
+        self.update_v_range(value)
+        return str(res)
+
+def measure(name, fn, n): 
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f'{name:<24}| {n} values in {elapsed:7.3f}s | {elapsed / n * 1e6:7.2f} us/value')
+
+
+if __name__ == '__main__': 
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=10**5, help='number of values')
+    parser.add_argument('--history', type=int, default=1000, help='n_history of the serializers')
+    args = parser.parse_args()
+
+    colorful.use_true_colors()
+    values = [random.random() for _ in range(args.n)]
+    array = np.array(values)
+
+    old = PerCallGradient(n_history=args.history)
+    new = ColorGradientSerializer(n_history=args.history)
+    batched = ColorGradientSerializer(n_history=args.history)
+    measure('per call (original)', lambda: [old(v, '%.3f') for v in values], args.n)
+    measure('per call (cached)', lambda: [new(v, '%.3f') for v in values], args.n)
+    measure('color_many', lambda: batched.color_many(array, '%.3f'), args.n)
@@ -0,0 +1,42 @@
+# compares the pure python `group_by` / `reduce_group` path against the numpy columnar backend.
+# run by hand: `python tests/columnar_benchmark.py -n 1000000`
+import argparse
+import time
+
+import numpy as np
+import tool_shack.data as data
+
+
+def timed(name, fn, baseline=None): 
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    speedup = '' if baseline is None else f' | x{baseline / elapsed:.1f}'
+    print(f'{name:<36}| {elapsed:7.3f}s{speedup}')
+    return elapsed
+
+
+if __name__ == '__main__': 
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=10**6, help='number of rows')
+    parser.add_argument('-k', type=int, default=1000, help='number of distinct keys')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    table = {
+        'key': rng.integers(0, args.k, args.n), 
+        'value': rng.random(args.n),
+    }
+    rows = list(zip(table['key'].tolist(), table['value'].tolist()))
+
+    for op, py_op in [('sum', sum), ('mean', lambda vs: sum(vs) / len(vs)), ('max', max)]: 
+        print(f'-- {op} over {args.n} rows, {args.k} keys')
+        base = timed(
+            'python group_by + reduce_group', 
+            lambda: data.reduce_group(lambda ts: py_op([t[1] for t in ts]), data.group_by(lambda t: t[0], rows))
+        )
+        timed('columnar_reduce_group', lambda: data.columnar_reduce_group({'value': op}, 'key', table), base)
+
+    print('-- group only')
+    base = timed('python group_by', lambda: data.group_by(lambda t: t[0], rows))
+    timed('columnar_group_by', lambda: data.columnar_group_by('key', table), base)
@@ -0,0 +1,50 @@
+# throughput of `data.read_uncommented` against `comment_guard(open(f))` on a generated manifest file.
+# run by hand: `python tests/comment_benchmark.py -n 10000000`
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import tool_shack.data as data
+
+
+def consume(it) -> int: 
+    n = 0
+    for _ in it: 
+        n += 1
+    return n
+
+def comment_guard_lines(path): 
+    with open(path) as f: 
+        return consume(data.comment_guard(f))
+
+def measure(name, fn, path): 
+    size = os.path.getsize(path)
+    start = time.perf_counter()
+    n = fn(path)
+    elapsed = time.perf_counter() - start
+    print(f'{name:<32}| {n:>9} lines | {elapsed:7.3f}s | {size / elapsed / 2**20:7.1f} MB/s')
+
+
+if __name__ == '__main__': 
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=10**7, help='number of lines')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp: 
+        path = os.path.join(tmp, 'manifest.txt')
+        with open(path, 'w') as f: 
+            for idx in range(args.n): 
+                r = random.random()
+                if r < 0.1: 
+                    f.write(f'# comment {idx}\n')
+                elif r < 0.15: 
+                    f.write('\n')
+                else: 
+                    f.write(f'data/shard_{idx % 1000:04d}/sample_{idx:010d}.npy\n')
+
+        measure('comment_guard(open(f))', comment_guard_lines, path)
+        measure('read_uncommented', lambda p: consume(data.read_uncommented(p)), path)
+        measure('read_uncommented(batched)', lambda p: sum(map(len, data.read_uncommented(p, batched=True))), path)
+        measure('read_uncommented(strip_inline)', lambda p: consume(data.read_uncommented(p, strip_inline=True)), path)
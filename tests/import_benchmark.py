@@ -0,0 +1,59 @@
+# import time of `tool_shack` and each of its submodules, measured by `python -X importtime` in fresh interpreters.
+# run by hand: `python tests/import_benchmark.py -r 10 --export imports.json`
+# and later `python tests/import_benchmark.py --baseline imports.json` (exits with 1 on regressions)
+import argparse
+import json
+import subprocess
+import sys
+
+MODULES = ['tool_shack'] + [
+    f'tool_shack.{m}' for m in ('cache', 'core', 'data', 'debug', 'fs', 'profiler', 'scripting', 'storage')
+]
+
+def import_time(module): 
+    '''cumulative import time of `module` in microseconds, in a fresh interpreter'''
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True
+    )
+    for line in proc.stderr.splitlines(): 
+        # `import time: self [us] | cumulative | imported package`
+        _, _, fields = line.partition(':')
+        parts = fields.split('|')
+        if len(parts) == 3 and parts[2].strip() == module: 
+            return int(parts[1])
+    raise RuntimeError(f'no import time reported for {module}')
+
+def measure(modules, repeat): 
+    # the minimum over runs is the least noisy estimate on a busy machine
+    return {m: min(import_time(m) for _ in range(repeat)) for m in modules}
+
+
+if __name__ == '__main__': 
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='fresh interpreters per module')
+    parser.add_argument('--export', default=None, help='write the results to this json file')
+    parser.add_argument('--baseline', default=None, help='json file of a previous `--export` to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='minimal relative slowdown to report')
+    args = parser.parse_args()
+
+    results = measure(MODULES, args.repeat)
+    baseline = {}
+    if args.baseline is not None: 
+        with open(args.baseline) as f: 
+            baseline = json.load(f)
+
+    regressions = 0
+    for m, us in results.items(): 
+        line = f'{m:<24}| {us / 1e3:8.2f} ms'
+        if m in baseline: 
+            ratio = us / baseline[m]
+            status = 'regression' if ratio > 1 + args.threshold else 'ok'
+            regressions += status == 'regression'
+            line += f' | baseline {baseline[m] / 1e3:8.2f} ms (x{ratio:.2f}) {status}'
+        print(line)
+
+    if args.export is not None: 
+        with open(args.export, 'w') as f: 
+            json.dump(results, f, indent=2)
+    sys.exit(int(regressions > 0))
@@ -0,0 +1,51 @@
+# compares `data.big_join` (hash join engine) against the former dict-intersection implementation.
+# run by hand: `python tests/join_benchmark.py -n 1000000`
+import argparse
+import random
+import time
+import tracemalloc
+
+import tool_shack.data as data
+
+
+def legacy_big_join(getter_x, getter_y, xs, ys): 
+    x_indexed = data.index_by(getter_x, xs)
+    y_indexed = data.index_by(getter_y, ys)
+    common_ks = set(x_indexed.keys()).intersection(set(y_indexed.keys()))
+    return [(x_indexed[k], y_indexed[k]) for k in common_ks]
+
+def consume(it) -> int: 
+    n = 0
+    for _ in it: 
+        n += 1
+    return n
+
+def measure(name, fn, n_input): 
+    start = time.perf_counter()
+    n_out = fn()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'{name:<28}| {n_out:>9} rows out | {elapsed:7.3f}s | '
+          f'{n_input / elapsed / 1e6:6.2f} M rows/s | peak {peak / 2**20:8.1f} MiB')
+
+
+if __name__ == '__main__': 
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=10**6, help='number of rows on each side')
+    args = parser.parse_args()
+
+    n = args.n
+    xs = [(random.randrange(n), idx) for idx in range(n)]
+    ys = [(random.randrange(n), idx) for idx in range(n // 10)]
+    getter = lambda r: r[0]
+
+    measure('legacy big_join (list)', lambda: len(legacy_big_join(getter, getter, xs, ys)), n + len(ys))
+    measure('big_join (list)', lambda: len(data.big_join(getter, getter, xs, ys)), n + len(ys))
+    measure('hash_join (streamed)', lambda: consume(data.hash_join(getter, getter, xs, ys)), n + len(ys))
+    measure('hash_join full (streamed)', lambda: consume(data.hash_join(getter, getter, xs, ys, 'full')), n + len(ys))
+    measure('hash_join semi (streamed)', lambda: consume(data.hash_join(getter, getter, xs, ys, 'semi')), n + len(ys))
@@ -0,0 +1,50 @@
+# per-call cost of `cache.memo` hits against `functools.lru_cache`, and the effect of single flight 
+# when many threads miss the same slow call at once.
+# run by hand: `python tests/memo_benchmark.py -n 100000 -t 32`
+import argparse
+import functools
+import threading
+import time
+
+from tool_shack.cache import memo
+
+
+def hit_cost(name, fn, n): 
+    fn(1)
+    start = time.perf_counter()
+    for _ in range(n): 
+        fn(1)
+    elapsed = time.perf_counter() - start
+    print(f'{name:<24}| {n} hits in {elapsed:7.3f}s | {elapsed / n * 1e6:6.2f} us/hit')
+
+def stampede(name, fn, n_threads): 
+    threads = [threading.Thread(target=fn, args=(2,)) for _ in range(n_threads)]
+    start = time.perf_counter()
+    for t in threads: 
+        t.start()
+    for t in threads: 
+        t.join()
+    print(f'{name:<24}| {n_threads} concurrent misses in {time.perf_counter() - start:7.3f}s')
+
+
+if __name__ == '__main__': 
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=10**5, help='number of hits')
+    parser.add_argument('-t', '--threads', type=int, default=32, help='threads missing the same call')
+    args = parser.parse_args()
+
+    def square(x): 
+        return x * x
+    hit_cost('functools.lru_cache', functools.lru_cache(maxsize=128)(square), args.n)
+    hit_cost('memo', memo(square), args.n)
+
+    computed = []
+    def slow(x): 
+        computed.append(x)
+        time.sleep(0.1)
+        return x
+    stampede('functools.lru_cache', functools.lru_cache(maxsize=128)(slow), args.threads)
+    print(f'{"":<24}| computed {len(computed)} times')
+    computed.clear()
+    stampede('memo', memo(slow), args.threads)
+    print(f'{"":<24}| computed {len(computed)} times')
@@ -0,0 +1,46 @@
+# random reads from `storage.PackStore` against one file per key (`storage.ShardedStore`).
+# run by hand: `python tests/pack_benchmark.py -n 1000000 -r 1000000`
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from tool_shack.storage import PackStore, ShardedStore
+
+
+def measure(name, store, keys, value, n_reads): 
+    start = time.perf_counter()
+    for k in keys: 
+        store.put(k, value)
+    if hasattr(store, 'save_index'): 
+        store.save_index()
+    write = time.perf_counter() - start
+
+    probes = random.choices(keys, k=n_reads)
+    start = time.perf_counter()
+    n_bytes = 0
+    for k in probes: 
+        n_bytes += len(store.get(k))
+    read = time.perf_counter() - start
+    assert n_bytes == n_reads * len(value)
+
+    print(f'{name:<10}| {len(keys)} keys | write {write / len(keys) * 1e6:7.1f} us/key | '
+          f'{n_reads} random reads {read / n_reads * 1e6:7.1f} us/read')
+
+
+if __name__ == '__main__': 
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=10**6, help='number of keys')
+    parser.add_argument('-r', '--reads', type=int, default=10**6, help='number of random reads')
+    parser.add_argument('--value-bytes', type=int, default=256)
+    parser.add_argument('--dir', default=None, help='where to create the stores (a temporary directory by default)')
+    args = parser.parse_args()
+
+    keys = [f'feature_{i:09d}' for i in range(args.n)]
+    value = os.urandom(args.value_bytes)
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp: 
+        with PackStore(os.path.join(tmp, 'pack')) as store: 
+            measure('pack', store, keys, value, args.reads)
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp: 
+        measure('files', ShardedStore(os.path.join(tmp, 'files')), keys, value, args.reads)
@@ -0,0 +1,42 @@
+# compares `data.gen_permutation` against materializing and shuffling a list of indices.
+# run by hand: `python tests/permutation_benchmark.py -n 10000000 -d 100000`
+import argparse
+import random
+import time
+import tracemalloc
+from itertools import islice
+
+import tool_shack.data as data
+
+
+def shuffled(population): 
+    xs = list(range(population))
+    random.shuffle(xs)
+    return iter(xs)
+
+def drain(make_iter, n_draws): 
+    it = make_iter()
+    for _ in islice(it, n_draws): 
+        pass
+
+def measure(name, make_iter, n_draws): 
+    start = time.perf_counter()
+    drain(make_iter, n_draws)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    drain(make_iter, n_draws)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{name:<24}| {n_draws} draws in {elapsed:7.3f}s | '
+          f'{n_draws / elapsed / 1e6:5.2f} M draws/s | peak {peak / 2**20:8.1f} MiB')
+
+
+if __name__ == '__main__': 
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=10**7, help='population')
+    parser.add_argument('-d', type=int, default=10**5, help='number of draws')
+    args = parser.parse_args()
+
+    measure('random.shuffle', lambda: shuffled(args.n), args.d)
+    measure('gen_permutation', lambda: data.gen_permutation(args.n, seed=0), args.d)
@@ -0,0 +1,43 @@
+# measures the per-call overhead the profiling decorator adds to an (almost) empty function.
+# run by hand: `python tests/profiler_benchmark.py -n 1000000`
+import argparse
+import threading
+import time
+
+from tool_shack.profiler import Profiler
+
+
+def noop(x): 
+    return x
+
+def per_call(fn, n: int) -> float: 
+    start = time.perf_counter()
+    for i in range(n): 
+        fn(i)
+    return (time.perf_counter() - start) / n
+
+def report(name, cost, baseline): 
+    print(f'{name:<32}| {cost * 1e9:8.1f} ns/call | overhead {(cost - baseline) * 1e9:8.1f} ns/call')
+
+
+if __name__ == '__main__': 
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=10**6, help='number of calls')
+    args = parser.parse_args()
+
+    profiler = Profiler()
+    baseline = per_call(noop, args.n)
+    report('undecorated', baseline, baseline)
+    report('@profile', per_call(profiler.profile(noop), args.n), baseline)
+
+    decorated = profiler.profile(noop)
+    nested = profiler.profile(name='nested')(decorated)
+    report('@profile, nested in @profile', per_call(nested, args.n), baseline)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(per_call(decorated, args.n // 4))) for _ in range(4)]
+    for t in threads: 
+        t.start()
+    for t in threads: 
+        t.join()
+    report('@profile, 4 threads (wall/call)', max(results), baseline)
@@ -0,0 +1,39 @@
+# per-call cost of the profiling modes relative to an undecorated function.
+# run by hand: `python tests/sampling_benchmark.py -n 1000000`
+import argparse
+import time
+
+from tool_shack.profiler import Profiler, StackSampler
+
+
+def noop(x): 
+    return x
+
+def per_call(fn, n: int) -> float: 
+    start = time.perf_counter()
+    for i in range(n): 
+        fn(i)
+    return (time.perf_counter() - start) / n
+
+def report(name, cost, baseline): 
+    print(f'{name:<36}| {cost * 1e9:8.1f} ns/call | x{cost / baseline:5.2f} of undecorated')
+
+
+if __name__ == '__main__': 
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, default=10**6, help='number of calls')
+    parser.add_argument('--hz', type=float, default=100., help='stack sampling frequency')
+    args = parser.parse_args()
+
+    profiler = Profiler()
+    baseline = per_call(noop, args.n)
+    report('undecorated', baseline, baseline)
+    report('@profile (every call)', per_call(profiler.profile(noop, name='all'), args.n), baseline)
+    report('@profile(every=100)', per_call(profiler.profile(noop, name='every', every=100), args.n), baseline)
+    report('@profile(sample_rate=0.01)', per_call(profiler.profile(noop, name='rate', sample_rate=0.01), args.n), baseline)
+
+    def watched(x): 
+        return x
+    profiler.watch(watched)
+    with StackSampler(profiler, hz=args.hz): 
+        report(f'watched + StackSampler({args.hz:.0f}Hz)', per_call(watched, args.n), baseline)
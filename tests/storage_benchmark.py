@@ -0,0 +1,65 @@
+# creation and lookup latency of `storage.ShardedStore` against one flat directory, as the number of files grows.
+# run by hand: `python tests/storage_benchmark.py -n 1000 10000 100000 --hash crc32`
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from tool_shack.storage import ShardedStore
+
+
+class FlatStore(): 
+    def __init__(self, root): 
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def put(self, key, data): 
+        with open(os.path.join(self.root, key), 'wb') as f: 
+            f.write(data)
+
+    def get(self, key): 
+        with open(os.path.join(self.root, key), 'rb') as f: 
+            return f.read()
+
+    def exists(self, key): 
+        return os.path.isfile(os.path.join(self.root, key))
+
+def measure(name, store, n, n_lookups): 
+    keys = [f'feature_{i:09d}.bin' for i in range(n)]
+    data = b'x' * 64
+
+    start = time.perf_counter()
+    for k in keys: 
+        store.put(k, data)
+    create = time.perf_counter() - start
+
+    probes = random.sample(keys, min(n_lookups, n))
+    start = time.perf_counter()
+    for k in probes: 
+        store.get(k)
+    lookup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for k in probes: 
+        store.exists(k + '.missing')
+    miss = time.perf_counter() - start
+
+    print(f'{name:<16}| {n:>9} files | create {create / n * 1e6:8.1f} us | '
+          f'get {lookup / len(probes) * 1e6:8.1f} us | missing {miss / len(probes) * 1e6:8.1f} us')
+
+
+if __name__ == '__main__': 
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', type=int, nargs='+', default=[1000, 10000, 100000], help='numbers of files')
+    parser.add_argument('--lookups', type=int, default=10000, help='random lookups per run')
+    parser.add_argument('--hash', default='sha1')
+    parser.add_argument('--fan-out', type=int, default=256)
+    parser.add_argument('--depth', type=int, default=2)
+    parser.add_argument('--dir', default=None, help='where to create the files (a temporary directory by default)')
+    args = parser.parse_args()
+
+    for n in args.n: 
+        with tempfile.TemporaryDirectory(dir=args.dir) as tmp: 
+            measure('flat', FlatStore(os.path.join(tmp, 'flat')), n, args.lookups)
+            measure(f'sharded {args.hash}', ShardedStore(os.path.join(tmp, 'sharded'), args.fan_out, args.depth, args.hash), n, args.lookups)